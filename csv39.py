@@ -2,7 +2,8 @@
 # --- ライブラリインポート ---
 #Windows Virtual Environment Activation: .\.venv\Scripts\activate.ps1
 #Mac Virtual Environment Activation: source .venv/bin/activate
-from threading import Lock  # <-- ADD THIS
+from threading import Lock, Thread, Event, Condition  # <-- ADD THIS
+import queue
 import json
 import os
 import sys # sys.exit()のために追加
@@ -24,6 +25,41 @@ from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 import random
 import pickle
 import datetime
+import asyncio
+import argparse
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import base64
+import zlib
+# ★★★ HTTP詳細取得用 (未インストールの場合はブラウザ取得にフォールバック) ★★★
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = None
+    lxml_html = None
+try:
+    import zstandard  # HTMLアーカイブの圧縮用 (未インストールの場合はzlibで保存)
+except ImportError:
+    zstandard = None
+try:
+    from cryptography.fernet import Fernet, InvalidToken  # ログインCookieの暗号化保存用 (未インストールの場合は暗号化しない)
+except ImportError:
+    Fernet = None
+    InvalidToken = ValueError
+try:
+    import keyring  # Cookieの暗号鍵をOSのキーリングに保存する (未インストールの場合は環境変数の鍵のみ)
+except ImportError:
+    keyring = None
+try:
+    import h2  # noqa: F401  httpxでHTTP/2を使うために必要 (サーバーが非対応ならHTTP/1.1で接続)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 # pprint をインポートしてターミナル出力を整形 (オプション)
 # from pprint import pprint
 # ★★★ 並列処理ライブラリは削除 ★★★
@@ -56,12 +92,82 @@ MEDIUM_WAIT = 1.0 # 中程度の待機時間を短縮 (1.3→0.5秒)
 LONG_WAIT = 2.0 # 長い待機時間を短縮 (1.5→0.7秒)
 # ★★★ 英語ページでのJSレンダリング待機時間短縮 ★★★
 JS_RENDER_WAIT = 0.4 # 秒 (大幅短縮 1.0→0.3秒)
+# ★★★ 詳細ページ取得モード ★★★
+# 'async'  : asyncio + httpx.AsyncClient でページ内の詳細URLをホストごとの同時接続数で並行取得
+# 'http'   : ログイン後のCookieを引き継いだhttpxで詳細ページを1件ずつ取得・解析
+# 'pool'   : ログインCookieを共有した複数のChrome (BROWSER_POOL_SIZE台) で並行取得
+# 'inpage' : メインのブラウザのページ内で fetch() + DOMParser により一括取得 (SSO Cookieを持ち出せない場合)
+# 'browser': 従来通りSeleniumで1件ずつ遷移して取得
+# ('async'/'http'/'pool'/'inpage' で取得に失敗したURLはメインのブラウザで再試行)
+DETAIL_FETCH_MODE = 'async'
+HTTP_TIMEOUT = 30 # HTTP詳細取得のタイムアウト (秒)
+HTTP_MAX_CONNECTIONS = 8 # httpx接続プールの最大接続数
+# ホストごとの同時リクエスト数 ('async' モード)
+HTTP_HOST_CONCURRENCY = {
+    'gslbs.keio.jp': 4,            # 2025年度以降
+    'syllabus.sfc.keio.ac.jp': 8,  # 2024年度以前
+}
+HTTP_DEFAULT_HOST_CONCURRENCY = 2 # 上記以外のホストの同時リクエスト数
+BROWSER_POOL_SIZE = 3 # 'pool' モードで起動するChromeの台数
+INPAGE_FETCH_BATCH_SIZE = 10 # 'inpage' モードで1回の execute_async_script で取得するURL数
+INPAGE_SCRIPT_TIMEOUT = HTTP_TIMEOUT * 2 # 'inpage' モードの1回のスクリプト実行のタイムアウト (秒)
+RESULT_PAGE_PARALLELISM = 4 # 2段階パイプラインのURL列挙で、ページ内 fetch() により同時に取得する検索結果ページ数 (1: 従来のページ送り)
+LEGACY_STATIC_HTTP = True # 旧システム (2024年度以前) の詳細ページは DETAIL_FETCH_MODE に関係なく、ログインせずに素のHTTPで取得する
+LEGACY_SYLLABUS_HOST = 'syllabus.sfc.keio.ac.jp' # 旧システムのホスト
+# ★★★ ID指定の直接取得 (--ids) で組み立てる詳細ページのURL ★★★
+LEGACY_DETAIL_URL_TEMPLATE = 'https://syllabus.sfc.keio.ac.jp/courses/{year}_{course_id}?locale=ja' # 2024年度以前 (同梱テンプレートのURLと同じ形式)
+# 2025年度以降の詳細URLは収集済みのURLからのみ組み立てる (形式を推測したURLは使わない)
+PARALLEL_LANGUAGE_TABS = True # 'browser' モードで、日本語ページの読み込みと同時に英語ページを別タブで読み込む
+PREFETCH_DEPTH = 2 # 'browser' モードで、詳細ページの解析中に別タブで読み込みを開始しておく後続URLの件数 (0: 先読みしない)
+# ★★★ 処理パイプライン ★★★
+# 'two_phase'  : 1) 全 (年度, 分野) の検索結果から詳細URLを列挙してフロンティア (SQLite) に保存
+#                2) フロンティアの未取得URLを DETAIL_FETCH_MODE で取得
+# 'interleaved': 従来通りページ送りと詳細取得を交互に行う
+PIPELINE_MODE = 'two_phase'
+CRAWL_STATE_DB_FILE = 'crawl_state.sqlite3' # クロール状態 (URL状態・カーソル) のファイル名 (出力ディレクトリ内)
+LEGACY_CHECKPOINT_FILE = 'checkpoint.pkl' # 旧形式のチェックポイント (初回のみ取り込む)
+# ★★★ 生データのストリーミング保存 (JSONL) ★★★
+RAW_RECORDS_FILE = 'raw_records.jsonl' # 取得した生データを1件ずつ追記するファイル (出力ディレクトリ内)
+RAW_SINK_FSYNC_BATCH = 20 # この件数ごとに fsync してディスクに確定させる
+RAW_SINK_FSYNC_INTERVAL = 5.0 # 件数に達しなくても、この秒数が経過したら fsync する
+# ★★★ 取得HTMLのアーカイブ (抽出ロジック修正後に再スクレイピングせず再解析するため) ★★★
+ARCHIVE_HTML = True # 取得した日本語・英語ページのHTMLを圧縮して保存する
+ARCHIVE_DIR_NAME = 'html_archive' # アーカイブのディレクトリ名 (出力ディレクトリ内)
+ARCHIVE_ZSTD_LEVEL = 10 # zstd圧縮レベル
+ARCHIVE_DICT_SIZE = 64 * 1024 # 学習するzstd辞書のサイズ (バイト)
+ARCHIVE_DICT_TRAINING_SAMPLES = 100 # 辞書学習に使うページ数 (これ以降のページは辞書付きで圧縮)
+# ★★★ 差分スクレイピング ★★★
+# 前回取得時の指紋 (ETag/Last-Modified、なければ正規化した本文のハッシュ) と一致する科目は
+# 英語ページの取得・抽出を省略して前回の結果を再利用する (--full-refresh で無効化)
+INCREMENTAL_MODE = True
+# ★★★ 英語情報の再利用 (年度をまたいだ翻訳キャッシュ) ★★★
+# 日本語ページの抽出内容 (科目名・担当者名・各項目。年度の表記は除く) が以前に取得した科目と同一なら、
+# 英語ページを取得せず、そのとき抽出した英語情報を当年度に置き換えて再利用する (--full-refresh で無効化)
+TRANSLATION_REUSE = True
+FRONTIER_BATCH_SIZE = 50 # 取得フェーズで一度に取り出すURL数
+# ★★★ ログインセッションの再利用 ★★★
+PERSIST_SESSION_COOKIES = True # ログイン後のCookieを保存し、次回起動時・ドライバー復旧時のログインを省略する
+COOKIE_JAR_FILE = 'session_cookies.json' # 保存するCookieのファイル名 (出力ディレクトリ内、所有者のみ読み書き可 0600)
+LEGACY_COOKIE_JAR_FILE = 'session_cookies.enc' # 以前の形式 (パスワードから導出した鍵で暗号化) のファイル名。起動時に削除する
+COOKIE_JAR_MAX_AGE = 8 * 60 * 60 # 有効期限のないセッションCookieを再利用する上限 (秒)
+COOKIE_JAR_KEY_ENV = 'SYLLABUS_COOKIE_KEY' # Cookieの暗号鍵 (Fernet.generate_key() の値) を渡す環境変数
+COOKIE_JAR_KEYRING_SERVICE = 'keio-syllabus-scraper' # 環境変数が無い場合に暗号鍵を保存・取得するOSのキーリングのサービス名
+# ★★★ ホットスタンバイのドライバー ★★★
+HOT_STANDBY_DRIVER = True # ログイン済みのChromeを裏で1台待機させ、セッションエラー時に即座に差し替える
+STANDBY_REFRESH_INTERVAL = 10 * 60 # 待機中のドライバーのセッションを確認・維持する間隔 (秒)
+STANDBY_TAKE_TIMEOUT = 1.0 # 差し替え時に待機中のドライバーを待つ上限 (秒、超えたら従来どおり再起動)
+STANDBY_REFRESH_TAKE_TIMEOUT = 30.0 # 差し替え時に待機中のドライバーがセッション確認中だった場合、確認の完了を待つ上限 (秒)
+STANDBY_RETRY_WAIT = 30 # スタンバイの準備に失敗した場合の再試行までの待機 (秒)
 
 # --- ★ カスタム例外クラス ★ ---
 class MissingCriticalDataError(Exception):
     """必須データまたは定義済みデータが取得できなかった場合に発生させる例外"""
     pass
 
+class HttpSessionExpiredError(Exception):
+    """HTTP取得でログインページ/セッションタイムアウトページが返された場合に発生させる例外"""
+    pass
+
 # --- XPath定義 ---
 
 # === 日本語ページ用 XPath ===
@@ -142,10 +248,6 @@ def load_credentials():
 
 USER_EMAIL, USER_PASSWORD = load_credentials()
 
-if not USER_EMAIL or not USER_PASSWORD:
-    print("Error: Couldn't load credentials from config.json")
-    sys.exit(1)
-
 
 def create_output_dirs(base_dir=OUTPUT_DIR_NAME):
     """出力ディレクトリを作成する"""
@@ -234,6 +336,14 @@ def get_text_by_xpath(driver, xpath, default=""):
 
 def get_multiple_elements_text(driver, xpaths_dict):
     """Multiple XPaths to text values in a single JS call - improved for 2024 syllabuses"""
+    try:
+        # ラベル→値マップを1回の走査で作成して全項目を解決 (dt/dd・th/td 形式)
+        label_map_dict = {k: v for k, v in xpaths_dict.items() if k != 'course_id_fallback'}
+        return extract_fields_by_label_map_js(driver, label_map_dict)
+    except (InvalidSessionIdException, NoSuchWindowException):
+        raise
+    except Exception as e:
+        print(f"    ラベルマップ一括抽出に失敗: {e}。XPathごとの抽出に切り替えます...")
     js_script = """
         function getTexts(xpaths) {
             var results = {};
@@ -300,17 +410,14 @@ def process_single_url(syllabus_url, year, screenshots_dir, opened_links_this_ye
             print(f"\n[{time.strftime('%H:%M:%S')}] 🔍 Processing URL: {syllabus_url}")
             
             # Direct navigation instead of tab-based approach
-            driver.get(syllabus_url)
+            english_tab = navigate_detail_page(driver, syllabus_url, year)
             
             # Wait for page to load properly
-            WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(MEDIUM_WAIT)
+            wait_for_page_ready(driver, 'detail')
             
             # Process the syllabus details
             print(f"[{time.strftime('%H:%M:%S')}] 📊 Extracting syllabus details")
-            details = get_syllabus_details(driver, year, screenshots_dir)
+            details = get_syllabus_details(driver, year, screenshots_dir, english_handle=english_tab)
             
             # Extract identifying information for logging
             if details:
@@ -322,7 +429,7 @@ def process_single_url(syllabus_url, year, screenshots_dir, opened_links_this_ye
             # Return to search results page
             print(f"[{time.strftime('%H:%M:%S')}] 🔙 Returning to search results page")
             driver.get(original_url)
-            time.sleep(SHORT_WAIT)
+            wait_for_page_ready(driver, 'search_results')
             
             # Calculate elapsed time
             elapsed_time = time.time() - url_start_time
@@ -353,7 +460,7 @@ def process_single_url(syllabus_url, year, screenshots_dir, opened_links_this_ye
                         # Navigate back to search results
                         driver = globals()['driver']  # Get the new driver
                         driver.get('https://gslbs.keio.jp/syllabus/search')
-                        time.sleep(MEDIUM_WAIT)
+                        wait_for_page_ready(driver, 'search_form')
                         
                         # Re-execute the search with the same criteria
                         js_script = """
@@ -399,7 +506,7 @@ def process_single_url(syllabus_url, year, screenshots_dir, opened_links_this_ye
                             return await setSearchCriteria(arguments[0], arguments[1]);
                         """
                         driver.execute_script(js_script, str(year), "特設科目")
-                        time.sleep(MEDIUM_WAIT * 2)  # Wait for search results
+                        wait_for_page_ready(driver, 'search_results')  # Wait for search results
                         
                         # Continue to next attempt
                         continue
@@ -420,7 +527,7 @@ def process_single_url(syllabus_url, year, screenshots_dir, opened_links_this_ye
             if original_url:  # Only attempt if original_url was successfully captured
                 try:
                     driver.get(original_url)
-                    time.sleep(SHORT_WAIT)
+                    wait_for_page_ready(driver, 'search_results')
                 except Exception as e_recovery:
                     print(f"[{time.strftime('%H:%M:%S')}] ⚠️ Recovery failed: {str(e_recovery)}")
             
@@ -566,23 +673,190 @@ def parse_professor_names(ja_names_text, en_names_text=None):
     return professors
     return professors
 
-def click_element(driver, element, wait_time=SHORT_WAIT):
-    """Click an element with safer approach"""
+# --- ★★★ イベント駆動の待機エンジン (固定スリープの代替) ★★★ ---
+
+# 検索結果ページの表示完了を示す要素
+RESULT_INDICATOR_XPATH = (
+    "//a[contains(@class, 'syllabus-detail')] | "
+    "//a[contains(@class, 'btn-info')] | "
+    "//div[contains(text(), '該当するデータはありません')] | "
+    "//ul[contains(@class, 'pagination')] | "
+    "//table[contains(@class, 'search-result')] | "
+    "//div[contains(text(), '件') and contains(text(), '中')] | "
+    "//div[@class='search-result-list']"
+)
+# 詳細ページ (またはエラー/ログインページ) の表示完了を示す要素
+DETAIL_READY_XPATH = (
+    "//h2[@class='class-name'] | "
+    "//h2/span[@class='title'] | "
+    "//div[@class='info-login'] | "
+    "//h1[contains(text(), 'Error')] | "
+    "//input[@type='password']"
+)
+# ページ種別ごとの準備完了条件: (XPath, 英語ページであることを要求するか)
+PAGE_READY_CONDITIONS = {
+    'search_form': ("//button[@data-action_id='SYLLABUS_SEARCH_KEYWORD_EXECUTE' and not(@disabled)]", False),
+    'search_results': (RESULT_INDICATOR_XPATH, False),
+    'detail': (DETAIL_READY_XPATH, False),
+    'english': (DETAIL_READY_XPATH, True),
+}
+READY_WAIT_CEILING = 10 # ページ準備完了待機の上限 (秒)
+READY_POLL_INTERVAL = 0.1 # 条件チェックの間隔 (秒)
+
+_PAGE_READY_JS = """
+    var xpath = arguments[0], requireEnglish = arguments[1];
+    if (document.readyState === 'loading') return false;
+    if (requireEnglish) {
+        var href = window.location.href;
+        var docLang = (document.documentElement.lang || '').toLowerCase();
+        if (href.indexOf('lang=en') === -1 && href.indexOf('locale=en') === -1 && docLang.indexOf('en') !== 0) return false;
+    }
+    var nodes = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < nodes.snapshotLength; i++) {
+        if (!nodes.snapshotItem(i).__scraperStale) return true;
+    }
+    return false;
+"""
+
+_MARK_STALE_JS = """
+    var nodes = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < nodes.snapshotLength; i++) nodes.snapshotItem(i).__scraperStale = true;
+    return nodes.snapshotLength;
+"""
+
+def mark_page_stale(driver, page_type):
+    """
+    現在表示中のページ種別の目印要素に印を付ける。
+    クリックやソート変更の前に呼ぶと、wait_for_page_ready は新しい要素が現れるまで待機する。
+    """
+    try:
+        driver.execute_script(_MARK_STALE_JS, PAGE_READY_CONDITIONS[page_type][0])
+    except (InvalidSessionIdException, NoSuchWindowException):
+        raise
+    except WebDriverException:
+        pass
+
+def wait_for_page_ready(driver, page_type, timeout=READY_WAIT_CEILING):
+    """ページ種別ごとのDOM条件が満たされるまで待機する (条件成立時点で即座に返り、上限を超えたら False)"""
+    xpath, require_english = PAGE_READY_CONDITIONS[page_type]
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=READY_POLL_INTERVAL).until(
+            lambda d: d.execute_script(_PAGE_READY_JS, xpath, require_english)
+        )
+        return True
+    except TimeoutException:
+        print(f"           [警告] ページ準備完了待機がタイムアウトしました ({page_type}, {timeout}秒)")
+        return False
+
+def click_element(driver, element, wait_time=SHORT_WAIT, ready=None):
+    """Click an element with safer approach (ready: クリック後に待機するページ種別)"""
+    if ready:
+        mark_page_stale(driver, ready)
     try:
         WebDriverWait(driver, wait_time).until(EC.element_to_be_clickable(element))
         element.click()
-        time.sleep(SHORT_WAIT)  # Give time for the click to register
-        return True
     except Exception:
         try:
             # Only use JavaScript click as fallback
             driver.execute_script("arguments[0].scrollIntoView(true);", element)
-            time.sleep(SHORT_WAIT)
             driver.execute_script("arguments[0].click();", element)
-            time.sleep(SHORT_WAIT)
-            return True
         except Exception:
             return False
+    if ready:
+        wait_for_page_ready(driver, ready)
+    return True
+
+# --- ★★★ ページ分類 (1回のJS呼び出しでページ種別を判定) ★★★ ---
+
+PAGE_DETAIL = 'detail'
+PAGE_ERROR = 'error'
+PAGE_LOGIN_REQUIRED = 'login-required'
+PAGE_SESSION_TIMEOUT = 'session-timeout'
+PAGE_SEARCH_RESULTS = 'search-results'
+PAGE_NO_RESULTS = 'no-results'
+PAGE_UNKNOWN = 'unknown'
+
+SESSION_TIMEOUT_KEYWORDS = ["セッションタイムアウト", "session timeout", "ログインし直してください", "log back in"]
+# タイムアウト文言を探すメッセージ要素 (ページ全体のHTMLは直列化しない)
+SESSION_TIMEOUT_TEXT_SELECTOR = "h1, h2, h3, p, .alert, .error, .message, .msg"
+SESSION_TIMEOUT_TEXT_MAX_NODES = 30
+ERROR_MESSAGE_XPATHS = [
+    "//h1[contains(text(), 'Error')]",
+    "//p[contains(text(), 'ページが見つかりません')]",
+    "//p[contains(text(), 'Page Not Found')]",
+    "//div[contains(text(), 'ページが見つかりません')]",
+    "//div[contains(text(), 'Page Not Found')]"
+]
+NO_RESULTS_XPATH = "//div[contains(text(), '該当するデータはありません')]"
+SEARCH_RESULTS_XPATH = (
+    "//a[contains(@class, 'syllabus-detail')] | "
+    "//a[contains(@class, 'btn-info')] | "
+    "//ul[contains(@class, 'pagination')] | "
+    "//table[contains(@class, 'search-result')] | "
+    "//div[@class='search-result-list']"
+)
+DETAIL_PAGE_XPATH = "//h2[@class='class-name'] | //h2/span[@class='title']"
+
+# 判定順: セッションタイムアウト → エラー → ログイン要求 → 該当なし → 検索結果 → 詳細
+_CLASSIFY_PAGE_JS = """
+    var cfg = arguments[0];
+    function find(xpath, visibleOnly) {
+        var nodes = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < nodes.snapshotLength; i++) {
+            var el = nodes.snapshotItem(i);
+            if (!visibleOnly || el.getClientRects().length > 0) return true;
+        }
+        return false;
+    }
+    var href = window.location.href;
+    var title = document.title || '';
+    function hasKeyword(text) {
+        text = (text || '').toLowerCase();
+        for (var k = 0; k < cfg.timeoutKeywords.length; k++) {
+            if (text.indexOf(cfg.timeoutKeywords[k]) !== -1) return true;
+        }
+        return false;
+    }
+    var hasTimeoutKeyword = hasKeyword(title);
+    if (!hasTimeoutKeyword) {
+        var nodes = document.querySelectorAll(cfg.timeoutTextSelector);
+        var limit = Math.min(nodes.length, cfg.timeoutTextMaxNodes);
+        for (var n = 0; n < limit && !hasTimeoutKeyword; n++) {
+            hasTimeoutKeyword = hasKeyword((nodes[n].textContent || '').slice(0, 500));
+        }
+    }
+    if (href.indexOf(cfg.appMsgPath) !== -1) return {type: 'session-timeout', reason: 'url:' + href};
+    if (hasTimeoutKeyword) return {type: 'session-timeout', reason: 'keyword'};
+    if (title.indexOf('Error') !== -1 || title.indexOf('404') !== -1) return {type: 'error', reason: 'title:' + title};
+    for (var e = 0; e < cfg.errorXpaths.length; e++) {
+        if (find(cfg.errorXpaths[e], true)) return {type: 'error', reason: cfg.errorXpaths[e]};
+    }
+    if (href.toLowerCase().indexOf('error') !== -1 || href.indexOf('appMsg') !== -1) return {type: 'error', reason: 'url:' + href};
+    if (find("//div[@class='info-login']", false)) return {type: 'login-required', reason: 'info-login'};
+    if (find("//input[@type='password']", true)) return {type: 'login-required', reason: 'password-form'};
+    if (find(cfg.noResultsXpath, true)) return {type: 'no-results', reason: cfg.noResultsXpath};
+    if (find(cfg.searchResultsXpath, false)) return {type: 'search-results', reason: 'result-list'};
+    if (find(cfg.detailXpath, false)) return {type: 'detail', reason: 'class-name'};
+    return {type: 'unknown', reason: ''};
+"""
+
+def classify_page(driver):
+    """
+    現在のページを1回のJS呼び出しで分類し、(種別, 判定理由) を返す。
+    種別: detail / error / login-required / session-timeout / search-results / no-results / unknown
+    暗黙的待機を使わないため、健全なページでも待ち時間は発生しない。
+    """
+    result = driver.execute_script(_CLASSIFY_PAGE_JS, {
+        'timeoutKeywords': [keyword.lower() for keyword in SESSION_TIMEOUT_KEYWORDS],
+        'timeoutTextSelector': SESSION_TIMEOUT_TEXT_SELECTOR,
+        'timeoutTextMaxNodes': SESSION_TIMEOUT_TEXT_MAX_NODES,
+        'appMsgPath': "/syllabus/appMsg",
+        'errorXpaths': ERROR_MESSAGE_XPATHS,
+        'noResultsXpath': NO_RESULTS_XPATH,
+        'searchResultsXpath': SEARCH_RESULTS_XPATH,
+        'detailXpath': DETAIL_PAGE_XPATH,
+    }) or {}
+    return result.get('type', PAGE_UNKNOWN), result.get('reason', '')
 
 
 def generate_english_url(current_url):
@@ -660,42 +934,22 @@ def display_scraped_info(syllabus_details, title="Scraped Syllabus Information")
     
     print(f"{'='*60}\n")
 
-def is_error_page(driver):
+def is_error_page(driver, page_type=None):
     """
     検出したページがエラーページかどうかを確認する
+    (page_type: classify_page の結果が既にあれば再分類せずに使用する)
+    セッションタイムアウトはエラーページとして扱わない。呼び出し側で再ログインすること。
     """
     try:
-        # タイトルチェック
-        page_title = driver.title
-        if "Error" in page_title or "404" in page_title:
-            print("           [情報] エラーページのタイトルを検出しました。スキップします。")
+        reason = ''
+        if page_type is None:
+            page_type, reason = classify_page(driver)
+        if page_type == PAGE_ERROR:
+            print(f"           [情報] エラーページを検出しました ({page_type}: {reason})。スキップします。")
             return True
-            
-        # エラーメッセージの検出
-        error_messages = [
-            "//h1[contains(text(), 'Error')]",
-            "//p[contains(text(), 'ページが見つかりません')]",
-            "//p[contains(text(), 'Page Not Found')]",
-            "//div[contains(text(), 'ページが見つかりません')]",
-            "//div[contains(text(), 'Page Not Found')]"
-        ]
-        
-        for xpath in error_messages:
-            try:
-                elements = driver.find_elements(By.XPATH, xpath)
-                if elements and any(element.is_displayed() for element in elements):
-                    print(f"           [情報] エラーページのメッセージを検出しました: {xpath}")
-                    return True
-            except Exception:
-                continue
-                
-        # URLチェック
-        current_url = driver.current_url
-        if "error" in current_url.lower() or "appMsg" in current_url:
-            print(f"           [情報] エラーページのURLパターンを検出: {current_url}")
-            return True
-            
         return False
+    except (InvalidSessionIdException, NoSuchWindowException):
+        raise
     except Exception as e:
         print(f"           [警告] エラーページチェック中に例外が発生: {e}")
         return False
@@ -735,13 +989,7 @@ def test_error_page_detection(driver, test_url):
             
             # エラーメッセージに関連する要素を特定
             print("\nエラーメッセージ関連要素:")
-            error_selectors = [
-                "//h1[contains(text(), 'Error')]",
-                "//p[contains(text(), 'ページが見つかりません')]",
-                "//p[contains(text(), 'Page Not Found')]",
-                "//div[contains(text(), 'ページが見つかりません')]",
-                "//div[contains(text(), 'Page Not Found')]"
-            ]
+            error_selectors = ERROR_MESSAGE_XPATHS
             
             for selector in error_selectors:
                 elements = driver.find_elements(By.XPATH, selector)
@@ -765,36 +1013,933 @@ def test_error_page_detection(driver, test_url):
 # テスト実行例
 # test_error_page_detection(driver, "https://syllabus.sfc.keio.ac.jp/error")
 
-def save_checkpoint(year, field_name, page_num, processed_urls):
-    """進捗状況をチェックポイントファイルに保存する"""
-    checkpoint = {
-        'year': year,
-        'field_name': field_name,
-        'page_num': page_num,
-        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'processed_urls': list(processed_urls)  # setをリストに変換
+# --- ★★★ ラベル→値マップによる一括抽出 (dt/dd と th/td を1回の走査で) ★★★ ---
+# 2023-2024 (SFC) は <dt>ラベル</dt><dd>値</dd>、2025 (gslbs) は <tr><th>ラベル</th><td>値</td></tr> の構造。
+# INFO_MAP の XPath からラベル条件を読み取り、文書を1回走査して作ったマップから全項目を解決する。
+# ラベル形式でない XPath (科目名の h2 など) だけは従来どおり個別に評価する。
+
+_LABEL_CONDITION_PATTERN = re.compile(r"(text\(\)|normalize-space\(\))\s*=\s*'([^']*)'|contains\(\s*(?:text\(\)|normalize-space\(\))\s*,\s*'([^']*)'\s*\)")
+_LABEL_XPATH_PATTERN = re.compile(r"^\(?\s*(?://div\[@class='[^']+'\])?//(dt)\[|^//tr\[(th)\[")
+_LABEL_SPECS = {}
+
+def parse_label_xpath(xpath):
+    """
+    INFO_MAP の XPath をラベル条件 [('exact' | 'contains', ラベル), ...] に変換する。
+    dt/dd・th/td のラベル形式でない XPath の場合は None を返す。
+    """
+    if xpath in _LABEL_SPECS:
+        return _LABEL_SPECS[xpath]
+    spec = None
+    if xpath and _LABEL_XPATH_PATTERN.match(xpath):
+        spec = []
+        for _, exact_label, contains_label in _LABEL_CONDITION_PATTERN.findall(xpath):
+            condition = ('exact', exact_label.strip()) if contains_label == '' else ('contains', contains_label)
+            if condition not in spec:
+                spec.append(condition)
+        spec = spec or None
+    _LABEL_SPECS[xpath] = spec
+    return spec
+
+def resolve_label_value_map(label_values, info_map, evaluate_xpath=None):
+    """
+    文書順の [(ラベル, 値), ...] から INFO_MAP の各項目を解決する。
+    ラベル形式でない項目は evaluate_xpath(xpath) で取得する (未指定なら空文字)。
+    """
+    first_value_by_label = {}
+    for label, value in label_values:
+        first_value_by_label.setdefault(label, value)
+    results = {}
+    for key, (label, xpath, default_value, *_) in info_map.items():
+        spec = parse_label_xpath(xpath)
+        if spec is None:
+            results[key] = evaluate_xpath(xpath) if (xpath and evaluate_xpath) else ""
+            continue
+        value = ""
+        if all(mode == 'exact' for mode, _ in spec):
+            for _, label_text in spec:
+                if label_text in first_value_by_label:
+                    value = first_value_by_label[label_text]
+                    break
+        else:
+            # contains を含む条件は、元の XPath と同様に文書順で最初に一致した行を使う
+            for page_label, page_value in label_values:
+                if any((page_label == label_text) if mode == 'exact' else (label_text in page_label) for mode, label_text in spec):
+                    value = page_value
+                    break
+        results[key] = value
+    return results
+
+def _lxml_node_text(node):
+    """get_multiple_elements_text と同じ規則で要素のテキストを取得する"""
+    text = node.text_content() if hasattr(node, 'text_content') else str(node)
+    if not text.strip() and len(node):
+        # 空の場合は子要素のテキストを連結
+        text = " ".join(child.text_content() for child in node)
+    return normalize_text(text)
+
+def build_label_value_list_lxml(document):
+    """lxml ドキュメントを1回走査し、dt→dd / th→td の (ラベル, 値) を文書順に返す"""
+    label_values = []
+    for label_node in document.iter('dt', 'th'):
+        value_node = None
+        if label_node.tag == 'dt':
+            sibling = label_node.getnext()
+            while sibling is not None:
+                if sibling.tag == 'dd':
+                    value_node = sibling
+                    break
+                sibling = sibling.getnext()
+        else:
+            row = label_node.getparent()
+            if row is not None and row.tag == 'tr':
+                value_node = next((cell for cell in row if cell.tag == 'td'), None)
+        if value_node is None:
+            continue
+        label_values.append((normalize_text(label_node.text_content()), _lxml_node_text(value_node)))
+    return label_values
+
+# 任意の document (表示中のページ / DOMParser で解析したページ) からラベル→値の組と、ラベル形式でない XPath の値を集める
+_COLLECT_LABEL_VALUES_JS = """
+    function collectLabelValues(doc, xpaths) {
+        function nodeText(element) {
+            var text = element.textContent || element.innerText || "";
+            if (!text.trim() && element.children && element.children.length > 0) {
+                text = Array.from(element.children)
+                    .map(function(child) { return child.textContent || child.innerText || ""; })
+                    .join(" ");
+            }
+            return text.trim();
+        }
+        var pairs = [];
+        var labelNodes = doc.querySelectorAll('dt, th');
+        for (var i = 0; i < labelNodes.length; i++) {
+            var labelNode = labelNodes[i];
+            var valueNode = null;
+            if (labelNode.tagName === 'DT') {
+                var sibling = labelNode.nextElementSibling;
+                while (sibling && sibling.tagName !== 'DD') { sibling = sibling.nextElementSibling; }
+                valueNode = sibling;
+            } else if (labelNode.parentElement && labelNode.parentElement.tagName === 'TR') {
+                valueNode = Array.from(labelNode.parentElement.children).find(function(cell) { return cell.tagName === 'TD'; }) || null;
+            }
+            if (valueNode) { pairs.push([labelNode.textContent || "", nodeText(valueNode)]); }
+        }
+        var others = {};
+        for (var j = 0; j < xpaths.length; j++) {
+            try {
+                var element = doc.evaluate(xpaths[j], doc, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+                others[xpaths[j]] = element ? nodeText(element) : "";
+            } catch (e) {
+                others[xpaths[j]] = "";
+            }
+        }
+        return {pairs: pairs, others: others};
     }
-    
-    checkpoint_file = os.path.join(OUTPUT_DIR_NAME, 'checkpoint.pkl')
-    with open(checkpoint_file, 'wb') as f:
-        pickle.dump(checkpoint, f)
-    print(f"\n[情報] チェックポイント保存: 年度={year}, 分野={field_name}, ページ={page_num}, URL数={len(processed_urls)}")
-
-def load_checkpoint():
-    """最後のチェックポイントを読み込む（存在する場合）"""
-    checkpoint_file = os.path.join(OUTPUT_DIR_NAME, 'checkpoint.pkl')
-    if os.path.exists(checkpoint_file):
+"""
+
+_LABEL_VALUE_MAP_JS = _COLLECT_LABEL_VALUES_JS + """
+    return collectLabelValues(document, arguments[0]);
+"""
+
+def label_map_other_xpaths(info_map):
+    """INFO_MAP のうちラベル形式でない (個別に評価が必要な) XPath のリスト"""
+    return [xpath for _, xpath, *_ in info_map.values() if xpath and parse_label_xpath(xpath) is None]
+
+def resolve_collected_label_values(collected, info_map):
+    """collectLabelValues() の戻り値から INFO_MAP の各項目を解決する"""
+    label_values = [(normalize_text(label), normalize_text(value)) for label, value in collected['pairs']]
+    others = collected['others']
+    return resolve_label_value_map(label_values, info_map, lambda xpath: normalize_text(others.get(xpath, "")))
+
+def extract_fields_by_label_map_js(driver, info_map):
+    """ブラウザ内で文書を1回走査してラベル→値マップを作り、INFO_MAP の各項目を解決する"""
+    collected = driver.execute_script(_LABEL_VALUE_MAP_JS, label_map_other_xpaths(info_map))
+    return resolve_collected_label_values(collected, info_map)
+
+# --- ★★★ オフラインHTML解析 (lxml + プリコンパイル済みXPath) ★★★ ---
+
+_COMPILED_XPATHS = {}
+
+def compile_xpath(xpath):
+    """XPath文字列をlxmlのXPathオブジェクトにコンパイルする (同じ式は再利用)"""
+    compiled = _COMPILED_XPATHS.get(xpath)
+    if compiled is None:
+        compiled = etree.XPath(xpath)
+        _COMPILED_XPATHS[xpath] = compiled
+    return compiled
+
+def precompile_info_maps():
+    """INFO_MAP_* のラベル条件を解析し、ラベル形式でないXPathを事前にコンパイルする"""
+    for info_map in (INFO_MAP_JA_2025, INFO_MAP_JA_2023_2024, INFO_MAP_EN_2025, INFO_MAP_EN_2023_2024):
+        for _, xpath, _, *_ in info_map.values():
+            if xpath and parse_label_xpath(xpath) is None:
+                compile_xpath(xpath)
+
+def parse_html_document(page_html):
+    """HTML文字列(またはバイト列)をlxmlのドキュメントに変換する"""
+    if isinstance(page_html, str) and page_html.lstrip().startswith('<?xml'):
+        # エンコーディング宣言付きの文字列はlxmlが受け付けないためバイト列に変換
+        page_html = page_html.encode('utf-8')
+    return lxml_html.document_fromstring(page_html)
+
+def extract_fields_from_html(page_html, info_map):
+    """
+    HTML文字列(page_source または HTTPレスポンス本文)からINFO_MAPの各項目をブラウザなしで抽出する。
+    文書を1回走査したラベル→値マップから解決し、ラベル形式でない項目だけをプリコンパイル済みXPathで評価する。
+    get_multiple_elements_text と同じ {キー: 正規化済みテキスト} 形式を返す (course_id_fallback を含む)。
+    """
+    document = parse_html_document(page_html)
+
+    def evaluate_xpath(xpath):
+        nodes = compile_xpath(xpath)(document)
+        return _lxml_node_text(nodes[0]) if nodes else ""
+
+    return resolve_label_value_map(build_label_value_list_lxml(document), info_map, evaluate_xpath)
+
+def extract_fields_from_driver(driver, info_map, page_html=None):
+    """ブラウザの現在ページから page_source 1回の取得でINFO_MAPの各項目を抽出する (lxml非対応時はJS一括取得)"""
+    if lxml_html is not None:
         try:
-            with open(checkpoint_file, 'rb') as f:
-                checkpoint = pickle.load(f)
-            print(f"\n[情報] チェックポイント読込: 年度={checkpoint['year']}, 分野={checkpoint['field_name']}, "
-                  f"ページ={checkpoint['page_num']}, 保存日時={checkpoint['timestamp']}")
-            return checkpoint
+            if page_html is None:
+                page_html = driver.page_source
+            return extract_fields_from_html(page_html, info_map)
+        except (InvalidSessionIdException, NoSuchWindowException):
+            raise
         except Exception as e:
-            print(f"\n[警告] チェックポイント読込失敗: {e}")
+            print(f"    [警告] page_source のオフライン解析に失敗: {e}。JavaScriptで取得します...")
+    return get_multiple_elements_text(driver, info_map)
+
+if lxml_html is not None:
+    precompile_info_maps()
+
+# --- ★★★ 取得HTMLアーカイブ (コンテンツアドレス + zstd辞書圧縮) ★★★ ---
+
+def canonicalize_url(url):
+    """アーカイブのキーとして使うURL正規化 (スキーム/ホストを小文字化、クエリをソート、フラグメント除去)"""
+    parsed_url = urlparse(url)
+    query = urlencode(sorted(parse_qs(parsed_url.query, keep_blank_values=True).items()), doseq=True)
+    return urlunparse((parsed_url.scheme.lower(), parsed_url.netloc.lower(), parsed_url.path, parsed_url.params, query, ''))
+
+class HtmlArchive:
+    """
+    取得したページのHTMLを内容のSHA-256で重複排除して objects/ 以下に圧縮保存し、
+    (正規化URL, 言語, 年度, 取得日時) → ハッシュ の索引を index.sqlite3 に記録する。
+    シラバスのページは構造がほぼ同じなため、最初の ARCHIVE_DICT_TRAINING_SAMPLES 件で
+    zstd辞書を学習し、以降のページはその辞書で圧縮する。
+    """
+
+    def __init__(self, root, read_only=False):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.lock = Lock()
+        self.dictionaries = {}
+        self.compressors = {}
+        self.decompressors = {}
+        self.current_dict_id = 0
+        self.training_samples = []
+        if read_only:
+            # 再解析ワーカー用: 索引と辞書を読むだけ (テーブル作成・学習サンプルの読み込みはしない)
+            self.conn = sqlite3.connect(f"file:{os.path.join(root, 'index.sqlite3')}?mode=ro", uri=True, check_same_thread=False)
+            self._load_dictionaries()
+            return
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                " sha256 TEXT PRIMARY KEY, codec TEXT NOT NULL, dict_id INTEGER NOT NULL DEFAULT 0,"
+                " size INTEGER NOT NULL, stored_size INTEGER NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT NOT NULL, source_url TEXT NOT NULL, lang TEXT NOT NULL, year INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL, sha256 TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS pages_source ON pages (source_url, lang, fetched_at)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dictionaries ("
+                " dict_id INTEGER PRIMARY KEY, data BLOB NOT NULL, sample_count INTEGER, trained_at REAL)"
+            )
+        self._load_dictionaries()
+        if zstandard is not None:
+            if not self.current_dict_id:
+                # 前回の実行で辞書学習前に保存したページを学習用サンプルとして再利用する
+                for (sha256,) in self.conn.execute("SELECT sha256 FROM objects LIMIT ?", (ARCHIVE_DICT_TRAINING_SAMPLES,)):
+                    self.training_samples.append(self._read_object(sha256))
+
+    def _load_dictionaries(self):
+        if zstandard is None:
+            return
+        for dict_id, data in self.conn.execute("SELECT dict_id, data FROM dictionaries ORDER BY trained_at"):
+            self.dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+            self.current_dict_id = dict_id
+
+    def _object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:])
+
+    def _compressor(self, dict_id):
+        if dict_id not in self.compressors:
+            self.compressors[dict_id] = zstandard.ZstdCompressor(
+                level=ARCHIVE_ZSTD_LEVEL, dict_data=self.dictionaries.get(dict_id)
+            )
+        return self.compressors[dict_id]
+
+    def _decompressor(self, dict_id):
+        if dict_id not in self.decompressors:
+            self.decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return self.decompressors[dict_id]
+
+    def _train_dictionary(self):
+        """集めたサンプルからzstd辞書を学習する (サンプル不足で失敗した場合は次のページで再試行)"""
+        try:
+            dictionary = zstandard.train_dictionary(ARCHIVE_DICT_SIZE, self.training_samples)
+        except zstandard.ZstdError as e:
+            print(f"[警告] HTMLアーカイブの辞書学習に失敗: {e}")
+            return
+        dict_id = dictionary.dict_id()
+        self.dictionaries[dict_id] = dictionary
+        self.current_dict_id = dict_id
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dictionaries (dict_id, data, sample_count, trained_at) VALUES (?, ?, ?, ?)",
+                (dict_id, dictionary.as_bytes(), len(self.training_samples), time.time()),
+            )
+        print(f"[情報] HTMLアーカイブのzstd辞書を学習しました (ID: {dict_id}, サンプル: {len(self.training_samples)}件)")
+        self.training_samples = []
+
+    def _read_object(self, sha256):
+        codec, dict_id = self.conn.execute("SELECT codec, dict_id FROM objects WHERE sha256 = ?", (sha256,)).fetchone()
+        with open(self._object_path(sha256), 'rb') as f:
+            data = f.read()
+        if codec == 'zstd':
+            return self._decompressor(dict_id).decompress(data)
+        return zlib.decompress(data)
+
+    def put(self, url, page_html, lang, current_year, source_url=None, fetched_at=None):
+        """ページのHTMLを保存し、内容のハッシュを返す (同じ内容は1つのオブジェクトを共有)"""
+        raw = page_html.encode('utf-8')
+        sha256 = hashlib.sha256(raw).hexdigest()
+        canonical_url = canonicalize_url(url)
+        with self.lock, self.conn:
+            if self.conn.execute("SELECT 1 FROM objects WHERE sha256 = ?", (sha256,)).fetchone() is None:
+                if zstandard is not None:
+                    codec, dict_id = 'zstd', self.current_dict_id
+                    stored = self._compressor(dict_id).compress(raw)
+                else:
+                    codec, dict_id = 'zlib', 0
+                    stored = zlib.compress(raw, 9)
+                object_path = self._object_path(sha256)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                temp_path = f"{object_path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(stored)
+                os.replace(temp_path, object_path)
+                self.conn.execute(
+                    "INSERT INTO objects (sha256, codec, dict_id, size, stored_size) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, codec, dict_id, len(raw), len(stored)),
+                )
+                if zstandard is not None and not self.current_dict_id:
+                    self.training_samples.append(raw)
+                    if len(self.training_samples) >= ARCHIVE_DICT_TRAINING_SAMPLES:
+                        self._train_dictionary()
+            self.conn.execute(
+                "INSERT INTO pages (url, source_url, lang, year, fetched_at, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+                (canonical_url, canonicalize_url(source_url or url), lang, current_year, fetched_at or time.time(), sha256),
+            )
+        return sha256
+
+    def get(self, sha256):
+        """ハッシュからHTML文字列を復元する"""
+        with self.lock:
+            return self._read_object(sha256).decode('utf-8')
+
+    def latest_detail_pages(self, years=None):
+        """
+        詳細ページ(日本語URL)ごとに最新の取得結果を (日本語URL, 年度, 日本語ハッシュ, 英語ハッシュ or None) のリストで返す。
+        years を指定した場合はその年度のみ。英語ページは日本語ページの後に記録されるため、最新の日本語ページより
+        後に記録された英語ページだけを返す (最新の取得で英語情報を再利用した場合は None)。
+        """
+        latest = {}
+        with self.lock:
+            rows = self.conn.execute("SELECT source_url, lang, year, fetched_at, sha256 FROM pages ORDER BY fetched_at, rowid").fetchall()
+        for source_url, lang, year, fetched_at, sha256 in rows:
+            if years is not None and year not in years:
+                continue
+            entry = latest.setdefault(source_url, {'year': year})
+            if lang == 'ja':
+                entry.pop('en', None) # 以前の取得の英語ページは使わない
+            entry[lang] = sha256
+        return [(source_url, entry['year'], entry['ja'], entry.get('en'))
+                for source_url, entry in latest.items() if 'ja' in entry]
+
+    def stats(self):
+        """保存済みページ数・オブジェクト数・元サイズ・保存サイズを返す"""
+        with self.lock:
+            page_count = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            object_count, size, stored_size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects"
+            ).fetchone()
+        return {'pages': page_count, 'objects': object_count, 'size': size, 'stored_size': stored_size}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+HTML_ARCHIVE = None # メイン処理で ARCHIVE_HTML が有効な場合に HtmlArchive を設定
+
+def archive_page(url, page_html, lang, current_year, source_url=None):
+    """取得したページをHTMLアーカイブに保存する (アーカイブ無効時は何もしない、失敗してもスクレイピングは継続)"""
+    if HTML_ARCHIVE is None or not page_html:
+        return
+    try:
+        HTML_ARCHIVE.put(url, page_html, lang, current_year, source_url)
+    except Exception as e:
+        print(f"           [警告] HTMLアーカイブへの保存に失敗 ({url}): {e}")
+
+# --- ★★★ 差分スクレイピング (前回から変化のない科目は前回の結果を再利用) ★★★
+
+FINGERPRINT_STORE = None # メイン処理でクロール状態ストアを設定 (科目ごとの指紋と前回の結果を保持)
+TRANSLATION_CACHE = None # メイン処理でクロール状態ストアを設定 (日本語の抽出内容 → 英語情報)
+_TRANSLATION_YEAR_PLACEHOLDER = '{year}' # 翻訳キャッシュに保存する際の年度の置き換え文字列
+_TRANSLATION_YEAR_FIELDS = ('semester',) # 年度の表記を含む項目 (年度・学期)。それ以外の自由記述は置き換えない
+
+_VOLATILE_HTML_PATTERNS = [
+    re.compile(r'<script\b.*?</script>', re.S | re.I),
+    re.compile(r'<style\b.*?</style>', re.S | re.I),
+    re.compile(r'<!--.*?-->', re.S),
+    re.compile(r'<meta\b[^>]*>', re.I),
+    re.compile(r'<input\b[^>]*type=["\']hidden["\'][^>]*>', re.I), # CSRFトークン等
+]
+
+def normalized_content_hash(page_html):
+    """
+    スクリプト・コメント・hidden入力など取得ごとに変わる部分を除いた本文のハッシュを返す。
+    ブラウザの page_source (DOMの再シリアライズ) とHTTPの生の本文で同じ値になるよう、
+    lxml で解析し直した <body> (ブラウザが補う <tbody> は除く) をシリアライズしてハッシュする。
+    """
+    content = page_html
+    for pattern in _VOLATILE_HTML_PATTERNS:
+        content = pattern.sub('', content)
+    body = None
+    if lxml_html is not None:
+        try:
+            body = parse_html_document(content).find('body')
+        except (etree.ParserError, ValueError):
+            body = None
+    if body is not None:
+        for tbody in list(body.iter('tbody')):
+            tbody.drop_tag()
+        content = lxml_html.tostring(body, encoding='unicode', method='html')
+    else:
+        body_match = re.search(r'<body\b.*</body>', content, re.S | re.I)
+        content = body_match.group(0) if body_match else content
+    content = re.sub(r'\s*(<[^>]*>)\s*', r'\1', content) # タグ前後の空白 (ブラウザが移動・補完する) は比較しない
+    content = re.sub(r'\s+', ' ', content).strip()
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def conditional_request_headers(syllabus_url):
+    """前回の ETag/Last-Modified から条件付きリクエストのヘッダーを作成する"""
+    if FINGERPRINT_STORE is None or not INCREMENTAL_MODE:
+        return {}
+    fingerprint = FINGERPRINT_STORE.get_fingerprint(syllabus_url)
+    headers = {}
+    if fingerprint and fingerprint['etag']:
+        headers['If-None-Match'] = fingerprint['etag']
+    if fingerprint and fingerprint['last_modified']:
+        headers['If-Modified-Since'] = fingerprint['last_modified']
+    return headers
+
+def find_unchanged_details(syllabus_url, page_html=None, status_code=None, headers=None):
+    """日本語詳細ページが前回から変化していなければ前回の詳細データを返す (変化あり/初回は None)"""
+    if FINGERPRINT_STORE is None or not INCREMENTAL_MODE:
+        return None
+    fingerprint = FINGERPRINT_STORE.get_fingerprint(syllabus_url)
+    if not fingerprint:
+        return None
+    headers = headers or {}
+    if status_code == 304:
+        return fingerprint['details']
+    if fingerprint['etag'] and headers.get('etag') == fingerprint['etag']:
+        return fingerprint['details']
+    if fingerprint['last_modified'] and headers.get('last-modified') == fingerprint['last_modified']:
+        return fingerprint['details']
+    if page_html is not None and normalized_content_hash(page_html) == fingerprint['content_hash']:
+        return fingerprint['details']
     return None
 
-def get_syllabus_details(driver, current_year, screenshots_dir):
+def has_previous_fingerprint(syllabus_url):
+    """このURLの前回の指紋があるか (日本語ページが変化していなければ英語ページは不要)"""
+    return FINGERPRINT_STORE is not None and INCREMENTAL_MODE and FINGERPRINT_STORE.get_fingerprint(syllabus_url) is not None
+
+def translation_may_be_reused(name, professor):
+    """日本語ページの (科目名, 担当者名) について保存済みの英語情報があるか (内容のハッシュまで一致すれば再利用できる)"""
+    return TRANSLATION_CACHE is not None and TRANSLATION_REUSE and TRANSLATION_CACHE.has_translation(name, professor)
+
+def can_skip_english_fetch(syllabus_url):
+    """
+    日本語ページを見るまで英語ページの取得を保留すべき場合に True を返す
+    (このURLの前回の指紋がある、または翻訳キャッシュに英語情報がある)。
+    翻訳キャッシュは日本語ページの (科目名, 担当者名) で引くため、保留した場合は日本語ページの取得後に
+    find_reused_translation() (タブの先読みでは translation_may_be_reused()) で英語ページが要るかを判定する。
+    """
+    if has_previous_fingerprint(syllabus_url):
+        return True
+    return TRANSLATION_CACHE is not None and TRANSLATION_REUSE and TRANSLATION_CACHE.has_any_translation()
+
+def _year_neutral(key, value, current_year):
+    """年度を含む項目 (_TRANSLATION_YEAR_FIELDS) だけ、年度の表記を置き換え文字列にする"""
+    if key not in _TRANSLATION_YEAR_FIELDS or not isinstance(value, str):
+        return value
+    return value.replace(str(current_year), _TRANSLATION_YEAR_PLACEHOLDER)
+
+def translation_cache_key(ja_raw, current_year):
+    """日本語の抽出結果から翻訳キャッシュのキー (科目名, 担当者名, 内容のハッシュ) を作る。年度の表記は除いて比較する"""
+    content = {key: _year_neutral(key, normalize_text(value) if value else "", current_year)
+               for key, value in ja_raw.items() if key != 'course_id_fallback'} # 登録番号は年度ごとに変わる
+    content_hash = hashlib.sha256(json.dumps(content, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    return content.get('name', ""), content.get('professor', ""), content_hash
+
+def find_reused_translation(ja_raw, current_year):
+    """日本語の抽出結果が以前に取得した科目と同一なら、そのとき抽出した英語情報 (当年度に置き換え済み) を返す"""
+    if TRANSLATION_CACHE is None or not TRANSLATION_REUSE:
+        return None
+    en_data = TRANSLATION_CACHE.get_translation(*translation_cache_key(ja_raw, current_year))
+    if en_data is None:
+        return None
+    print(f"           ♻️ 日本語の内容が以前に取得した科目と同一のため、英語情報を再利用します (英語ページの取得を省略)")
+    return {key: value.replace(_TRANSLATION_YEAR_PLACEHOLDER, str(current_year))
+            if key in _TRANSLATION_YEAR_FIELDS and isinstance(value, str) else value
+            for key, value in en_data.items()}
+
+def remember_translation(ja_raw, details, current_year):
+    """英語ページから抽出できた英語情報を、日本語の抽出結果をキーにして保存する"""
+    if TRANSLATION_CACHE is None or not details:
+        return
+    en_data = details['translations'].get('en', {})
+    if not en_data.get('name') or en_data['name'].startswith("Name Unknown"):
+        return # 英語ページを取得できなかった科目は保存しない
+    try:
+        TRANSLATION_CACHE.save_translation(
+            *translation_cache_key(ja_raw, current_year), current_year,
+            {key: _year_neutral(key, value, current_year) for key, value in en_data.items()}
+        )
+    except Exception as e:
+        print(f"           [警告] 英語情報の保存に失敗 ({details.get('course_id')}): {e}")
+
+def remember_fingerprint(syllabus_url, details, page_html, headers=None):
+    """抽出に成功した科目の指紋と詳細データを保存する"""
+    if FINGERPRINT_STORE is None or not details:
+        return
+    headers = headers or {}
+    try:
+        FINGERPRINT_STORE.save_fingerprint(
+            syllabus_url, headers.get('etag'), headers.get('last-modified'), normalized_content_hash(page_html), details
+        )
+    except Exception as e:
+        print(f"           [警告] 指紋の保存に失敗 ({syllabus_url}): {e}")
+
+# --- ★★★ 再解析 (リプレイ) モード: アーカイブから syllabus_data.json を再構築 ★★★ ---
+
+_REPLAY_ARCHIVE = None # 再解析ワーカープロセスごとの読み取り専用アーカイブ
+
+def _init_replay_worker(archive_root, crawl_state_path=None):
+    global _REPLAY_ARCHIVE, TRANSLATION_CACHE
+    _REPLAY_ARCHIVE = HtmlArchive(archive_root, read_only=True)
+    if crawl_state_path and os.path.exists(crawl_state_path):
+        # 英語情報を再利用した科目 (英語ページがアーカイブに無い) は、取得時と同じく翻訳キャッシュから補う
+        TRANSLATION_CACHE = CrawlStateStore(crawl_state_path, read_only=True)
+
+def _replay_detail_pages(task):
+    """ワーカープロセスで1科目分 (日・英) のHTMLを解析する。(日本語URL, 詳細 or None, エラー) を返す"""
+    japanese_url, current_year, ja_sha256, en_sha256 = task
+    try:
+        ja_html = _REPLAY_ARCHIVE.get(ja_sha256)
+        en_html = _REPLAY_ARCHIVE.get(en_sha256) if en_sha256 else None
+        return japanese_url, build_syllabus_details_from_html(ja_html, en_html, japanese_url, current_year), None
+    except Exception as e:
+        return japanese_url, None, f"{type(e).__name__}: {e}"
+
+def replay_archive(archive_root, output_json_path, years=None, workers=None, crawl_state_path=None):
+    """
+    ブラウザ・ネットワークを使わずに、HTMLアーカイブの全ページを INFO_MAP で再抽出し、
+    aggregate_syllabus_data で集約して output_json_path に書き出す。解析は全CPUコアのプロセスプールで行う。
+    crawl_state_path を指定すると、英語ページが無い科目は翻訳キャッシュの英語情報を使う。
+    """
+    if lxml_html is None:
+        print("[エラー] 再解析には lxml が必要です。")
+        return []
+    archive = HtmlArchive(archive_root, read_only=True)
+    try:
+        tasks = archive.latest_detail_pages(years)
+    finally:
+        archive.close()
+    workers = workers or os.cpu_count() or 1
+    print(f"再解析開始: {len(tasks)} 科目 (ワーカー数: {workers})")
+    replay_start_time = time.time()
+    raw_data = []
+    failed_count = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_replay_worker, initargs=(archive_root, crawl_state_path)) as executor:
+        for japanese_url, details, error in executor.map(_replay_detail_pages, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+            if details:
+                raw_data.append(details)
+            else:
+                failed_count += 1
+                print(f"   [警告] 再解析失敗: {japanese_url} ({error})")
+    print(f"再解析完了: {len(raw_data)} 件成功 / {failed_count} 件失敗 ({time.time() - replay_start_time:.2f}s)")
+    final_data = aggregate_syllabus_data(raw_data)
+    if final_data:
+        write_json_data(final_data, output_json_path)
+    else:
+        print("集約後データなし。JSON未作成。")
+    return final_data
+
+# --- ★★★ シラバス詳細の共通処理 (ブラウザ/HTTP 共通) ★★★ ---
+
+INVALID_COURSE_NAME_PATTERNS = ["慶應義塾大学 シラバス・時間割", "SFC Course Syllabus"]
+
+def resolve_info_maps(current_url, current_year):
+    """URLと年度からシステム種別を判定し、(日本語XPathマップ, 英語XPathマップ, 旧システムか) を返す"""
+    is_old_system = "syllabus.sfc.keio.ac.jp" in current_url
+    is_new_system = "gslbs.keio.jp" in current_url
+    if is_old_system or (current_year <= 2024 and not is_new_system):
+        # 旧システム用のXPath定義（SFC 2024年対応版）
+        return INFO_MAP_JA_2023_2024.copy(), INFO_MAP_EN_2023_2024.copy(), True
+    # 新システム用のXPath定義（2025年以降用）
+    return INFO_MAP_JA_2025.copy(), INFO_MAP_EN_2025.copy(), False
+
+def extract_course_id_from_url(current_url, current_year):
+    """詳細ページのURLから Course ID を抽出する (見つからない場合は None)"""
+    if "syllabus.sfc.keio.ac.jp" in current_url or current_year <= 2024:
+        # 旧システム用のコースID取得パターン
+        id_match = re.search(r'/courses/\d+_(\d+)', current_url) or \
+                re.search(r'\?id=(\d+)', current_url)
+    else:
+        # 新システム用のコースID取得パターン - 2025 format
+        id_match = re.search(r'[?&](?:id|entno)=(\d+)', current_url) or \
+                re.search(r'/courses/\d+_(\d+)', current_url) or \
+                re.search(r'/syllabus/(\d+)', current_url) or \
+                re.search(r'ttblyr=\d+&entno=(\d+)', current_url)
+    return id_match.group(1) if id_match else None
+
+def build_english_url(current_url, current_year):
+    """日本語ページのURLから英語ページのURLを生成する (旧システム: locale=en / 新システム: lang=en)"""
+    if "syllabus.sfc.keio.ac.jp" in current_url or current_year <= 2024:
+        # Old system URL for 2024 or older uses locale=en
+        if "locale=ja" in current_url:
+            return current_url.replace("locale=ja", "locale=en")
+        if "locale=" not in current_url:
+            return current_url + ("&" if "?" in current_url else "?") + "locale=en"
+        return current_url
+    # New system URL generation (2025+)
+    if "lang=jp" in current_url:
+        return current_url.replace("lang=jp", "lang=en")
+    if "lang=" not in current_url:
+        return current_url + ("&" if "?" in current_url else "?") + "lang=en"
+    return current_url
+
+def apply_extraction_defaults(raw_values, info_map, name_default=None):
+    """抽出結果を正規化し、空の項目をXPathマップのデフォルト値で埋める"""
+    data = {}
+    for key, (_, _, default_value, *_) in info_map.items():
+        if key == 'course_id_fallback': continue
+        if key == 'name' and name_default:
+            default_value = name_default
+        value = raw_values.get(key, "")
+        data[key] = normalize_text(value) if value else default_value
+    return data
+
+def default_english_data(en_map, course_id):
+    """英語ページが取得できない場合のデフォルト英語データを返す"""
+    name_default_en = f"Name Unknown-{course_id}"
+    return {key: (default_value_en if key != 'name' else name_default_en)
+            for key, (_, _, default_value_en, *_) in en_map.items()}
+
+def finalize_japanese_data(ja_data, ja_map, current_year, current_url):
+    """日本語データの補完・TTCK/オンライン調整・必須チェックを行う (必須データ欠落時は MissingCriticalDataError)"""
+    critical_data_missing_ja = False
+    missing_details_ja = []
+    optional_keys = ['professor', 'selection_method', 'class_format', 'location', 'day_period']
+
+    for key, (label, xpath, default_value, *_) in ja_map.items():
+        if key == 'course_id_fallback': continue
+
+        # 2024年度シラバスの場合、学期情報がない場合はURLから取得
+        if current_year <= 2024 and key == 'semester' and (ja_data[key] == default_value or not ja_data[key]):
+            year_match = re.search(r'/(\d{4})_', current_url)
+            if year_match:
+                ja_data[key] = f"{year_match.group(1)}年度"
+                print(f"               学期情報補完: {ja_data[key]}")
+
+        # 必須チェック (TTCK/Online処理前)
+        if key not in optional_keys:
+            if key == 'name':
+                if ja_data[key] == default_value or any(pattern in ja_data[key] for pattern in INVALID_COURSE_NAME_PATTERNS):
+                    critical_data_missing_ja = True
+                    missing_details_ja.append(f"{label}(ja): 不適切「{ja_data[key]}」")
+            elif ja_data[key] == default_value or not ja_data[key]:
+                if xpath:  # XPathが定義されている場合のみエラー対象
+                    # 2024年以前のシラバスでは一部のフィールドを必須としない
+                    if current_year <= 2024 and key in ['semester', 'credits', 'field']:
+                        print(f"               2024年シラバス: {label}情報が不明でも処理継続")
+                    else:
+                        critical_data_missing_ja = True
+                    missing_details_ja.append(f"{label}(ja): 未取得/空")
+
+    # --- Online/TTCK処理 (日本語) ---
+    is_ttck_ja = "TTCK" in ja_data.get('name', '')
+    is_online_ja = "オンライン" in ja_data.get('class_format', '') or "オンデマンド" in ja_data.get('class_format', '')
+
+    if is_ttck_ja:
+        print("               日本語: TTCKコース検出。教室と曜日時限を調整します。")
+        ja_data['location'] = "TTCK"
+        if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
+            ja_data['day_period'] = "特定期間集中"
+    elif is_online_ja:
+        print("               日本語: オンライン授業検出。教室と曜日時限を調整します。")
+        ja_data['location'] = "オンライン"
+        if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
+            ja_data['day_period'] = "オンライン授業"
+
+    # --- 必須データ最終チェック (日本語) ---
+    if not is_ttck_ja:
+        print(f"               取得データ: 教室=「{ja_data.get('location')}」, 曜日時限=「{ja_data.get('day_period')}」")
+
+        if not ja_data.get('location') or ja_data.get('location') == "教室不明":
+            if not is_online_ja:
+                # 2024年以前のシラバスでは教室情報が必須でなくなる
+                if current_year <= 2024:
+                    print("               2024年以前のシラバス: 教室情報が不明でも処理継続")
+                    ja_data['location'] = "教室情報なし(2024年以前)"
+                else:
+                    critical_data_missing_ja = True
+                    missing_details_ja.append("教室(ja): 未取得/空")
+
+        if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
+            # 2024年以前のシラバスでは曜日時限情報が必須でなくなる
+            if current_year <= 2024:
+                print("               2024年以前のシラバス: 曜日時限情報が不明でも処理継続")
+                ja_data['day_period'] = "曜日時限情報なし(2024年以前)"
+            else:
+                critical_data_missing_ja = True
+                missing_details_ja.append("曜日時限(ja): 未取得/空")
+
+    if critical_data_missing_ja:
+        raise MissingCriticalDataError(f"必須日本語データ取得失敗 (URL: {current_url}): {'; '.join(missing_details_ja)}")
+    return ja_data
+
+def finalize_english_data(en_data, ja_data):
+    """英語データのTTCK/オンライン調整を行う"""
+    is_ttck_en = ("TTCK" in en_data.get('name', '')) or ("TTCK" in ja_data.get('name', ''))
+    en_class_format_lower = en_data.get('class_format', '').lower()
+    is_online_en = "online" in en_class_format_lower or "remote" in en_class_format_lower
+
+    if is_ttck_en:
+        print("               英語: TTCKコース検出。教室と曜日時限を調整します。")
+        en_data['location'] = "TTCK"
+        if not en_data.get('day_period') or en_data.get('day_period') == "Day/Period Unknown":
+            en_data['day_period'] = "Intensive Course"
+    elif is_online_en:
+        print("               英語: オンライン授業検出。教室を調整します。")
+        en_data['location'] = "Online"
+    return en_data
+
+def build_final_details(course_id, current_year, ja_data, en_data, ja_map):
+    """日本語・英語データから最終的なシラバス詳細オブジェクトを構築する"""
+    final_details = {
+        'course_id': course_id,
+        'year_scraped': current_year,
+        'translations': {
+            'ja': {},
+            'en': {}
+        }
+    }
+
+    all_keys_to_copy = [k for k in ja_map.keys() if k != 'course_id_fallback']
+
+    # 日本語データを構成
+    for key in all_keys_to_copy:
+        final_details['translations']['ja'][key] = ja_data.get(key, "")
+
+    # 英語データを構成
+    for key in all_keys_to_copy:
+        final_details['translations']['en'][key] = en_data.get(key, "")
+
+    # --- トップレベルの情報を設定 (補足用) ---
+    semester_en_raw = final_details['translations']['en'].get('semester', '')
+    semester_ja_raw = final_details['translations']['ja'].get('semester', '')
+    final_details['semester'] = extract_season(semester_en_raw) if extract_season(semester_en_raw) != "unknown" else extract_season(semester_ja_raw)
+    final_details['professor_ja'] = final_details['translations']['ja'].get('professor', '')
+    final_details['name_ja'] = final_details['translations']['ja'].get('name', '')
+    final_details['field_ja'] = final_details['translations']['ja'].get('field', '')
+    final_details['credits_ja'] = final_details['translations']['ja'].get('credits', '')
+    return final_details
+
+# --- ★★★ 詳細タブの先読み ('browser' モード) ★★★ ---
+def open_background_tab(driver, url):
+    """新しいタブで url の読み込みを開始し (完了は待たない)、元のタブに戻って新しいタブのハンドルを返す"""
+    return_to = driver.current_window_handle
+    driver.switch_to.new_window('tab')
+    handle = driver.current_window_handle
+    try:
+        driver.execute_script("window.location.href = arguments[0];", url)
+    except WebDriverException:
+        driver.close()
+        raise
+    finally:
+        driver.switch_to.window(return_to)
+    return handle
+
+def close_tab(driver, handle, return_to):
+    """タブを閉じて return_to のタブに戻る (既に閉じられている場合は何もしない)"""
+    try:
+        if handle is not None and handle in driver.window_handles:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(return_to)
+    except WebDriverException as e:
+        print(f"           [警告] タブを閉じる際にエラー: {e}")
+
+def navigate_detail_page(driver, syllabus_url, current_year):
+    """
+    現在のタブで詳細ページに遷移する。PARALLEL_LANGUAGE_TABS が有効なら先に英語ページを別タブで読み込み始め、
+    そのタブのハンドル (get_syllabus_details の english_handle に渡す) を返す。
+    日本語ページ次第で英語ページを省ける場合 (can_skip_english_fetch) は英語タブを開かない。
+    """
+    english_handle = None
+    if PARALLEL_LANGUAGE_TABS and not can_skip_english_fetch(syllabus_url):
+        try:
+            english_handle = open_background_tab(driver, build_english_url(syllabus_url, current_year))
+        except WebDriverException as e:
+            print(f"           [警告] 英語ページのタブを開けませんでした: {e}。日本語ページの後に取得します。")
+    try:
+        driver.get(syllabus_url)
+    except Exception:
+        close_tab(driver, english_handle, driver.current_window_handle)
+        raise
+    return english_handle
+
+# 読み込み済みの日本語タブから翻訳キャッシュのキー (科目名, 担当者名) の元になるテキストを読む
+_READ_COURSE_IDENTITY_JS = """
+    if (document.readyState !== 'complete') return null;
+    function text(xpath) {
+        return document.evaluate('string(' + xpath + ')', document, null, XPathResult.STRING_TYPE, null).stringValue;
+    }
+    var name = text(arguments[0]);
+    return name.trim() ? [name, text(arguments[1])] : null;
+"""
+
+def read_course_identity(driver, handle, syllabus_url, current_year):
+    """handle のタブの日本語ページから (科目名, 担当者名) を読む (読み込み中・取得できない場合は None)"""
+    ja_map_to_use, _, _ = resolve_info_maps(syllabus_url, current_year)
+    return_to = driver.current_window_handle
+    try:
+        driver.switch_to.window(handle)
+        values = driver.execute_script(_READ_COURSE_IDENTITY_JS, ja_map_to_use['name'][1], ja_map_to_use['professor'][1])
+    except WebDriverException:
+        values = None
+    finally:
+        driver.switch_to.window(return_to)
+    if not values:
+        return None
+    return normalize_text(values[0]), normalize_text(values[1])
+
+class DetailTabPrefetcher:
+    """
+    処理中の詳細ページを解析している間に、次の URL (とその英語ページ) を別タブで読み込み始めておく。
+    depth 件先まで先読みし、take() で読み込み中/読み込み済みのタブを受け取る。
+    翻訳キャッシュを使える場合は、日本語タブの読み込み後に (科目名, 担当者名) を見てから英語タブを開くか決める。
+    """
+    def __init__(self, depth):
+        self.depth = depth
+        self.tabs = {} # syllabus_url -> (日本語タブ, 英語タブ)
+        self.pending_english = {} # 英語タブを開くか未判定の syllabus_url -> 年度
+
+    def prefetch(self, driver, upcoming_urls, current_year):
+        """upcoming_urls の先頭 depth 件のうち、まだタブを開いていない URL の読み込みを開始する"""
+        for syllabus_url in list(self.pending_english):
+            self._decide_english(driver, syllabus_url)
+        for syllabus_url in list(dict.fromkeys(upcoming_urls))[:self.depth]:
+            if syllabus_url in self.tabs:
+                continue
+            try:
+                japanese_tab = open_background_tab(driver, syllabus_url)
+            except WebDriverException as e:
+                print(f"           [警告] 先読みタブを開けませんでした: {e}")
+                return
+            self.tabs[syllabus_url] = (japanese_tab, None)
+            if not can_skip_english_fetch(syllabus_url):
+                self._open_english(driver, syllabus_url, current_year)
+            elif not has_previous_fingerprint(syllabus_url):
+                self.pending_english[syllabus_url] = current_year # 日本語タブの読み込み後に判定する
+
+    def _open_english(self, driver, syllabus_url, current_year):
+        japanese_tab, _ = self.tabs[syllabus_url]
+        try:
+            english_tab = open_background_tab(driver, build_english_url(syllabus_url, current_year))
+        except WebDriverException as e:
+            print(f"           [警告] 英語ページの先読みタブを開けませんでした: {e}")
+            return
+        self.tabs[syllabus_url] = (japanese_tab, english_tab)
+
+    def _decide_english(self, driver, syllabus_url):
+        """日本語タブが読み込み済みなら、その (科目名, 担当者名) の英語情報が無い場合だけ英語タブを開く"""
+        current_year = self.pending_english[syllabus_url]
+        identity = read_course_identity(driver, self.tabs[syllabus_url][0], syllabus_url, current_year)
+        if identity is None:
+            return # まだ読み込み中
+        del self.pending_english[syllabus_url]
+        if not translation_may_be_reused(*identity):
+            self._open_english(driver, syllabus_url, current_year)
+
+    def take(self, driver, syllabus_url):
+        """先読み済みの (日本語タブ, 英語タブ) を返す。無い場合 (またはタブが失われた場合) は (None, None)"""
+        if syllabus_url in self.pending_english and syllabus_url in self.tabs:
+            self._decide_english(driver, syllabus_url)
+        self.pending_english.pop(syllabus_url, None)
+        japanese_tab, english_tab = self.tabs.pop(syllabus_url, (None, None))
+        if japanese_tab is None:
+            return None, None
+        try:
+            open_handles = set(driver.window_handles)
+        except WebDriverException:
+            return None, None
+        if japanese_tab not in open_handles:
+            if english_tab in open_handles:
+                close_tab(driver, english_tab, driver.current_window_handle)
+            return None, None
+        return japanese_tab, (english_tab if english_tab in open_handles else None)
+
+    def discard_all(self, driver):
+        """使われなかった先読みタブをすべて閉じる"""
+        self.pending_english.clear()
+        if not self.tabs:
+            return
+        try:
+            return_to = driver.current_window_handle
+        except WebDriverException:
+            self.tabs.clear()
+            return
+        for japanese_tab, english_tab in self.tabs.values():
+            close_tab(driver, japanese_tab, return_to)
+            close_tab(driver, english_tab, return_to)
+        self.tabs.clear()
+
+def get_syllabus_details(driver, current_year, screenshots_dir, english_handle=None):
+    """
+    シラバス詳細ページから指定された日本語と英語の情報を取得。
+    english_handle を指定すると、英語ページはそのタブ (読み込み開始済み) から取得し、処理後にタブを閉じる。
+    """
+    if english_handle is None:
+        return _get_syllabus_details(driver, current_year, screenshots_dir)
+    japanese_handle = driver.current_window_handle
+    try:
+        return _get_syllabus_details(driver, current_year, screenshots_dir, english_handle)
+    finally:
+        close_tab(driver, english_handle, japanese_handle)
+
+def _get_syllabus_details(driver, current_year, screenshots_dir, english_handle=None):
     """
     シラバス詳細ページから指定された日本語と英語の情報を取得。
     日本語ページと英語ページを個別に処理し、それぞれの言語の情報を格納する。
@@ -803,27 +1948,29 @@ def get_syllabus_details(driver, current_year, screenshots_dir):
     # IMPORTANT: This function MUST process both Japanese and English data
     # Debug flag to trace function execution
     DEBUG_TRACE = True
-    
+
     if DEBUG_TRACE:
         print("DEBUG: Starting get_syllabus_details - will process both Japanese and English")
-    
+
     # Add timer for detailed logging
     detail_start_time = time.time()
-    
+
     ja_data = {}  # 日本語ページから取得したデータ
     en_data = {}  # 英語ページから取得したデータ
     course_id = None
-    japanese_url = "N/A"
     english_url = "N/A"  # 英語URLも初期化
 
     # シラバスログイン要求の検出と処理
-    login_message = driver.find_elements(By.XPATH, "//div[@class='info-login']")
-    if login_message:
+    page_type, _ = classify_page(driver)
+    if page_type == PAGE_SESSION_TIMEOUT:
+        save_screenshot(driver, f"session_timeout_detail_{current_year}", screenshots_dir)
+        raise InvalidSessionIdException("Session timeout on detail page")
+    if page_type == PAGE_LOGIN_REQUIRED:
         print(f"    [{time.strftime('%H:%M:%S')}] ⚠️ Login required message detected in syllabus")
         print(f"    [{time.strftime('%H:%M:%S')}] ℹ️ Will attempt to extract ALL available data (including semester, professor, credits, field)")
         # スクリーンショット保存
         save_screenshot(driver, f"login_required_{current_year}", screenshots_dir)
-        
+
         # Check for basic elements in the page structure to help debug
         basic_elements = [
             "//div[@class='subject']//dt[text()='単位']",
@@ -840,42 +1987,32 @@ def get_syllabus_details(driver, current_year, screenshots_dir):
 
     # システムタイプを判定
     current_url = driver.current_url
-    is_old_system = "syllabus.sfc.keio.ac.jp" in current_url
-    is_new_system = "gslbs.keio.jp" in current_url
-    
-    if is_old_system or (current_year <= 2024 and not is_new_system):
+    japanese_url = current_url
+    ja_map_to_use, en_map_to_use, is_old_system = resolve_info_maps(current_url, current_year)
+    if is_old_system:
         print(f"    [{time.strftime('%H:%M:%S')}] 📋 Processing old system syllabus (pre-2024)")
-        # 旧システム用のXPath定義（SFC 2024年対応版）
-        ja_map_to_use = INFO_MAP_JA_2023_2024.copy()  # Use the 2023/2024 mapping
-        en_map_to_use = INFO_MAP_EN_2023_2024.copy()  # Use the 2023/2024 mapping
     else:
         print(f"    [{time.strftime('%H:%M:%S')}] 📋 Processing new system syllabus (2025+)")
-        # 新システム用のXPath定義（2025年以降用）
-        ja_map_to_use = INFO_MAP_JA_2025.copy()
-        en_map_to_use = INFO_MAP_EN_2025.copy()
+
+    # --- 日本語ページの一括取得 (page_source 1回 + lxmlでのオフライン解析) ---
+    ja_html = driver.page_source
+    archive_page(japanese_url, ja_html, 'ja', current_year)
+    unchanged_details = find_unchanged_details(japanese_url, page_html=ja_html)
+    if unchanged_details:
+        print(f"    [{time.strftime('%H:%M:%S')}] ♻️ 前回から変更なし。英語ページの取得と抽出を省略します (ID: {unchanged_details.get('course_id')})")
+        return unchanged_details
+    batch_results = extract_fields_from_driver(driver, ja_map_to_use, ja_html)
+    ja_raw = batch_results
 
     # --- Course ID 取得 ---
     print(f"    [{time.strftime('%H:%M:%S')}] 🔢 Extracting course ID")
     try:
-        # 旧システムと新システムで異なるパターンを使用
-        if is_old_system or current_year <= 2024:
-            # 旧システム用のコースID取得パターン
-            id_match = re.search(r'/courses/\d+_(\d+)', current_url) or \
-                    re.search(r'\?id=(\d+)', current_url)
-        else:
-            # 新システム用のコースID取得パターン - 2025 format
-            id_match = re.search(r'[?&](?:id|entno)=(\d+)', current_url) or \
-                    re.search(r'/courses/\d+_(\d+)', current_url) or \
-                    re.search(r'/syllabus/(\d+)', current_url) or \
-                    re.search(r'ttblyr=\d+&entno=(\d+)', current_url) 
-            
-        if id_match:
-            course_id = id_match.group(1)
-        else:
+        course_id = extract_course_id_from_url(current_url, current_year)
+        if not course_id:
             course_id_xpath = ja_map_to_use.get('course_id_fallback', [None, None])[1]
             if course_id_xpath:
                 print(f"               URLからID取得失敗。XPathで試行: {course_id_xpath}")
-                reg_num = get_text_by_xpath(driver, course_id_xpath)
+                reg_num = batch_results.get('course_id_fallback') or get_text_by_xpath(driver, course_id_xpath)
                 if reg_num and reg_num.isdigit():
                     course_id = reg_num
                 else:
@@ -894,188 +2031,60 @@ def get_syllabus_details(driver, current_year, screenshots_dir):
     if course_id:
         print(f"    [{time.strftime('%H:%M:%S')}] ✅ Course ID found: {course_id}")
     else:
-        print(f"    [{time.strftime('%H:%M:%S')}] ⚠️ Failed to find Course ID, trying alternative methods")
-
-    if not course_id:
         print(f"    [{time.strftime('%H:%M:%S')}] ❌ Critical: Failed to find Course ID")
         raise MissingCriticalDataError(f"必須データ(Course ID)の取得に失敗 (URL: {japanese_url})")
     print(f"               Course ID: {course_id}")
 
-    # --- 日本語情報取得ループ ---
+    # --- 日本語情報取得 ---
     print(f"    [{time.strftime('%H:%M:%S')}] 📝 Extracting Japanese syllabus data")
-    name_default_ja = f"名称不明-{course_id}"
-    name_tuple_ja = ja_map_to_use['name']
-    ja_map_to_use['name'] = (name_tuple_ja[0], name_tuple_ja[1], name_default_ja)
+    print("           --- 日本語情報取得開始 ---")
+    ja_data = apply_extraction_defaults(batch_results, ja_map_to_use, f"名称不明-{course_id}")
 
-    INVALID_COURSE_NAME_PATTERNS = ["慶應義塾大学 シラバス・時間割", "SFC Course Syllabus"]
-    critical_data_missing_ja = False  # 日本語データ用のフラグ
-    missing_details_ja = []  # 日本語データ用のリスト
+    print("           取得した日本語データ:")
+    print(f"           - 名称: {ja_data.get('name', 'N/A')}")
+    print(f"           - 学期: {ja_data.get('semester', 'N/A')}")
+    print(f"           - 教室: {ja_data.get('location', 'N/A')}")
+    print(f"           - 単位: {ja_data.get('credits', 'N/A')}")
+    print(f"           - 分野: {ja_data.get('field', 'N/A')}")
 
-    print("           --- 日本語情報取得開始 ---")
-    
-    # Use the same successful batch retrieval approach used for English data
-    print("           日本語情報を一括取得中...")
-    
-    # Try the exact same JavaScript batch approach that works for English
-    try:
-        # Create dictionary of XPaths to query in a single JavaScript execution
-        xpath_dict = {}
-        for key, (label, xpath, default_value, *_) in ja_map_to_use.items():
-            if key != 'course_id_fallback':
-                xpath_dict[key] = xpath
-        
-        # Use the same function that successfully extracts English data
-        batch_results = get_multiple_elements_text(driver, ja_map_to_use)
-        
-        # Populate ja_data with the results
-        for key, (_, _, default_value, *_) in ja_map_to_use.items():
-            if key != 'course_id_fallback':
-                value = batch_results.get(key, "")
-                ja_data[key] = normalize_text(value) if value else default_value
-        
-        # Show what we found
-        print("           日本語情報の一括取得に成功しました")
-        print("           取得した日本語データ:")
-        print(f"           - 名称: {ja_data.get('name', 'N/A')}")
-        print(f"           - 学期: {ja_data.get('semester', 'N/A')}")
-        print(f"           - 教室: {ja_data.get('location', 'N/A')}")
-        print(f"           - 単位: {ja_data.get('credits', 'N/A')}")
-        print(f"           - 分野: {ja_data.get('field', 'N/A')}")
-        
-        if DEBUG_TRACE:
-            print("DEBUG: Japanese data extraction completed successfully via batch method")
-            print("DEBUG: Will proceed to English data extraction next")
-        
-        print("           --- 日本語情報取得完了 ---")
-        # DO NOT RETURN HERE - MUST CONTINUE TO ENGLISH EXTRACTION
-        
-        # IMPORTANT: Don't return yet - continue to English extraction
-    
-    except Exception as e:
-        print(f"           [警告] 日本語データの一括取得中にエラー: {e}")
-        
-        # Fall back to individual extraction if batch fails
-        for key, (label, xpath, default_value, *_) in ja_map_to_use.items():
-            if key == 'course_id_fallback': continue
-            ja_data[key] = get_text_by_xpath(driver, xpath, default_value)
-            
-            # 2024年度シラバスの場合、学期情報がない場合はURLから取得
-            if current_year <= 2024 and key == 'semester' and (ja_data[key] == default_value or not ja_data[key]):
-                # URLから年度を抽出
-                year_match = re.search(r'/(\d{4})_', current_url)
-                if year_match:
-                    year = year_match.group(1)
-                    ja_data[key] = f"{year}年度"
-                    print(f"               学期情報補完: {ja_data[key]}")
-                    
-            # 必須チェック (TTCK/Online処理前)
-            optional_keys = ['professor', 'selection_method', 'class_format', 'location', 'day_period'] 
-            if key not in optional_keys:
-                if key == 'name':
-                    if ja_data[key] == default_value or any(pattern in ja_data[key] for pattern in INVALID_COURSE_NAME_PATTERNS):
-                        critical_data_missing_ja = True
-                        missing_details_ja.append(f"{label}(ja): 不適切「{ja_data[key]}」")
-                elif ja_data[key] == default_value or not ja_data[key]:
-                    if xpath:  # XPathが定義されている場合のみエラー対象
-                        # 2024年以前のシラバスでは一部のフィールドを必須としない
-                        if current_year <= 2024 and key in ['semester', 'credits', 'field']:
-                            print(f"               2024年シラバス: {label}情報が不明でも処理継続")
-                        else:
-                            critical_data_missing_ja = True
-                        missing_details_ja.append(f"{label}(ja): 未取得/空")
-
-        # --- Online/TTCK処理 (日本語) ---
-        is_ttck_ja = "TTCK" in ja_data.get('name', '')
-        is_online_ja = "オンライン" in ja_data.get('class_format', '') or "オンデマンド" in ja_data.get('class_format', '')
-
-        if is_ttck_ja:
-            print("               日本語: TTCKコース検出。教室と曜日時限を調整します。")
-            ja_data['location'] = "TTCK"
-            if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
-                ja_data['day_period'] = "特定期間集中"
-        elif is_online_ja:
-            print("               日本語: オンライン授業検出。教室と曜日時限を調整します。")
-            ja_data['location'] = "オンライン"
-            if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
-                ja_data['day_period'] = "オンライン授業"
-
-        # --- 必須データ最終チェック (日本語) ---
-        if not is_ttck_ja:
-            # 取得したデータの情報を表示
-            print(f"               取得データ: 教室=「{ja_data.get('location')}」, 曜日時限=「{ja_data.get('day_period')}」")
-            
-            if not ja_data.get('location') or ja_data.get('location') == "教室不明":
-                if not is_online_ja:
-                    # 2024年以前のシラバスでは教室情報が必須でなくなる
-                    if current_year <= 2024:
-                        print("               2024年以前のシラバス: 教室情報が不明でも処理継続")
-                        ja_data['location'] = "教室情報なし(2024年以前)"
-                    else:
-                        critical_data_missing_ja = True
-                        missing_details_ja.append("教室(ja): 未取得/空")
-            
-            if not ja_data.get('day_period') or ja_data.get('day_period') == "曜日時限不明":
-                # 2024年以前のシラバスでは曜日時限情報が必須でなくなる
-                if current_year <= 2024:
-                    print("               2024年以前のシラバス: 曜日時限情報が不明でも処理継続")
-                    ja_data['day_period'] = "曜日時限情報なし(2024年以前)"
-                else:
-                    critical_data_missing_ja = True
-                    missing_details_ja.append("曜日時限(ja): 未取得/空")
+    ja_data = finalize_japanese_data(ja_data, ja_map_to_use, current_year, japanese_url)
+    print("           --- 日本語情報取得完了 ---")
 
-        if critical_data_missing_ja:
-            raise MissingCriticalDataError(f"必須日本語データ取得失敗 (URL: {japanese_url}): {'; '.join(missing_details_ja)}")
+    # After Japanese extraction - proceed to English extraction
+    ja_elapsed = time.time() - detail_start_time
+    print(f"    [{time.strftime('%H:%M:%S')}] ✅ Japanese data extracted ({ja_elapsed:.2f}s)")
 
-        print("           --- 日本語情報取得完了 ---")
+    # --- 2. 英語ページの情報を取得 ---
+    # English page processing
+    english_start_time = time.time()
+    print(f"    [{time.strftime('%H:%M:%S')}] 🇬🇧 Processing English page")
 
-        # After Japanese extraction - proceed to English extraction
-        ja_elapsed = time.time() - detail_start_time
-        print(f"    [{time.strftime('%H:%M:%S')}] ✅ Japanese data extracted ({ja_elapsed:.2f}s)")
-        
-        # --- 2. 英語ページの情報を取得 ---
-        # English page processing
-        english_start_time = time.time()
-        print(f"    [{time.strftime('%H:%M:%S')}] 🇬🇧 Processing English page")
-        
-        if DEBUG_TRACE:
-            print("DEBUG: Starting English page processing - WILL extract English data")
-            # Dump current URL to verify we're on the right page
-            print(f"DEBUG: Current URL before English processing: {driver.current_url}")
+    if DEBUG_TRACE:
+        print("DEBUG: Starting English page processing - WILL extract English data")
+        # Dump current URL to verify we're on the right page
+        print(f"DEBUG: Current URL before English processing: {driver.current_url}")
 
+    reused_en_data = find_reused_translation(ja_raw, current_year)
+    if reused_en_data is not None:
+        en_data = reused_en_data
+    else:
         # Generate English URL
-        if is_old_system or current_year <= 2024:
-            # Old system URL for 2024 or older uses locale=en
-            if "locale=ja" in current_url:
-                english_url = current_url.replace("locale=ja", "locale=en")
-                print(f"           英語URL生成: locale=ja → locale=en")
-            elif "locale=" not in current_url:
-                english_url = current_url + ("&" if "?" in current_url else "?") + "locale=en"
-                print(f"           英語URL生成: locale=en パラメータを追加")
-            else:
-                english_url = current_url
-                print(f"           英語URL: 変更なし (既にlocale指定あり)")
-            
-            # ログ出力
-            print(f"           変換後の英語URL: {english_url}")
-        else:
-            # New system URL generation (2025+)
-            if "lang=jp" in current_url:
-                english_url = current_url.replace("lang=jp", "lang=en")
-            elif "lang=" not in current_url:
-                english_url = current_url + ("&" if "?" in current_url else "?") + "lang=en"
-            else:
-                english_url = current_url
-
+        english_url = build_english_url(current_url, current_year)
         print(f"           英語ページ処理中: {english_url}")
         try:
             print(f"           英語ページに切り替え中...")
-            
+
+            if english_handle is not None:
+                # 先読みで英語ページの読み込みを開始済みのタブに切り替える
+                print(f"           先読み済みの英語タブに切り替え")
+                driver.switch_to.window(english_handle)
             # 2024年以前のシラバスは直接URLに遷移
-            if is_old_system or current_year <= 2024:
+            elif is_old_system or current_year <= 2024:
                 print(f"           2024年以前のシラバス: 直接locale=enのURLに遷移")
                 driver.get(english_url)
             else:
                 # 2025年以降: Use JavaScript to switch to English page
+                mark_page_stale(driver, 'english')  # 日本語ページの要素を英語ページ完了と誤認しないよう印を付ける
                 js_switch_to_en = """
                     // Optimized language switching function
                     function switchToEnglish() {
@@ -1095,148 +2104,68 @@ def get_syllabus_details(driver, current_year, screenshots_dir):
                     return switchToEnglish();
                 """
                 used_button = driver.execute_script(js_switch_to_en)
-            
-            # Wait for page to be ready using conditional waiting instead of fixed sleep
-            if is_old_system or current_year <= 2024:
-                # For 2024 or older syllabuses, wait for the page to load after direct navigation
-                WebDriverWait(driver, SHORT_WAIT).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-            elif used_button:
-                # For button click in 2025+ syllabuses, wait for English UI to load
-                try:
-                    WebDriverWait(driver, SHORT_WAIT).until(
-                        EC.presence_of_element_located((By.XPATH, "//h2[@class='class-name']"))
-                    )
-                except TimeoutException:
-                    # If timeout, the element might already be present or have a different structure
-                    print(f"           英語ページ要素待機タイムアウト - 処理継続")
-            else:
-                # For URL navigation, we need to wait for body to load
-                WebDriverWait(driver, min(10, ELEMENT_WAIT_TIMEOUT)).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-            
+
+            # Wait until the English page is actually displayed (URL/lang switched and detail elements rendered)
+            if not wait_for_page_ready(driver, 'english'):
+                # If timeout, the element might already be present or have a different structure
+                print(f"           英語ページ要素待機タイムアウト - 処理継続")
+
             # Debug: Add confirmation that we've reached this point
             if DEBUG_TRACE:
                 print("DEBUG: English page loaded successfully")
                 print(f"DEBUG: Current URL after English processing: {driver.current_url}")
-                
+
+            # セッション切れは英語データ欠落として保存せず、呼び出し側の再ログインに任せる
+            en_page_type, _ = classify_page(driver)
+            if en_page_type == PAGE_SESSION_TIMEOUT:
+                save_screenshot(driver, f"session_timeout_english_{current_year}_{course_id}", screenshots_dir)
+                raise InvalidSessionIdException("Session timeout on English page")
+
             # Check if this is an error page
-            if is_error_page(driver):
+            if is_error_page(driver, en_page_type):
                 print(f"           [情報] 英語ページでエラーページを検出しました。英語情報は一部欠落します。")
                 save_screenshot(driver, f"error_page_english_{current_year}_{course_id}", screenshots_dir)
                 print("           英語ページはスキップして日本語情報のみで進めます。")
                 # Set default English data
-                en_data = {}
-                name_default_en = f"Name Unknown-{course_id}"
-                for key, (_, _, default_value_en, *_) in en_map_to_use.items():
-                    en_data[key] = default_value_en if key != 'name' else name_default_en
+                en_data = default_english_data(en_map_to_use, course_id)
             else:
                 # No need for JS rendering wait - directly proceed to data extraction
                 print(f"           英語ページ読み込み完了。情報取得試行...")
-                
+
                 # Verify we're actually on an English page
                 if "locale=en" in driver.current_url or "lang=en" in driver.current_url:
                     print("           英語ページURLを確認: OK")
                 else:
                     print(f"           ⚠️ Warning: URL does not contain English locale marker: {driver.current_url}")
-                
+
                 print("           --- 英語情報取得開始 ---")
-                
-                # Batch retrieval of English data using JavaScript
+
+                # 英語ページも page_source 1回で一括取得し、lxmlで解析する
                 print("           英語情報を一括取得中...")
-                en_data = {}
                 name_default_en = f"Name Unknown-{course_id}"
-                
-                # For 2024 or older syllabus, dump page source for debugging if needed
+                page_html = driver.page_source
+                archive_page(driver.current_url, page_html, 'en', current_year, source_url=japanese_url)
+
+                # For 2024 or older syllabus, check page source for debugging if needed
                 if is_old_system or current_year <= 2024:
-                    page_html = driver.page_source
                     if "Day of Week・Period" in page_html:
                         print("           確認: 英語ページに「Day of Week・Period」要素が存在します")
                     else:
                         print("           ⚠️ Warning: 英語ページに「Day of Week・Period」要素が見つかりません")
-                
-                # Create dictionary of XPaths to query in a single JavaScript execution
-                xpath_dict = {}
-                for key, (label, xpath, default_value, *_) in en_map_to_use.items():
-                    if key != 'course_id_fallback':
-                        xpath_dict[key] = xpath
-                
-                # Optimized JavaScript for faster DOM queries 
-                try:
-                    js_script = """
-                    function getElementTexts(xpathDict) {
-                        const results = {};
-                        // Process all XPaths in one pass
-                        for (const [key, xpath] of Object.entries(xpathDict)) {
-                            try {
-                                // Fast DOM query using evaluate
-                                const element = document.evaluate(
-                                    xpath, 
-                                    document, 
-                                    null, 
-                                    XPathResult.FIRST_ORDERED_NODE_TYPE, 
-                                    null
-                                ).singleNodeValue;
-                                
-                                // Store the text content if found, empty string if not
-                                results[key] = element ? element.textContent.trim() : "";
-                            } catch(e) {
-                                results[key] = "";
-                            }
-                        }
-                        return results;
-                    }
-                    return getElementTexts(arguments[0]);
-                    """
-                    
-                    batch_results = driver.execute_script(js_script, xpath_dict)
-                    
-                    # Process results with normalization
-                    for key, (_, _, default_value, *_) in en_map_to_use.items():
-                        if key != 'course_id_fallback':
-                            value = batch_results.get(key, "")
-                            en_data[key] = normalize_text(value) if value else (default_value if key != 'name' else name_default_en)
-                    
-                    print("           英語情報の一括取得に成功しました。")
-                    
-                    # 取得した英語データの要約を表示
-                    print("           取得した英語データ:")
-                    print(f"           - Title: {en_data.get('name', 'N/A')}")
-                    print(f"           - Semester: {en_data.get('semester', 'N/A')}")
-                    print(f"           - Day/Period: {en_data.get('day_period', 'N/A')}")
-                    print(f"           - Location: {en_data.get('location', 'N/A')}")
-                    print(f"           - Credits: {en_data.get('credits', 'N/A')}")
-                except Exception as e:
-                    print(f"           [警告] JavaScript一括取得中にエラー: {e}")
-                    print("           従来の方法で個別に取得します...")
-                    
-                    # Fall back to original method
-                    for key, (_, _, default_value_en, *_) in en_map_to_use.items():
-                        en_data[key] = default_value_en if key != 'name' else name_default_en
 
-                    for key, (label, xpath, default_value, *_) in en_map_to_use.items():
-                        if key == 'course_id_fallback': continue
-                        en_data[key] = get_text_by_xpath(driver, xpath, default_value)
+                batch_results = extract_fields_from_driver(driver, en_map_to_use, page_html)
+                en_data = apply_extraction_defaults(batch_results, en_map_to_use, name_default_en)
 
-                    for key, (label, xpath, default_value, *_) in en_map_to_use.items():
-                        if key == 'course_id_fallback': continue
-                        en_data[key] = get_text_by_xpath(driver, xpath, default_value)
+                # 取得した英語データの要約を表示
+                print("           取得した英語データ:")
+                print(f"           - Title: {en_data.get('name', 'N/A')}")
+                print(f"           - Semester: {en_data.get('semester', 'N/A')}")
+                print(f"           - Day/Period: {en_data.get('day_period', 'N/A')}")
+                print(f"           - Location: {en_data.get('location', 'N/A')}")
+                print(f"           - Credits: {en_data.get('credits', 'N/A')}")
 
                 # --- Online/TTCK処理 (英語) ---
-                is_ttck_en = ("TTCK" in en_data.get('name', '')) or is_ttck_ja
-                en_class_format_lower = en_data.get('class_format', '').lower()
-                is_online_en = "online" in en_class_format_lower or "remote" in en_class_format_lower
-
-                if is_ttck_en:
-                    print("               英語: TTCKコース検出。教室と曜日時限を調整します。")
-                    en_data['location'] = "TTCK"
-                    if not en_data.get('day_period') or en_data.get('day_period') == "Day/Period Unknown":
-                        en_data['day_period'] = "Intensive Course"
-                elif is_online_en:
-                    print("               英語: オンライン授業検出。教室を調整します。")
-                    en_data['location'] = "Online"
+                en_data = finalize_english_data(en_data, ja_data)
 
                 print("           --- 英語情報取得完了 ---")
 
@@ -1251,64 +2180,1594 @@ def get_syllabus_details(driver, current_year, screenshots_dir):
             save_screenshot(driver, f"detail_en_unknown_error_{current_year}_{course_id or 'unknownID'}", screenshots_dir)
             traceback.print_exc()
             # エラー時は英語データをデフォルト値に戻す
-            en_data = {}
-            name_default_en = f"Name Unknown-{course_id}"
-            for key, (_, _, default_value_en, *_) in en_map_to_use.items():
-                en_data[key] = default_value_en if key != 'name' else name_default_en
-
-        # After English extraction
-        en_elapsed = time.time() - english_start_time
-        print(f"    [{time.strftime('%H:%M:%S')}] ✅ English data extracted ({en_elapsed:.2f}s)")
-        
-        # Final data construction
-        print(f"    [{time.strftime('%H:%M:%S')}] 🔄 Building final data object")
-        
-        if DEBUG_TRACE:
-            print(f"DEBUG: Both Japanese and English data processed successfully")
-            print(f"DEBUG: Japanese data: {len(ja_data)} fields, English data: {len(en_data)} fields")
-        
-        # --- 3. 最終データ構築 ---
-        final_details = {
-            'course_id': course_id,
-            'year_scraped': current_year,
-            'translations': {
-                'ja': {},
-                'en': {}
+            en_data = default_english_data(en_map_to_use, course_id)
+
+    # After English extraction
+    en_elapsed = time.time() - english_start_time
+    print(f"    [{time.strftime('%H:%M:%S')}] ✅ English data extracted ({en_elapsed:.2f}s)")
+
+    # Final data construction
+    print(f"    [{time.strftime('%H:%M:%S')}] 🔄 Building final data object")
+
+    if DEBUG_TRACE:
+        print(f"DEBUG: Both Japanese and English data processed successfully")
+        print(f"DEBUG: Japanese data: {len(ja_data)} fields, English data: {len(en_data)} fields")
+
+    # --- 3. 最終データ構築 ---
+    final_details = build_final_details(course_id, current_year, ja_data, en_data, ja_map_to_use)
+
+    total_elapsed = time.time() - detail_start_time
+    print(f"    [{time.strftime('%H:%M:%S')}] ✅ Complete syllabus details extracted ({total_elapsed:.2f}s)")
+
+    # Display visual verification of scraped data
+    display_scraped_info(final_details, f"Syllabus ID: {final_details.get('course_id', 'N/A')}")
+
+    if DEBUG_TRACE:
+        print(f"DEBUG: Final details object built successfully with {len(final_details.get('translations', {}).get('ja', {}))} Japanese fields and {len(final_details.get('translations', {}).get('en', {}))} English fields")
+        print(f"DEBUG: Returning complete object from get_syllabus_details")
+
+    if reused_en_data is None:
+        remember_translation(ja_raw, final_details, current_year)
+    remember_fingerprint(japanese_url, final_details, ja_html)
+    return final_details
+
+# --- ★★★ HTTP詳細取得エンジン (ブラウザのログインCookieを再利用) ★★★ ---
+
+
+def build_syllabus_details_from_html(ja_html, en_html, japanese_url, current_year):
+    """
+    日本語・英語ページのHTMLからシラバス詳細オブジェクトを構築する (ブラウザ不要)。
+    英語ページが無い場合は、取得時と同じく翻訳キャッシュの英語情報があればそれを使う。
+    """
+    ja_map_to_use, en_map_to_use, _ = resolve_info_maps(japanese_url, current_year)
+    ja_raw = extract_fields_from_html(ja_html, ja_map_to_use)
+    en_raw = extract_fields_from_html(en_html, en_map_to_use) if en_html else None
+    reused_en_data = find_reused_translation(ja_raw, current_year) if en_raw is None else None
+    return build_syllabus_details_from_fields(ja_raw, en_raw, japanese_url, current_year, reused_en_data)
+
+def build_syllabus_details_from_fields(ja_raw, en_raw, japanese_url, current_year, reused_en_data=None):
+    """
+    抽出済みの日本語・英語の項目 (英語ページなしは None) からシラバス詳細オブジェクトを構築する。
+    reused_en_data には英語ページの代わりに再利用する英語情報 (find_reused_translation の結果) を渡す。
+    """
+    ja_map_to_use, en_map_to_use, _ = resolve_info_maps(japanese_url, current_year)
+
+    course_id = extract_course_id_from_url(japanese_url, current_year)
+    if not course_id:
+        reg_num = ja_raw.get('course_id_fallback', '')
+        if reg_num and reg_num.isdigit():
+            course_id = reg_num
+    if not course_id:
+        raise MissingCriticalDataError(f"必須データ(Course ID)の取得に失敗 (URL: {japanese_url})")
+
+    ja_data = apply_extraction_defaults(ja_raw, ja_map_to_use, f"名称不明-{course_id}")
+    ja_data = finalize_japanese_data(ja_data, ja_map_to_use, current_year, japanese_url)
+
+    if en_raw is not None:
+        en_data = apply_extraction_defaults(en_raw, en_map_to_use, f"Name Unknown-{course_id}")
+        en_data = finalize_english_data(en_data, ja_data)
+    elif reused_en_data is not None:
+        en_data = reused_en_data
+    else:
+        en_data = default_english_data(en_map_to_use, course_id)
+
+    final_details = build_final_details(course_id, current_year, ja_data, en_data, ja_map_to_use)
+    if en_raw is not None:
+        remember_translation(ja_raw, final_details, current_year)
+    return final_details
+
+def http_fetch_available():
+    """HTTP詳細取得に必要なライブラリが利用可能か確認する"""
+    return httpx is not None and lxml_html is not None
+
+def create_http_client(cookies, user_agent=None):
+    """ログイン済みブラウザのCookieを引き継いだ、接続プール付きhttpxクライアントを作成する"""
+    headers = {'Accept-Language': 'ja,en;q=0.8'}
+    if user_agent:
+        headers['User-Agent'] = user_agent
+    client = httpx.Client(
+        headers=headers,
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+    update_http_client_cookies(client, cookies)
+    return client
+
+def update_http_client_cookies(client, cookies):
+    """Seleniumの get_cookies() 形式のCookieをhttpxクライアントに設定する"""
+    client.cookies.clear()
+    for cookie in cookies or []:
+        try:
+            client.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        except Exception as e:
+            print(f"[警告] Cookie ({cookie.get('name', 'unknown')}) のHTTPクライアントへの設定エラー: {e}")
+
+def is_http_login_response(response):
+    """HTTPレスポンスがログインページ/セッションタイムアウトページかどうかを判定する"""
+    final_host = response.url.host or ""
+    if "gslbs.keio.jp" not in final_host and "syllabus.sfc.keio.ac.jp" not in final_host:
+        return True  # SSOのログインページへリダイレクトされた
+    if "/syllabus/appMsg" in response.url.path:
+        return True
+    body = response.text
+    return "name=\"identifier\"" in body or "type=\"password\"" in body
+
+def check_http_response(response, url):
+    """304 以外のエラー応答・ログインページを例外にする"""
+    if response.status_code == 304:
+        return response
+    response.raise_for_status()
+    if is_http_login_response(response):
+        raise HttpSessionExpiredError(f"ログインページが返されました (URL: {url})")
+    return response
+
+def fetch_response_http(client, url, headers=None):
+    """HTTPでページを取得し、レスポンスを返す (条件付きリクエストの場合は 304 もそのまま返す)"""
+    return check_http_response(client.get(url, headers=headers), url)
+
+def fetch_page_http(client, url):
+    """HTTPでページを取得し、HTML文字列を返す (ログインページの場合は HttpSessionExpiredError)"""
+    return fetch_response_http(client, url).text
+
+def fetch_syllabus_details_http(client, syllabus_url, current_year):
+    """詳細ページ(日・英)をHTTPで取得し、ブラウザを使わずに解析する。失敗時は None を返す"""
+    url_start_time = time.time()
+    try:
+        ja_response = fetch_response_http(client, syllabus_url, conditional_request_headers(syllabus_url))
+        ja_html = ja_response.text if ja_response.status_code != 304 else None
+        archive_page(syllabus_url, ja_html, 'ja', current_year)
+        unchanged_details = find_unchanged_details(syllabus_url, ja_html, ja_response.status_code, ja_response.headers)
+        if unchanged_details:
+            print(f"           [HTTP] 変更なし ({time.time() - url_start_time:.2f}s): ID:{unchanged_details.get('course_id')} | {unchanged_details.get('name_ja')}")
+            return unchanged_details
+        if ja_html is None:
+            ja_html = fetch_page_http(client, syllabus_url) # 304 だが前回の結果がない場合は通常取得
+        ja_map_to_use, en_map_to_use, _ = resolve_info_maps(syllabus_url, current_year)
+        ja_raw = extract_fields_from_html(ja_html, ja_map_to_use)
+        reused_en_data = find_reused_translation(ja_raw, current_year)
+        en_raw = None
+        if reused_en_data is None:
+            english_url = build_english_url(syllabus_url, current_year)
+            try:
+                en_html = fetch_page_http(client, english_url)
+                archive_page(english_url, en_html, 'en', current_year, source_url=syllabus_url)
+                en_raw = extract_fields_from_html(en_html, en_map_to_use)
+            except httpx.HTTPError as e_en:
+                print(f"           [警告] 英語ページのHTTP取得に失敗: {e_en}。英語情報は一部欠落します。")
+        details = build_syllabus_details_from_fields(ja_raw, en_raw, syllabus_url, current_year, reused_en_data)
+        remember_fingerprint(syllabus_url, details, ja_html, ja_response.headers)
+        print(f"           [HTTP] 取得完了 ({time.time() - url_start_time:.2f}s): ID:{details['course_id']} | {details['name_ja']}")
+        return details
+    except HttpSessionExpiredError:
+        raise
+    except MissingCriticalDataError as e_missing:
+        print(f"           [HTTP] 必須データ不足: {e_missing}")
+    except httpx.HTTPError as e_http:
+        print(f"           [HTTP] 取得エラー: {e_http}")
+    except Exception as e:
+        print(f"           [HTTP] 解析中に予期せぬエラー: {e}")
+        traceback.print_exc()
+    return None
+
+# --- ★★★ 非同期HTTP詳細取得 (ホストごとの同時接続数制限付き) ★★★ ---
+
+class AsyncDetailFetcher:
+    """
+    asyncio + httpx.AsyncClient で詳細ページを並行取得する。
+    専用のイベントループを保持し、ページをまたいでKeep-Alive接続(可能ならHTTP/2)を再利用する。
+    """
+
+    def __init__(self, cookies, user_agent=None):
+        self.loop = asyncio.new_event_loop()
+        self.semaphores = {}
+        headers = {'Accept-Language': 'ja,en;q=0.8'}
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        max_connections = sum(HTTP_HOST_CONCURRENCY.values()) + HTTP_DEFAULT_HOST_CONCURRENCY
+        self.client = self.loop.run_until_complete(self._create_client(headers, max_connections))
+        self.update_cookies(cookies)
+
+    async def _create_client(self, headers, max_connections):
+        # AsyncClientは専用ループ上で生成する
+        return httpx.AsyncClient(
+            headers=headers,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def update_cookies(self, cookies):
+        """Seleniumの get_cookies() 形式のCookieを設定し直す"""
+        update_http_client_cookies(self.client, cookies)
+
+    def _semaphore_for(self, url):
+        host = urlparse(url).hostname or ""
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(HTTP_HOST_CONCURRENCY.get(host, HTTP_DEFAULT_HOST_CONCURRENCY))
+        return self.semaphores[host]
+
+    async def _fetch_response(self, url, headers=None):
+        async with self._semaphore_for(url):
+            response = await self.client.get(url, headers=headers)
+        return check_http_response(response, url)
+
+    async def _fetch_page(self, url):
+        return (await self._fetch_response(url)).text
+
+    async def _fetch_english(self, english_url, syllabus_url):
+        """英語ページを取得する。失敗時は None (英語情報は欠落扱い)"""
+        try:
+            return await self._fetch_page(english_url)
+        except httpx.HTTPError as e_en:
+            print(f"           [警告] 英語ページのHTTP取得に失敗 ({syllabus_url}): {e_en}。英語情報は一部欠落します。")
+            return None
+
+    async def _fetch_details(self, syllabus_url, current_year):
+        url_start_time = time.time()
+        english_url = build_english_url(syllabus_url, current_year)
+        try:
+            ja_request = self._fetch_response(syllabus_url, conditional_request_headers(syllabus_url))
+            if can_skip_english_fetch(syllabus_url):
+                # 日本語ページが変化していない・英語情報を再利用できる場合は英語ページを取得しない
+                ja_response, en_html, english_fetched = await ja_request, None, False
+            else:
+                # 英語ページを省けないので、日本語ページと同時に取得する
+                ja_response, en_html = await asyncio.gather(ja_request, self._fetch_english(english_url, syllabus_url))
+                english_fetched = True
+            ja_html = ja_response.text if ja_response.status_code != 304 else None
+            archive_page(syllabus_url, ja_html, 'ja', current_year)
+            unchanged_details = find_unchanged_details(syllabus_url, ja_html, ja_response.status_code, ja_response.headers)
+            if unchanged_details:
+                print(f"           [HTTP] 変更なし ({time.time() - url_start_time:.2f}s): ID:{unchanged_details.get('course_id')} | {unchanged_details.get('name_ja')}")
+                return unchanged_details
+            if ja_html is None:
+                ja_html = await self._fetch_page(syllabus_url) # 304 だが前回の結果がない場合は通常取得
+            ja_map_to_use, en_map_to_use, _ = resolve_info_maps(syllabus_url, current_year)
+            ja_raw = extract_fields_from_html(ja_html, ja_map_to_use)
+            reused_en_data = None if english_fetched else find_reused_translation(ja_raw, current_year)
+            if not english_fetched and reused_en_data is None:
+                en_html = await self._fetch_english(english_url, syllabus_url)
+            archive_page(english_url, en_html, 'en', current_year, source_url=syllabus_url) # 日本語ページの後に記録する
+            en_raw = extract_fields_from_html(en_html, en_map_to_use) if en_html else None
+            details = build_syllabus_details_from_fields(ja_raw, en_raw, syllabus_url, current_year, reused_en_data)
+            remember_fingerprint(syllabus_url, details, ja_html, ja_response.headers)
+            print(f"           [HTTP] 取得完了 ({time.time() - url_start_time:.2f}s): ID:{details['course_id']} | {details['name_ja']}")
+            return details
+        except MissingCriticalDataError as e_missing:
+            print(f"           [HTTP] 必須データ不足: {e_missing}")
+        except httpx.HTTPError as e_http:
+            print(f"           [HTTP] 取得エラー ({syllabus_url}): {e_http}")
+        return None
+
+    async def _fetch_all(self, urls, current_year):
+        results = await asyncio.gather(
+            *(self._fetch_details(url, current_year) for url in urls), return_exceptions=True
+        )
+        details_by_url = {}
+        session_expired = False
+        for url, result in zip(urls, results):
+            if isinstance(result, HttpSessionExpiredError):
+                session_expired = True
+                result = None
+            elif isinstance(result, Exception):
+                print(f"           [HTTP] 解析中に予期せぬエラー ({url}): {result}")
+                result = None
+            details_by_url[url] = result
+        return details_by_url, session_expired
+
+    def fetch_all(self, urls, current_year):
+        """URLリストを並行取得し、(URL→詳細 (失敗時None) の辞書, セッション切れを検出したか) を返す"""
+        if not urls:
+            return {}, False
+        return self.loop.run_until_complete(self._fetch_all(list(urls), current_year))
+
+    def close(self):
+        try:
+            self.loop.run_until_complete(self.client.aclose())
+        finally:
+            self.loop.close()
+
+# --- ★★★ 旧システム (2024年度以前) の静的HTTP取得 (ログイン・ブラウザ不要) ★★★ ---
+
+def is_legacy_syllabus_url(url):
+    """旧システム (syllabus.sfc.keio.ac.jp/courses/<年度>_<ID>) の詳細ページのURLか"""
+    return urlparse(url).hostname == LEGACY_SYLLABUS_HOST
+
+class LegacySyllabusFetcher(AsyncDetailFetcher):
+    """
+    旧システムの詳細ページはサーバー側で描画された静的HTMLで、抽出する項目はログインなしでも含まれている
+    (info-login のバナーは追加の情報を隠すだけ)。SSO Cookie を持たない AsyncDetailFetcher で取得する。
+    """
+
+    def __init__(self, user_agent=None):
+        super().__init__(None, user_agent)
+
+    def update_cookies(self, cookies):
+        pass # ブラウザのログインCookieは使わない
+
+def fetch_legacy_details(legacy_fetcher, urls, current_year):
+    """
+    urls のうち旧システムのURLをログインなしのHTTPで取得し、取得できた URL→詳細 の辞書を返す。
+    取得できなかったURLは呼び出し元が通常の取得手段 (ログイン済み) で処理する。
+    """
+    legacy_urls = [url for url in urls if is_legacy_syllabus_url(url)] if legacy_fetcher is not None else []
+    if not legacy_urls:
+        return {}
+    batch_start_time = time.time()
+    details_by_url, login_required = legacy_fetcher.fetch_all(legacy_urls, current_year)
+    fetched = {url: details for url, details in details_by_url.items() if details}
+    print(f"         [旧システム] ログインなしで {len(fetched)}/{len(legacy_urls)} 件取得 ({time.time() - batch_start_time:.2f}s)")
+    if login_required:
+        print("         [旧システム] ログインを要求されたページは、ログイン済みの取得手段で再試行します。")
+    return fetched
+
+# --- ★★★ ページ内一括取得 (ブラウザの fetch() + DOMParser、ログインCookieをそのまま利用) ★★★ ---
+
+_INPAGE_FETCH_JS = _COLLECT_LABEL_VALUES_JS + """
+    var urls = arguments[0], xpaths = arguments[1], headersByUrl = arguments[2]; // xpaths: 全URL共通の配列 または URL→配列
+    var includeHtml = arguments[3], timeoutMs = arguments[4];
+    var done = arguments[arguments.length - 1];
+    function isLoginResponse(response, text) {
+        if (response.type === 'opaqueredirect') { return true; } // SSOへのリダイレクト
+        var host = new URL(response.url).hostname;
+        if (host.indexOf('gslbs.keio.jp') < 0 && host.indexOf('syllabus.sfc.keio.ac.jp') < 0) { return true; }
+        return response.url.indexOf('/syllabus/appMsg') >= 0
+            || text.indexOf('name="identifier"') >= 0 || text.indexOf('type="password"') >= 0;
+    }
+    function decode(response, buffer) {
+        var match = /charset=([^;]+)/i.exec(response.headers.get('content-type') || '');
+        try { return new TextDecoder(match ? match[1].trim() : 'utf-8').decode(buffer); }
+        catch (e) { return new TextDecoder('utf-8').decode(buffer); }
+    }
+    function fetchOne(url) {
+        var controller = new AbortController();
+        var timer = setTimeout(function() { controller.abort(); }, timeoutMs);
+        return fetch(url, {credentials: 'include', redirect: 'manual', cache: 'no-store',
+                           headers: headersByUrl[url] || {}, signal: controller.signal})
+            .then(function(response) {
+                return response.arrayBuffer().then(function(buffer) {
+                    var text = decode(response, buffer);
+                    var result = {url: url, status: response.status, etag: response.headers.get('etag'),
+                                  lastModified: response.headers.get('last-modified'),
+                                  loginRequired: false, collected: null, html: null, error: null};
+                    if (isLoginResponse(response, text)) { result.loginRequired = true; return result; }
+                    if (response.status === 304) { return result; }
+                    if (!response.ok) { result.error = 'HTTP ' + response.status; return result; }
+                    result.collected = collectLabelValues(new DOMParser().parseFromString(text, 'text/html'),
+                                                          Array.isArray(xpaths) ? xpaths : xpaths[url]);
+                    if (includeHtml) { result.html = text; }
+                    return result;
+                });
+            })
+            .catch(function(e) { return {url: url, error: String(e)}; })
+            .finally(function() { clearTimeout(timer); });
+    }
+    Promise.all(urls.map(fetchOne)).then(done);
+"""
+
+class InPageDetailFetcher:
+    """
+    ログイン済みのメインブラウザのページ内で fetch() を Promise.all で並行実行し、
+    レスポンスを DOMParser で解析して INFO_MAP の項目を取り出す。
+    SSO Cookie が HttpOnly/ブラウザ固定で httpx に引き継げない場合でも login() の認証をそのまま使え、
+    科目ごとのタブの開閉・遷移なしに INPAGE_FETCH_BATCH_SIZE 件を1回の execute_async_script で取得する。
+    AsyncDetailFetcher と同じ fetch_all() の戻り値を返す。
+    """
+
+    def __init__(self, allow_navigation=True):
+        # allow_navigation=False: 検索結果ページから移動しない (別オリジンのURLはメインのブラウザでの再試行に回す)
+        self.allow_navigation = allow_navigation
+
+    def update_cookies(self, cookies):
+        pass # Cookieはブラウザ自身が保持している
+
+    def _ensure_origin(self, driver, origin):
+        """fetch() が同一オリジンになるよう、必要ならそのホストのページに移動する"""
+        current_url = urlparse(driver.current_url)
+        if f"{current_url.scheme}://{current_url.netloc}" == origin:
+            return True
+        if not self.allow_navigation:
+            return False
+        if 'gslbs.keio.jp' in origin:
+            driver.get(origin + '/syllabus/search')
+            wait_for_page_ready(driver, 'search_form')
+        else:
+            driver.get(origin + '/')
+        return True
+
+    def _run_batch(self, driver, urls, xpaths, headers_by_url, include_html):
+        """
+        urls をページ内で並行取得し、URL→結果 (JSの result オブジェクト) の辞書を返す。
+        xpaths は label_map_other_xpaths() の結果 (全URL共通) または URL→その結果 の辞書。
+        """
+        driver.set_script_timeout(INPAGE_SCRIPT_TIMEOUT)
+        results = driver.execute_async_script(
+            _INPAGE_FETCH_JS, list(urls), xpaths, headers_by_url, include_html, HTTP_TIMEOUT * 1000
+        )
+        return {result['url']: result for result in results}
+
+    def _fetch_group(self, driver, urls, current_year, details_by_url):
+        """同一オリジンのURL群を取得する。ログインページが返された場合は True を返す"""
+        ja_map_to_use, en_map_to_use, _ = resolve_info_maps(urls[0], current_year)
+        ja_xpaths, en_xpaths = label_map_other_xpaths(ja_map_to_use), label_map_other_xpaths(en_map_to_use)
+        # アーカイブ・差分判定に必要な場合のみHTML本文もブラウザから受け取る
+        include_html = HTML_ARCHIVE is not None or (FINGERPRINT_STORE is not None and INCREMENTAL_MODE)
+        session_expired = False
+        for chunk_start in range(0, len(urls), INPAGE_FETCH_BATCH_SIZE):
+            chunk = urls[chunk_start:chunk_start + INPAGE_FETCH_BATCH_SIZE]
+            batch_start_time = time.time()
+            headers_by_url = {url: conditional_request_headers(url) for url in chunk}
+            english_urls = {syllabus_url: build_english_url(syllabus_url, current_year) for syllabus_url in chunk}
+            # 英語ページを省けないURL (前回の指紋・翻訳キャッシュなし) は、日本語ページと同じスクリプトで同時に取得する
+            eager_english_urls = [english_urls[u] for u in chunk if not can_skip_english_fetch(u)]
+            xpaths_by_url = dict.fromkeys(chunk, ja_xpaths)
+            xpaths_by_url.update(dict.fromkeys(eager_english_urls, en_xpaths))
+            batch_results = self._run_batch(driver, chunk + eager_english_urls, xpaths_by_url, headers_by_url, include_html)
+
+            changed_urls = []
+            ja_raw_by_url, reused_en_by_url = {}, {}
+            for syllabus_url in chunk:
+                ja_result = batch_results.get(syllabus_url) or {}
+                if ja_result.get('loginRequired'):
+                    session_expired = True
+                    continue
+                if ja_result.get('error'):
+                    print(f"           [ページ内取得] 取得エラー ({syllabus_url}): {ja_result['error']}")
+                    continue
+                archive_page(syllabus_url, ja_result['html'], 'ja', current_year)
+                response_headers = {'etag': ja_result['etag'], 'last-modified': ja_result['lastModified']}
+                unchanged_details = find_unchanged_details(syllabus_url, ja_result['html'], ja_result['status'], response_headers)
+                if unchanged_details:
+                    details_by_url[syllabus_url] = unchanged_details
+                    print(f"           [ページ内取得] 変更なし: ID:{unchanged_details.get('course_id')} | {unchanged_details.get('name_ja')}")
+                elif ja_result['collected'] is not None:
+                    changed_urls.append(syllabus_url)
+                    ja_raw_by_url[syllabus_url] = resolve_collected_label_values(ja_result['collected'], ja_map_to_use)
+                    reused_en_by_url[syllabus_url] = find_reused_translation(ja_raw_by_url[syllabus_url], current_year)
+
+            late_english_urls = [english_urls[u] for u in changed_urls
+                                 if english_urls[u] not in batch_results and reused_en_by_url[u] is None]
+            if late_english_urls:
+                batch_results.update(self._run_batch(driver, late_english_urls, en_xpaths, {}, HTML_ARCHIVE is not None))
+
+            for syllabus_url in changed_urls:
+                ja_result = batch_results[syllabus_url]
+                en_result = batch_results.get(english_urls[syllabus_url]) or {}
+                reused_en_data = reused_en_by_url[syllabus_url]
+                en_raw = None
+                if en_result.get('collected') is not None:
+                    en_raw = resolve_collected_label_values(en_result['collected'], en_map_to_use)
+                    archive_page(english_urls[syllabus_url], en_result['html'], 'en', current_year, source_url=syllabus_url)
+                elif reused_en_data is None:
+                    print(f"           [警告] 英語ページのページ内取得に失敗 ({syllabus_url}): {en_result.get('error') or 'ログインページ'}。英語情報は一部欠落します。")
+                try:
+                    details = build_syllabus_details_from_fields(ja_raw_by_url[syllabus_url], en_raw, syllabus_url, current_year, reused_en_data)
+                except MissingCriticalDataError as e_missing:
+                    print(f"           [ページ内取得] 必須データ不足: {e_missing}")
+                    continue
+                if ja_result['html'] is not None:
+                    remember_fingerprint(syllabus_url, details, ja_result['html'], {'etag': ja_result['etag'], 'last-modified': ja_result['lastModified']})
+                details_by_url[syllabus_url] = details
+                print(f"           [ページ内取得] 取得完了: ID:{details['course_id']} | {details['name_ja']}")
+            print(f"           [ページ内取得] {len(chunk)} 件を1回のスクリプト実行で処理 ({time.time() - batch_start_time:.2f}s)")
+        return session_expired
+
+    def fetch_all(self, urls, current_year):
+        """URLリストをページ内で並行取得し、(URL→詳細 (失敗時None) の辞書, セッション切れを検出したか) を返す"""
+        details_by_url = {url: None for url in urls}
+        if not urls:
+            return details_by_url, False
+        driver = globals()['driver']
+        urls_by_origin = {}
+        for url in urls:
+            parsed_url = urlparse(url)
+            urls_by_origin.setdefault(f"{parsed_url.scheme}://{parsed_url.netloc}", []).append(url)
+        session_expired = False
+        for origin, origin_urls in urls_by_origin.items():
+            try:
+                if not self._ensure_origin(driver, origin):
+                    continue
+                session_expired = self._fetch_group(driver, origin_urls, current_year, details_by_url) or session_expired
+            except WebDriverException as e_driver:
+                # 失敗したURLは呼び出し元がメインのブラウザで1件ずつ再試行する
+                print(f"           [ページ内取得] スクリプト実行エラー ({origin}): {e_driver}")
+        return details_by_url, session_expired
+
+    def close(self):
+        pass
+
+def refresh_detail_fetchers(driver, *fetchers):
+    """ブラウザの最新Cookieを HTTP/非同期/ワーカープール の各取得手段に反映する (None は無視)"""
+    active_fetchers = [f for f in fetchers if f is not None]
+    if not active_fetchers:
+        return
+    cookies = extract_auth_cookies(driver)
+    for fetcher in active_fetchers:
+        if isinstance(fetcher, (AsyncDetailFetcher, InPageDetailFetcher, BrowserWorkerPool)):
+            fetcher.update_cookies(cookies)
+        else:
+            update_http_client_cookies(fetcher, cookies)
+
+# --- ★★★ ブラウザワーカープール (1回のログインCookieを複数Chromeで共有) ★★★ ---
+
+class BrowserWorkerPool:
+    """
+    N個のChromeを起動し、1回の login() で得たCookieを apply_cookies() で各ブラウザに適用する。
+    共有キューの詳細URLを各ワーカースレッドが取り出して処理し、
+    ブラウザが落ちた場合はそのワーカーのドライバーだけを再構築する。
+    """
+
+    def __init__(self, size, cookies, screenshots_dir):
+        self.cookies = cookies
+        self.screenshots_dir = screenshots_dir
+        self.tasks = queue.Queue()
+        self.cookies_lock = Lock()
+        self.session_expired = Event() # fetch_all() 中にいずれかのワーカーでセッション切れを検出した
+        self.drivers = [None] * size
+        self.threads = []
+        for worker_index in range(size):
+            self.drivers[worker_index] = self._build_driver(worker_index)
+            thread = Thread(target=self._worker_loop, args=(worker_index,), name=f"browser-worker-{worker_index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        print(f"ブラウザワーカープールを起動しました ({sum(1 for d in self.drivers if d)}/{size} 台)")
+
+    def update_cookies(self, cookies):
+        """メインドライバーの再ログイン後などに、以降の再構築で使うCookieを更新する"""
+        with self.cookies_lock:
+            self.cookies = cookies
+
+    def _build_driver(self, worker_index):
+        """ワーカー用のドライバーを起動し、共有Cookieを適用する (Cookieが無効な場合のみ個別ログイン)"""
+        new_driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
+        if not new_driver:
+            print(f"[エラー] ワーカー{worker_index}: WebDriver初期化失敗")
+            return None
+        with self.cookies_lock:
+            cookies = self.cookies
+        try:
+            apply_cookies(new_driver, cookies)
+            new_driver.get('https://gslbs.keio.jp/syllabus/search')
+            if "gslbs.keio.jp/syllabus/search" not in new_driver.current_url:
+                print(f"[警告] ワーカー{worker_index}: 共有Cookieが無効なため個別にログインします。")
+                if not establish_session(new_driver, self.screenshots_dir):
+                    raise Exception("ワーカーのログイン失敗")
+            return new_driver
+        except Exception as e:
+            print(f"[エラー] ワーカー{worker_index}: ドライバー準備中にエラー: {e}")
+            try: new_driver.quit()
+            except Exception: pass
+            return None
+
+    def _rebuild_driver(self, worker_index):
+        """このワーカーのドライバーだけを終了・再構築する (他のワーカーは処理を継続)"""
+        print(f"[{time.strftime('%H:%M:%S')}] 🔄 ワーカー{worker_index}: ブラウザを再構築します...")
+        old_driver = self.drivers[worker_index]
+        if old_driver:
+            try: old_driver.quit()
+            except Exception as e: print(f"[警告] ワーカー{worker_index}: 古いドライバー終了エラー: {e}")
+        self.drivers[worker_index] = self._build_driver(worker_index)
+        return self.drivers[worker_index] is not None
+
+    def _process_url(self, worker_index, syllabus_url, current_year):
+        worker_driver = self.drivers[worker_index]
+        english_tab = navigate_detail_page(worker_driver, syllabus_url, current_year)
+        wait_for_page_ready(worker_driver, 'detail')
+        if check_session_timeout(worker_driver, self.screenshots_dir):
+            close_tab(worker_driver, english_tab, worker_driver.current_window_handle)
+            raise InvalidSessionIdException("Session timeout in browser worker")
+        return get_syllabus_details(worker_driver, current_year, self.screenshots_dir, english_handle=english_tab)
+
+    def _worker_loop(self, worker_index):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                return
+            syllabus_url, current_year, results = task
+            details = None
+            for attempt in range(2):
+                if self.drivers[worker_index] is None and not self._rebuild_driver(worker_index):
+                    break
+                try:
+                    details = self._process_url(worker_index, syllabus_url, current_year)
+                    break
+                except (InvalidSessionIdException, NoSuchWindowException) as e_session:
+                    print(f"           [ワーカー{worker_index}] セッション/ウィンドウエラー: {e_session}")
+                    if isinstance(e_session, InvalidSessionIdException):
+                        self.session_expired.set()
+                    self._rebuild_driver(worker_index)
+                except MissingCriticalDataError as e_missing:
+                    print(f"           [ワーカー{worker_index}] 必須データ不足: {e_missing}")
+                    break
+                except WebDriverException as e_driver:
+                    print(f"           [ワーカー{worker_index}] WebDriverエラー: {e_driver}")
+                    self._rebuild_driver(worker_index)
+                except Exception as e:
+                    print(f"           [ワーカー{worker_index}] 詳細ページ処理中にエラー: {e}")
+                    traceback.print_exc()
+                    break
+            results[syllabus_url] = details
+            self.tasks.task_done()
+
+    def fetch_all(self, urls, current_year):
+        """
+        URLリストを共有キューに投入して全ワーカーで処理し、
+        (URL→詳細 (失敗時None) の辞書, セッション切れを検出したか) を返す
+        """
+        results = {}
+        self.session_expired.clear()
+        for syllabus_url in urls:
+            self.tasks.put((syllabus_url, current_year, results))
+        self.tasks.join()
+        return results, self.session_expired.is_set()
+
+    def close(self):
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join(timeout=PAGE_LOAD_TIMEOUT)
+        for worker_driver in self.drivers:
+            if worker_driver:
+                try: worker_driver.quit()
+                except Exception as e: print(f"[警告] ワーカードライバー終了エラー: {e}")
+
+# --- ★★★ クロール状態ストア (SQLite/WAL, checkpoint.pkl の後継) ★★★ ---
+
+URL_PENDING = 'pending'
+URL_IN_FLIGHT = 'in-flight'
+URL_DONE = 'done'
+URL_FAILED = 'failed'
+
+class CrawlStateStore:
+    """
+    URLごとの状態 (pending/in-flight/done/failed)・試行回数・タイムスタンプ・取得済み詳細データと、
+    現在の (年度, 分野, ページ) カーソルを保存する。
+    URL単位の更新は1行のUPSERTで済むため、処理済みURL数に関係なく保存コストは一定。
+    2段階パイプラインでは詳細URLフロンティアとしても使用する。
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.lock = Lock()
+        if read_only:
+            # 再解析ワーカー用: 翻訳キャッシュを読むだけ (テーブル作成はしない)
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY, year INTEGER NOT NULL, field TEXT, page INTEGER,"
+                " state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, details TEXT, error TEXT,"
+                " first_seen_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS urls_state_year ON urls (state, year)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS urls_year_field ON urls (year, field)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS enumerated_fields ("
+                " year INTEGER NOT NULL, field TEXT NOT NULL, PRIMARY KEY (year, field))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS crawl_cursor ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1), year INTEGER, field TEXT, page INTEGER, updated_at REAL)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # 差分スクレイピング用の科目ごとの指紋 (reset() では消さず、次回以降の実行でも使用する)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT NOT NULL,"
+                " details TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            # 年度をまたいで再利用する英語情報 (reset() では消さない)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " name TEXT NOT NULL, professor TEXT NOT NULL, ja_hash TEXT NOT NULL, year INTEGER NOT NULL,"
+                " en TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (name, professor, ja_hash))"
+            )
+
+    def is_empty(self):
+        with self.lock:
+            return (self.conn.execute("SELECT 1 FROM urls LIMIT 1").fetchone() is None
+                    and self.conn.execute("SELECT 1 FROM crawl_cursor").fetchone() is None)
+
+    def reset(self):
+        """クロール状態を空にする (最初からやり直す場合。差分スクレイピングの指紋は残す)"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM urls")
+            self.conn.execute("DELETE FROM enumerated_fields")
+            self.conn.execute("DELETE FROM crawl_cursor")
+            self.conn.execute("DELETE FROM meta WHERE key = 'completed_at'")
+
+    def mark_completed(self):
+        """クロールが最後まで完了したことを記録する (次回は再開せず新しいクロールを開始する)"""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('completed_at', ?)", (str(time.time()),))
+
+    def is_completed(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM meta WHERE key = 'completed_at'").fetchone() is not None
+
+    # --- 差分スクレイピングの指紋 ---
+    def get_fingerprint(self, url):
+        """前回の指紋を {'etag', 'last_modified', 'content_hash', 'details'} で返す (なければ None)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_hash, details FROM fingerprints WHERE url = ?", (canonicalize_url(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'content_hash': row[2], 'details': json.loads(row[3])}
+
+    def save_fingerprint(self, url, etag, last_modified, content_hash, details):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (url, etag, last_modified, content_hash, details, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (canonicalize_url(url), etag, last_modified, content_hash, json.dumps(details, ensure_ascii=False), time.time()),
+            )
+
+    # --- 年度をまたいだ英語情報の再利用 ---
+    def get_translation(self, name, professor, ja_hash):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT en FROM translations WHERE name = ? AND professor = ? AND ja_hash = ?", (name, professor, ja_hash)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_translation(self, name, professor, ja_hash, year, en_data):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO translations (name, professor, ja_hash, year, en, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, professor, ja_hash, year, json.dumps(en_data, ensure_ascii=False), time.time()),
+            )
+
+    def has_translation(self, name, professor):
+        """この (科目名, 担当者名) の英語情報を保存済みか (主キーの先頭2列で引く)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM translations WHERE name = ? AND professor = ? LIMIT 1", (name, professor)
+            ).fetchone() is not None
+
+    def has_any_translation(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM translations LIMIT 1").fetchone() is not None
+
+    # --- カーソル ---
+    def save_cursor(self, year, field_name, page_num):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO crawl_cursor (id, year, field, page, updated_at) VALUES (1, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET year = excluded.year, field = excluded.field,"
+                " page = excluded.page, updated_at = excluded.updated_at",
+                (year, field_name, page_num, time.time()),
+            )
+
+    def load_cursor(self):
+        """保存済みカーソルを {'year', 'field_name', 'page_num', 'updated_at'} で返す (なければ None)"""
+        with self.lock:
+            row = self.conn.execute("SELECT year, field, page, updated_at FROM crawl_cursor WHERE id = 1").fetchone()
+        if row is None:
+            return None
+        return {'year': row[0], 'field_name': row[1], 'page_num': row[2], 'updated_at': row[3]}
+
+    # --- URL状態 ---
+    def requeue_unfinished(self):
+        """前回の実行で in-flight/failed のまま残ったURLを pending に戻し、戻した件数を返す"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE urls SET state = ?, error = NULL, updated_at = ? WHERE state IN (?, ?)",
+                (URL_PENDING, time.time(), URL_IN_FLIGHT, URL_FAILED),
+            )
+            return cursor.rowcount
+
+    def add_urls(self, year, field_name, page_num, urls):
+        """列挙したURLを pending として登録し、新規に追加された件数を返す (登録済みURLは無視)"""
+        now = time.time()
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, year, field, page, state, first_seen_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(url, year, field_name, page_num, URL_PENDING, now, now) for url in dict.fromkeys(urls)],
+            )
+            return self.conn.total_changes - before
+
+    def mark_enumerated(self, year, field_name):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO enumerated_fields (year, field) VALUES (?, ?)", (year, field_name))
+
+    def is_enumerated(self, year, field_name):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM enumerated_fields WHERE year = ? AND field = ?", (year, field_name)
+            ).fetchone() is not None
+
+    def claim(self, year, limit):
+        """指定年度の pending URLを最大 limit 件取り出して in-flight にする (試行回数を加算)"""
+        now = time.time()
+        with self.lock, self.conn:
+            urls = [row[0] for row in self.conn.execute(
+                "SELECT url FROM urls WHERE state = ? AND year = ? ORDER BY rowid LIMIT ?", (URL_PENDING, year, limit)
+            )]
+            self.conn.executemany(
+                "UPDATE urls SET state = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                [(URL_IN_FLIGHT, now, url) for url in urls],
+            )
+            return urls
+
+    def _record(self, url, state, details=None, error=None, year=None, field_name=None, page_num=None, count_attempt=False):
+        now = time.time()
+        details_json = json.dumps(details, ensure_ascii=False) if details is not None else None
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO urls (url, year, field, page, state, attempts, details, error, first_seen_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET state = excluded.state,"
+                " attempts = attempts + ?, details = COALESCE(excluded.details, details),"
+                " error = excluded.error, updated_at = excluded.updated_at",
+                (url, year if year is not None else 0, field_name, page_num, state, 1 if count_attempt else 0,
+                 details_json, error, now, now, 1 if count_attempt else 0),
+            )
+
+    def mark_done(self, url, details, year=None, field_name=None, page_num=None, count_attempt=False):
+        """URLを done にして詳細データを保存する (未登録URLなら追加)"""
+        self._record(url, URL_DONE, details=details, year=year, field_name=field_name, page_num=page_num, count_attempt=count_attempt)
+
+    def mark_failed(self, url, error=None, year=None, field_name=None, page_num=None, count_attempt=False):
+        self._record(url, URL_FAILED, error=error, year=year, field_name=field_name, page_num=page_num, count_attempt=count_attempt)
+
+    def done_urls(self, year, field_name):
+        """指定 (年度, 分野) で処理済み (done) のURLの集合を返す"""
+        with self.lock:
+            return {row[0] for row in self.conn.execute(
+                "SELECT url FROM urls WHERE year = ? AND field = ? AND state = ?", (year, field_name, URL_DONE)
+            )}
+
+    def done_details(self):
+        """取得済み (done) の詳細データをすべて返す (checkpoint.pkl から取り込んだURLはデータなし)"""
+        with self.lock:
+            return [json.loads(row[0]) for row in self.conn.execute(
+                "SELECT details FROM urls WHERE state = ? AND details IS NOT NULL ORDER BY rowid", (URL_DONE,)
+            )]
+
+    def known_urls(self):
+        """収集済みの詳細URLを (URL, 年度) のリストで返す"""
+        with self.lock:
+            return self.conn.execute("SELECT url, year FROM urls ORDER BY rowid").fetchall()
+
+    def counts(self):
+        """状態ごとのURL数を返す"""
+        with self.lock:
+            counts = {URL_PENDING: 0, URL_IN_FLIGHT: 0, URL_DONE: 0, URL_FAILED: 0}
+            counts.update(self.conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+            return counts
+
+    # --- 旧形式の取り込み ---
+    def import_checkpoint_pickle(self, checkpoint_file):
+        """
+        旧形式の checkpoint.pkl (年度・分野・ページ・処理済みURL集合) を1回だけ取り込む。
+        取り込み済みかどうかはファイルパスと更新日時で判定し、元のファイルは変更しない。
+        """
+        if not os.path.exists(checkpoint_file):
+            return False
+        import_key = f"imported:{os.path.abspath(checkpoint_file)}:{os.path.getmtime(checkpoint_file)}"
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (import_key,)).fetchone():
+                return False
+        try:
+            with open(checkpoint_file, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            print(f"\n[警告] チェックポイント読込失敗: {e}")
+            return False
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, year, field, page, state, attempts, first_seen_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                [(url, checkpoint['year'], checkpoint['field_name'], None, URL_DONE, now, now)
+                 for url in checkpoint.get('processed_urls', [])],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crawl_cursor (id, year, field, page, updated_at) VALUES (1, ?, ?, ?, ?)",
+                (checkpoint['year'], checkpoint['field_name'], checkpoint['page_num'], now),
+            )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (import_key, checkpoint.get('timestamp', '')))
+        print(f"\n[情報] checkpoint.pkl を取り込みました: 年度={checkpoint['year']}, 分野={checkpoint['field_name']}, "
+              f"ページ={checkpoint['page_num']}, URL数={len(checkpoint.get('processed_urls', []))}")
+        return True
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# --- ★★★ 検索状態の保存と検索結果ページへの直接移動 (ページ送りをやり直さずに再開) ★★★ ---
+
+SEARCH_STATE_KEYS = ('KEYWORD_TTBLYR', 'KEYWORD_FLD1CD', 'SEARCH_RESULT_NARABIJUN')
+
+_CAPTURE_SEARCH_STATE_JS = """
+    var control = document.querySelector('select[name="SEARCH_RESULT_NARABIJUN"]')
+        || document.querySelector('select[name="KEYWORD_TTBLYR"]');
+    var form = control ? control.form : null;
+    var fields = [];
+    if (form) {
+        new FormData(form).forEach(function(value, name) { if (typeof value === 'string') { fields.push([name, value]); } });
+    }
+    var sortSelect = document.querySelector('select[name="SEARCH_RESULT_NARABIJUN"]');
+    if (sortSelect && !(form && sortSelect.form === form)) { fields.push([sortSelect.name, sortSelect.value]); }
+    var links = [];
+    document.querySelectorAll('ul.pagination li a').forEach(function(link) {
+        var attributes = {};
+        [link, link.parentElement].forEach(function(element) {
+            if (!element) { return; }
+            Array.from(element.attributes).forEach(function(attribute) {
+                if (attribute.name.indexOf('data-') === 0) { attributes[attribute.name] = attribute.value; }
+            });
+        });
+        links.push({text: (link.textContent || '').trim(), href: link.getAttribute('href') || '', absoluteHref: link.href || '', attributes: attributes});
+    });
+    return {url: location.href, formAction: form ? form.action : null, formMethod: form ? (form.getAttribute('method') || 'get') : null,
+            fields: fields, links: links};
+"""
+
+_SUBMIT_SEARCH_FORM_JS = """
+    var form = document.createElement('form');
+    form.action = arguments[0];
+    form.method = arguments[1];
+    form.style.display = 'none';
+    arguments[2].forEach(function(field) {
+        var input = document.createElement('input');
+        input.type = 'hidden'; input.name = field[0]; input.value = field[1];
+        form.appendChild(input);
+    });
+    document.body.appendChild(form);
+    HTMLFormElement.prototype.submit.call(form);
+"""
+
+_ACTIVE_PAGE_NUMBER_JS = """
+    var active = document.querySelector('ul.pagination li.active span, ul.pagination li.active a');
+    return active ? (active.textContent || '').trim() : null;
+"""
+
+def capture_search_state(driver, year, field_name):
+    """
+    検索結果ページから検索フォームの値 (KEYWORD_TTBLYR / KEYWORD_FLD1CD / SEARCH_RESULT_NARABIJUN など) と
+    ページ番号リンクの仕組み (URLのクエリ、または data-* 属性) を読み取り、任意のページへ直接移動するための状態を返す。
+    """
+    captured = driver.execute_script(_CAPTURE_SEARCH_STATE_JS)
+    fields = captured.get('fields') or []
+    field_values = dict(fields)
+    search_state = {
+        'year': year,
+        'field_name': field_name,
+        'url': captured.get('url'),
+        'form_action': captured.get('formAction'),
+        'form_method': captured.get('formMethod'),
+        'fields': fields,
+        'links': captured.get('links') or [],
+        'search_params': {key: field_values.get(key) for key in SEARCH_STATE_KEYS},
+        'page_link_url': None, # ページ番号がクエリパラメータになっているリンク (GETで直接開ける)
+        'page_query_param': None,
+        'page_form_param': None, # ページ番号を data-* 属性で持つリンクの場合、フォームに追加するパラメータ名
+        'page_numbers': [],
+    }
+    for link in captured.get('links') or []:
+        page_text = link.get('text', '')
+        if not page_text.isdigit():
+            continue
+        search_state['page_numbers'].append(int(page_text))
+        href = link.get('href', '')
+        if search_state['page_link_url'] is None and href and not href.startswith(('#', 'javascript')):
+            for name, values in parse_qs(urlparse(link['absoluteHref']).query, keep_blank_values=True).items():
+                if values == [page_text]:
+                    search_state['page_link_url'] = link['absoluteHref']
+                    search_state['page_query_param'] = name
+                    break
+        if search_state['page_form_param'] is None:
+            for attribute_name, value in (link.get('attributes') or {}).items():
+                if value == page_text:
+                    search_state['page_form_param'] = attribute_name[len('data-'):]
+                    break
+    return search_state
+
+def get_active_page_number(driver):
+    """ページネーションのアクティブなページ番号を返す (取得できなければ None)"""
+    page_text = driver.execute_script(_ACTIVE_PAGE_NUMBER_JS)
+    return int(page_text) if page_text and page_text.isdigit() else None
+
+def jump_to_search_page(driver, search_state, page_num, timeout=READY_WAIT_CEILING):
+    """
+    capture_search_state() の状態から検索結果の page_num ページ目へ1回の遷移で移動する。
+    移動後のアクティブページが page_num であれば True、失敗した場合は False、移動手段がない場合は (移動せずに) None。
+    """
+    if search_state.get('page_link_url'):
+        parsed_url = urlparse(search_state['page_link_url'])
+        query = parse_qs(parsed_url.query, keep_blank_values=True)
+        query[search_state['page_query_param']] = [str(page_num)]
+        mark_page_stale(driver, 'search_results')
+        driver.get(urlunparse(parsed_url._replace(query=urlencode(query, doseq=True))))
+    elif search_state.get('page_form_param') and search_state.get('form_action'):
+        fields = [field for field in search_state['fields'] if field[0] != search_state['page_form_param']]
+        fields.append([search_state['page_form_param'], str(page_num)])
+        mark_page_stale(driver, 'search_results')
+        driver.execute_script(_SUBMIT_SEARCH_FORM_JS, search_state['form_action'], search_state['form_method'] or 'post', fields)
+    else:
+        return None
+    if not wait_for_page_ready(driver, 'search_results', timeout):
+        return False
+    return get_active_page_number(driver) == page_num
+
+def restore_search_page(driver, search_state, page_num, timeout=READY_WAIT_CEILING):
+    """
+    ドライバーの差し替え後、障害前に表示していた検索結果の page_num ページ目を capture_search_state() の状態から開き直す。
+    開き直せた場合は True (状態が無い・移動できない場合は False → 呼び出し元は検索からやり直す)。
+    """
+    if search_state is None or page_num < 1:
+        return False
+    try:
+        jumped = jump_to_search_page(driver, search_state, page_num, timeout)
+    except WebDriverException as e_jump:
+        print(f"   [警告] 検索結果ページの復元中にエラー: {e_jump}")
+        return False
+    if jumped:
+        print(f"   検索状態: {search_state['search_params']} → 差し替えたドライバーで検索結果のページ {page_num} を復元しました。")
+    return bool(jumped)
+
+def resume_page_for_field(crawl_state, year, field_name):
+    """カーソルがこの (年度, 分野) を指していれば、次に処理すべきページ番号を返す (なければ 0)"""
+    cursor = crawl_state.load_cursor()
+    if not cursor or cursor['year'] != year or cursor['field_name'] != field_name or not cursor['page_num']:
+        return 0
+    return cursor['page_num'] + 1
+
+# --- ★★★ 検索結果ページの並行列挙 (ページ内 fetch() で複数ページを同時に取得) ★★★ ---
+
+# 検索結果ページ (表示中の document / DOMParser で解析したページ) から詳細ページのURLを集める
+_COLLECT_SYLLABUS_URLS_JS = """
+    function collectSyllabusUrls(doc) {
+        // Target all syllabus detail links
+        const syllabusUrls = [];
+
+        // First approach: Get all links with syllabus-detail class (for 2025+ system)
+        doc.querySelectorAll('a.syllabus-detail').forEach(link => {
+            if (link.href) {
+                syllabusUrls.push(link.href);
             }
+        });
+
+        // Second approach: Get all blue buttons with class btn-info (for older system)
+        doc.querySelectorAll('a.btn-info, button.btn-info').forEach(button => {
+            if (button.href) {
+                syllabusUrls.push(button.href);
+            }
+        });
+
+        // Third approach: Look for syllabus links in table cells
+        doc.querySelectorAll('td a').forEach(link => {
+            if (link.href && (link.href.includes('syllabus') ||
+                            link.href.includes('entno=') ||
+                            link.href.includes('courses'))) {
+                syllabusUrls.push(link.href);
+            }
+        });
+
+        // Fourth approach: Check for onclick handlers on buttons (解析したページでは onclick 属性の文字列を見る)
+        doc.querySelectorAll('a[onclick], button[onclick]').forEach(el => {
+            const onclickStr = el.onclick ? el.onclick.toString() : (el.getAttribute('onclick') || '');
+            if (onclickStr.includes('syllabus') || onclickStr.includes('detail')) {
+                const matches = onclickStr.match(/window\\.open\\(['"]([^'"]+)['"]/);
+                if (matches && matches[1]) {
+                    syllabusUrls.push(matches[1]);
+                }
+            }
+        });
+
+        return [...new Set(syllabusUrls)];
+    }
+"""
+
+_FETCH_RESULT_PAGES_JS = _COLLECT_SYLLABUS_URLS_JS + """
+    var requests = arguments[0], timeoutMs = arguments[1], pageQueryParam = arguments[2], pageFormParam = arguments[3];
+    var done = arguments[arguments.length - 1];
+    function linkPageNumber(link) {
+        // 数字のリンクに加え、「最後」などのリンクもURLのクエリ/data-*属性からページ番号を読む
+        var pageText = (link.textContent || '').trim();
+        if (/^[0-9]+$/.test(pageText)) { return parseInt(pageText, 10); }
+        var value = null;
+        if (pageQueryParam && link.href) {
+            try { value = new URL(link.href).searchParams.get(pageQueryParam); } catch (e) { value = null; }
+        }
+        if (!value && pageFormParam) {
+            value = link.getAttribute('data-' + pageFormParam)
+                || (link.parentElement ? link.parentElement.getAttribute('data-' + pageFormParam) : null);
         }
+        return value && /^[0-9]+$/.test(value) ? parseInt(value, 10) : null;
+    }
+    function fetchPage(request) {
+        var controller = new AbortController();
+        var timer = setTimeout(function() { controller.abort(); }, timeoutMs);
+        var options = {credentials: 'include', cache: 'no-store', signal: controller.signal, method: request.method};
+        if (request.method === 'POST') {
+            options.body = new URLSearchParams(request.fields);
+        }
+        return fetch(request.url, options)
+            .then(function(response) {
+                return response.text().then(function(text) {
+                    if (!response.ok) { return {page: request.page, error: 'HTTP ' + response.status}; }
+                    var doc = new DOMParser().parseFromString(text, 'text/html');
+                    var base = doc.createElement('base');
+                    base.href = response.url; // 相対URLを取得したページ基準で解決する
+                    doc.head.prepend(base);
+                    var active = doc.querySelector('ul.pagination li.active span, ul.pagination li.active a');
+                    var pages = [];
+                    doc.querySelectorAll('ul.pagination li a').forEach(function(link) {
+                        var pageNumber = linkPageNumber(link);
+                        if (pageNumber) { pages.push(pageNumber); }
+                    });
+                    return {page: request.page, urls: collectSyllabusUrls(doc), pages: pages,
+                            activePage: active ? (active.textContent || '').trim() : null, error: null};
+                });
+            })
+            .catch(function(e) { return {page: request.page, error: String(e)}; })
+            .finally(function() { clearTimeout(timer); });
+    }
+    Promise.all(requests.map(fetchPage)).then(done);
+"""
+
+def filter_syllabus_urls(urls, year):
+    """URL収集結果から詳細ページのURLだけを残す (ページ送りでの列挙と同じ条件)"""
+    filtered_urls = []
+    for url in urls:
+        if not url or url.endswith('#') or '/result#' in url:
+            continue
+        if year <= 2024:
+            if ("syllabus" in url or "courses" in url or "entno=" in url) and "search" not in url:
+                filtered_urls.append(url)
+        elif "detail" in url or "syllabus" in url or "entno=" in url:
+            filtered_urls.append(url)
+    return filtered_urls
+
+def last_page_number_from_links(search_state):
+    """「最後」など数字以外のページネーションリンクのURLクエリ/data-*属性からページ番号を読み取る"""
+    page_numbers = []
+    for link in search_state.get('links') or []:
+        value = None
+        if search_state.get('page_query_param') and link.get('absoluteHref'):
+            value = (parse_qs(urlparse(link['absoluteHref']).query).get(search_state['page_query_param']) or [None])[0]
+        if not value and search_state.get('page_form_param'):
+            value = (link.get('attributes') or {}).get('data-' + search_state['page_form_param'])
+        if value and value.isdigit():
+            page_numbers.append(int(value))
+    return page_numbers
+
+def build_result_page_request(search_state, page_num):
+    """jump_to_search_page と同じ方法で page_num ページ目を取得する fetch() 用のリクエストを作る (方法がなければ None)"""
+    if search_state.get('page_link_url'):
+        parsed_url = urlparse(search_state['page_link_url'])
+        query = parse_qs(parsed_url.query, keep_blank_values=True)
+        query[search_state['page_query_param']] = [str(page_num)]
+        return {'page': page_num, 'method': 'GET', 'url': urlunparse(parsed_url._replace(query=urlencode(query, doseq=True))), 'fields': []}
+    if search_state.get('page_form_param') and search_state.get('form_action'):
+        fields = [field for field in search_state['fields'] if field[0] != search_state['page_form_param']]
+        fields.append([search_state['page_form_param'], str(page_num)])
+        return {'page': page_num, 'method': (search_state['form_method'] or 'post').upper(), 'url': search_state['form_action'], 'fields': fields}
+    return None
+
+def enumerate_result_pages_parallel(driver, search_state, current_page_num, year, skip_pages=()):
+    """
+    表示中の検索結果ページと、ページネーションに現れる他の全ページを RESULT_PAGE_PARALLELISM 件ずつページ内で並行取得し、
+    {ページ番号: 詳細URLのリスト} を返す。取得したページのページネーションから更に先のページを見つけて続ける。
+    ページ取得の方法が分からない、または取得したページの番号が一致しない場合は None (呼び出し元で従来のページ送り)。
+    """
+    if build_result_page_request(search_state, current_page_num) is None:
+        return None
+    urls_by_page = {current_page_num: filter_syllabus_urls(driver.execute_script(_COLLECT_SYLLABUS_URLS_JS + "return collectSyllabusUrls(document);"), year)}
+    last_known_page = max(set(search_state.get('page_numbers') or []) | set(last_page_number_from_links(search_state)) | {current_page_num})
+    visited_pages = {current_page_num} | set(skip_pages)
+    driver.set_script_timeout(INPAGE_SCRIPT_TIMEOUT)
+    while True:
+        # ページ番号は連続しているため、判明している最大ページまでを未取得分から順に取得する
+        pending_pages = [page_num for page_num in range(1, last_known_page + 1) if page_num not in visited_pages][:RESULT_PAGE_PARALLELISM]
+        if not pending_pages:
+            break
+        batch_start_time = time.time()
+        page_results = driver.execute_async_script(
+            _FETCH_RESULT_PAGES_JS, [build_result_page_request(search_state, page_num) for page_num in pending_pages], HTTP_TIMEOUT * 1000,
+            search_state.get('page_query_param'), search_state.get('page_form_param')
+        )
+        for page_result in page_results:
+            page_num = page_result['page']
+            if page_result.get('error') or page_result.get('activePage') != str(page_num):
+                print(f"         [警告] ページ {page_num} の並行取得に失敗 ({page_result.get('error') or 'ページ番号不一致'})。")
+                return None
+            visited_pages.add(page_num)
+            urls_by_page[page_num] = filter_syllabus_urls(page_result['urls'], year)
+            last_known_page = max([last_known_page] + page_result['pages'])
+        print(f"         ページ {', '.join(map(str, pending_pages))} を並行取得しました ({time.time() - batch_start_time:.2f}s)")
+    # 複数ページに同じURLが現れた場合は最初のページにだけ残す
+    seen_urls = set()
+    for page_num in sorted(urls_by_page):
+        urls_by_page[page_num] = [url for url in dict.fromkeys(urls_by_page[page_num]) if url not in seen_urls]
+        seen_urls.update(urls_by_page[page_num])
+    return urls_by_page
+
+def fetch_syllabus_details_browser(driver, syllabus_url, current_year, screenshots_dir, tab_prefetcher=None, upcoming_urls=()):
+    """
+    メインのブラウザで詳細ページに直接遷移して取得する (検索結果ページに戻る必要はない)。
+    tab_prefetcher を指定すると先読み済みのタブを使い、解析中に upcoming_urls の読み込みを開始しておく。
+    """
+    if check_session_timeout(driver, screenshots_dir):
+        raise InvalidSessionIdException("Session timeout before detail fetch")
+    detail_tab, english_tab = (None, None) if tab_prefetcher is None else tab_prefetcher.take(driver, syllabus_url)
+    if tab_prefetcher is not None:
+        tab_prefetcher.prefetch(driver, upcoming_urls, current_year)
+    if detail_tab is None:
+        english_tab = navigate_detail_page(driver, syllabus_url, current_year)
+        wait_for_page_ready(driver, 'detail', min(30, ELEMENT_WAIT_TIMEOUT))
+        return get_syllabus_details(driver, current_year, screenshots_dir, english_handle=english_tab)
+
+    origin_tab = driver.current_window_handle
+    driver.switch_to.window(detail_tab)
+    try:
+        wait_for_page_ready(driver, 'detail', min(30, ELEMENT_WAIT_TIMEOUT))
+        return get_syllabus_details(driver, current_year, screenshots_dir, english_handle=english_tab)
+    finally:
+        close_tab(driver, english_tab, detail_tab)
+        close_tab(driver, detail_tab, origin_tab)
+
+def run_fetch_phase(frontier, current_year, screenshots_dir, http_client=None, async_fetcher=None, browser_pool=None, on_details=None, tab_prefetcher=None,
+                    legacy_fetcher=None):
+    """
+    フロンティアの pending URL (指定年度) を FRONTIER_BATCH_SIZE 件ずつ取り出して取得し、
+    取得できた詳細データのリストを返す。並行取得に失敗したURLはメインのブラウザで再試行する。
+    on_details を指定すると、取得できた詳細データごとに即座に呼び出す。
+    tab_prefetcher を指定すると、メインのブラウザでの取得中にバッチ内の次のURLを別タブで先読みする。
+    legacy_fetcher を指定すると、旧システムのURLは先にログインなしのHTTPで取得する。
+    """
+    results = []
+    consecutive_errors = 0
+    while True:
+        urls = frontier.claim(current_year, FRONTIER_BATCH_SIZE)
+        if not urls:
+            break
+        print(f"\n   [{current_year}年度] {len(urls)} 件の詳細ページを取得します... (残り: {frontier.counts()[URL_PENDING]} 件)")
+        batch_start_time = time.time()
+        batch_details = fetch_legacy_details(legacy_fetcher, urls, current_year)
+        remaining_urls = [u for u in urls if u not in batch_details]
+        detail_fetcher = async_fetcher if async_fetcher is not None else browser_pool
+        if detail_fetcher is not None and remaining_urls:
+            fetched_details, session_expired = detail_fetcher.fetch_all(remaining_urls, current_year)
+            if session_expired:
+                print("   セッション切れを検出。ブラウザのCookieで更新して失敗分を再取得します...")
+                refresh_detail_fetchers(globals()['driver'], http_client, async_fetcher, browser_pool)
+                retry_details, _ = detail_fetcher.fetch_all([u for u, d in fetched_details.items() if not d], current_year)
+                fetched_details.update({u: d for u, d in retry_details.items() if d})
+            batch_details.update(fetched_details)
+
+        for url_index, syllabus_url in enumerate(urls):
+            syllabus_details = batch_details.get(syllabus_url)
+            if syllabus_details is None and http_client is not None:
+                try:
+                    syllabus_details = fetch_syllabus_details_http(http_client, syllabus_url, current_year)
+                except HttpSessionExpiredError as e_http_session:
+                    print(f"           [HTTP] セッション切れを検出: {e_http_session}。ブラウザのCookieで更新します。")
+                    refresh_detail_fetchers(globals()['driver'], http_client, async_fetcher, browser_pool)
+            if syllabus_details is None:
+                if http_client is not None or async_fetcher is not None or browser_pool is not None:
+                    print(f"           並行/HTTP取得に失敗したため、メインのブラウザで再試行します: {syllabus_url}")
+                try:
+                    syllabus_details = fetch_syllabus_details_browser(globals()['driver'], syllabus_url, current_year, screenshots_dir,
+                                                                      tab_prefetcher=tab_prefetcher,
+                                                                      upcoming_urls=[u for u in urls[url_index + 1:] if not batch_details.get(u)])
+                except MissingCriticalDataError as e_missing:
+                    print(f"           [エラー] 必須データ不足: {e_missing}")
+                except (InvalidSessionIdException, NoSuchWindowException) as e_session:
+                    print(f"           [エラー] セッションエラー: {e_session}")
+                    if recover_driver_session():
+                        refresh_detail_fetchers(globals()['driver'], http_client, async_fetcher, browser_pool)
+                except Exception as e:
+                    print(f"           [エラー] 詳細ページ処理中にエラー: {e}")
+                time.sleep(SHORT_WAIT)
+
+            if syllabus_details:
+                frontier.mark_done(syllabus_url, syllabus_details)
+                results.append(syllabus_details)
+                if on_details is not None:
+                    on_details(syllabus_details)
+                consecutive_errors = 0
+                print(f"           ✅ 成功: ID:{syllabus_details.get('course_id')} | {syllabus_details.get('name_ja')} | Prof:{syllabus_details.get('professor_ja')} | Field:{syllabus_details.get('field_ja')}")
+            else:
+                frontier.mark_failed(syllabus_url, "detail fetch failed")
+                consecutive_errors += 1
+                print(f"           ❌ 失敗: {syllabus_url}")
+                if ENABLE_AUTO_HALT and consecutive_errors >= CONSECUTIVE_ERROR_THRESHOLD:
+                    print(f"           [!!!] {consecutive_errors}回の連続エラーが発生しました。WebDriverを再初期化します...")
+                    if not recover_driver_session():
+                        raise Exception("WebDriver再初期化失敗。")
+                    refresh_detail_fetchers(globals()['driver'], http_client, async_fetcher, browser_pool)
+                    consecutive_errors = 0
+        if tab_prefetcher is not None:
+            tab_prefetcher.discard_all(globals()['driver'])
+        print(f"   バッチ完了 ({time.time() - batch_start_time:.2f}s)")
+    return results
+
+# --- ★★★ 生データのコンパクトな保持 (スロット付きレコード + 文字列のインターン) ★★★ ---
+
+# トップレベルの補足情報と、その元になる translations.ja のキー
+RECORD_TOP_LEVEL_JA_KEYS = {
+    'professor_ja': 'professor',
+    'name_ja': 'name',
+    'field_ja': 'field',
+    'credits_ja': 'credits',
+}
+_RECORD_KEY_TUPLES = {} # キーの並び → 共有するタプル (全レコードで同じオブジェクトを使う)
+_RECORD_MISSING = object() # 元データに無かったキーの印
+
+def _intern_value(value):
+    return sys.intern(value) if type(value) is str else value
 
-        all_keys_to_copy = [k for k in ja_map_to_use.keys() if k != 'course_id_fallback']
+def _intern_key_tuple(keys):
+    keys = tuple(sys.intern(k) for k in keys)
+    return _RECORD_KEY_TUPLES.setdefault(keys, keys)
 
-        # 日本語データを構成
-        for key in all_keys_to_copy:
-            final_details['translations']['ja'][key] = ja_data.get(key, "")
+class SyllabusRecord:
+    """
+    生データ1件のメモリ上の表現。translations は共有キータプル + インターン済みの値タプルで保持し、
+    professor_ja / name_ja / field_ja / credits_ja は translations.ja から導出する (重複して持たない)。
+    to_details() で build_final_details と同じ形式の dict に戻す。
+    """
+    __slots__ = ('course_id', 'year_scraped', 'semester', 'ja_keys', 'ja_values', 'en_keys', 'en_values', 'extra')
+
+    def __init__(self, course_id, year_scraped, semester, ja_keys, ja_values, en_keys, en_values, extra=None):
+        self.course_id = course_id
+        self.year_scraped = year_scraped
+        self.semester = semester
+        self.ja_keys = ja_keys
+        self.ja_values = ja_values
+        self.en_keys = en_keys
+        self.en_values = en_values
+        self.extra = extra # 導出値と異なるトップレベル値や未知のキー (通常は None)
+
+    @classmethod
+    def from_details(cls, details):
+        if isinstance(details, cls):
+            return details
+        translations = details.get('translations', {})
+        ja = translations.get('ja', {})
+        en = translations.get('en', {})
+        extra = {}
+        for key, value in details.items():
+            if key in ('course_id', 'year_scraped', 'semester', 'translations'):
+                continue
+            ja_key = RECORD_TOP_LEVEL_JA_KEYS.get(key)
+            if ja_key is not None and ja.get(ja_key, '') == value:
+                continue
+            extra[key] = value
+        for key in RECORD_TOP_LEVEL_JA_KEYS:
+            if key not in details:
+                extra[key] = _RECORD_MISSING # 元データに無かったキーは to_details() でも出力しない
+        for key in ('course_id', 'year_scraped', 'semester', 'translations'):
+            if key not in details:
+                extra[key] = _RECORD_MISSING
+        return cls(
+            _intern_value(details.get('course_id')),
+            details.get('year_scraped'),
+            _intern_value(details.get('semester')),
+            _intern_key_tuple(ja.keys()),
+            tuple(_intern_value(v) for v in ja.values()),
+            _intern_key_tuple(en.keys()),
+            tuple(_intern_value(v) for v in en.values()),
+            extra or None,
+        )
 
-        # 英語データを構成
-        for key in all_keys_to_copy:
-            final_details['translations']['en'][key] = en_data.get(key, "")
+    def translation(self, lang):
+        """translations[lang] を dict として返す"""
+        if lang == 'ja':
+            return dict(zip(self.ja_keys, self.ja_values))
+        if lang == 'en':
+            return dict(zip(self.en_keys, self.en_values))
+        return {}
 
-        # --- トップレベルの情報を設定 (補足用) ---
-        semester_en_raw = final_details['translations']['en'].get('semester', '')
-        semester_ja_raw = final_details['translations']['ja'].get('semester', '')
-        final_details['semester'] = extract_season(semester_en_raw) if extract_season(semester_en_raw) != "unknown" else extract_season(semester_ja_raw)
-        final_details['professor_ja'] = final_details['translations']['ja'].get('professor', '')
-        final_details['name_ja'] = final_details['translations']['ja'].get('name', '')
-        final_details['field_ja'] = final_details['translations']['ja'].get('field', '')
-        final_details['credits_ja'] = final_details['translations']['ja'].get('credits', '')
+    def ja_value(self, key, default=''):
+        try:
+            return self.ja_values[self.ja_keys.index(key)]
+        except ValueError:
+            return default
+
+    def _top_level(self, key):
+        if self.extra and key in self.extra:
+            value = self.extra[key]
+            return '' if value is _RECORD_MISSING else value
+        return self.ja_value(RECORD_TOP_LEVEL_JA_KEYS[key])
+
+    @property
+    def professor_ja(self): return self._top_level('professor_ja')
+    @property
+    def name_ja(self): return self._top_level('name_ja')
+    @property
+    def field_ja(self): return self._top_level('field_ja')
+    @property
+    def credits_ja(self): return self._top_level('credits_ja')
+
+    def to_details(self):
+        """build_final_details と同じ形式 (キー順を含む) の dict に戻す"""
+        details = {
+            'course_id': self.course_id,
+            'year_scraped': self.year_scraped,
+            'translations': {
+                'ja': self.translation('ja'),
+                'en': self.translation('en')
+            },
+            'semester': self.semester,
+        }
+        for key, ja_key in RECORD_TOP_LEVEL_JA_KEYS.items():
+            details[key] = self.ja_value(ja_key)
+        if self.extra:
+            for key, value in self.extra.items():
+                if value is _RECORD_MISSING:
+                    details.pop(key, None)
+                else:
+                    details[key] = value
+        return details
 
-        total_elapsed = time.time() - detail_start_time
-        print(f"    [{time.strftime('%H:%M:%S')}] ✅ Complete syllabus details extracted ({total_elapsed:.2f}s)")
-        
-        # Display visual verification of scraped data
-        display_scraped_info(final_details, f"Syllabus ID: {final_details.get('course_id', 'N/A')}")
-        
-        if DEBUG_TRACE:
-            print(f"DEBUG: Final details object built successfully with {len(final_details.get('translations', {}).get('ja', {}))} Japanese fields and {len(final_details.get('translations', {}).get('en', {}))} English fields")
-            print(f"DEBUG: Returning complete object from get_syllabus_details")
+# --- ★★★ データ集約 (増分集約インデックス) ★★★ ---
+
+def make_aggregation_key(item):
+    """
+    ★★★ 集約キー: 担当者名(日), 科目名(日), 学期(季節のみ), 分野(日), 単位(日) ★★★ (登録番号を除外)
+    キーに必要な情報が不足または学期不明の場合は None を返す。item は SyllabusRecord または生データの dict。
+    """
+    item = SyllabusRecord.from_details(item)
+    course_id = item.course_id
+    professor_ja_key = item.professor_ja
+    professors_tuple = tuple(sorted([p.strip() for p in re.split('[/,]', professor_ja_key) if p.strip()]))
+    name_ja_key = item.name_ja
+    semester_agg_key = item.semester if item.semester is not None else 'unknown'
+    field_ja_key = item.field_ja
+    credits_ja_key = item.credits_ja
+
+    agg_key = (
+        professors_tuple, name_ja_key, semester_agg_key, field_ja_key, credits_ja_key
+    )
+
+    if not name_ja_key or not field_ja_key or not credits_ja_key or semester_agg_key == "unknown":
+        error_msg = f"集約キーに必要な情報が不足または学期不明 (Course ID: {course_id}, Year: {item.year_scraped}, Semester: {semester_agg_key})"
+        print(f"[警告] {error_msg}")
         
-        return final_details
+        if not pause_on_error(f"Missing critical aggregation data: {error_msg}"):
+            print("ユーザーによる中断。スクリプトを終了します。")
+            sys.exit(1)
+        return None
+    return agg_key
+
+def build_aggregated_item(agg_key, year_data_list):
+    """同じ集約キーの生データ (SyllabusRecord, 複数年度) から出力JSONの1件を作成する (最新年度のデータを基本とする)"""
+    year_data_list = sorted(year_data_list, key=lambda x: x.year_scraped, reverse=True)
+    latest_data = year_data_list[0]
+    years_scraped_int = sorted(list(set(d.year_scraped for d in year_data_list)), reverse=True)
+    available_years_str = [str(y) for y in years_scraped_int]
+
+    trans_ja = latest_data.translation('ja')
+    trans_en = latest_data.translation('en')
+    semester_final = agg_key[2]
+
+    professors_list = []
+    prof_ja_raw = trans_ja.get('professor', '')
+    prof_en_raw = trans_en.get('professor', '')
+
+    # Use the new parsing function
+    prof_ja_names = parse_professor_names(prof_ja_raw)
+    prof_en_names = parse_professor_names(prof_en_raw)
+
+    num_professors = len(prof_ja_names)
+    if len(prof_en_names) < num_professors:
+        prof_en_names.extend([""] * (num_professors - len(prof_en_names)))
+    elif len(prof_en_names) > num_professors:
+        prof_en_names = prof_en_names[:num_professors]
+
+    # FIX: Set default empty values for department
+    dept_ja = ""
+    dept_en = ""
+
+    for i in range(num_professors):
+        prof_obj = {
+            "name": {
+                "ja": prof_ja_names[i],
+                "en": prof_en_names[i] if i < len(prof_en_names) and prof_en_names[i] else prof_ja_names[i]
+            },
+            "department": { "ja": dept_ja, "en": dept_en }
+        }
+        professors_list.append(prof_obj)
+
+    # Normalize field and credits
+    field_ja = normalize_field(trans_ja.get('field', ''))
+    field_en = normalize_field(trans_en.get('field', ''))
+    credits_ja = normalize_credits(trans_ja.get('credits', ''), 'ja')
+    credits_en = normalize_credits(trans_en.get('credits', ''), 'en')
+
+    return {
+        "course_id": latest_data.course_id,
+        "year": "&".join(available_years_str),
+        "semester": semester_final,
+        "translations": {
+            "ja": {
+                "name": trans_ja.get('name', ''), 
+                "field": field_ja,
+                "credits": credits_ja, 
+                "semester": trans_ja.get('semester', ''),
+                "Classroom": trans_ja.get('location', ''), 
+                "day_period": trans_ja.get('day_period', ''),
+                "selection_method": trans_ja.get('selection_method', '')
+            },
+            "en": {
+                "name": trans_en.get('name', ''), 
+                "field": field_en,
+                "credits": credits_en, 
+                "semester": trans_en.get('semester', ''),
+                "Classroom": trans_en.get('location', ''), 
+                "day_period": trans_en.get('day_period', ''),
+                "selection_method": trans_en.get('selection_method', '')
+            }
+        },
+        "professors": professors_list,
+        "available_years": available_years_str
+    }
+
+class IncrementalAggregator:
+    """
+    実行中ずっと grouped_by_key (集約キー → SyllabusRecord のリスト) を保持し、
+    新しい生データが追加されたグループだけを再集約する。
+    final_list() は aggregate_syllabus_data と同じ形式・同じ順序のリストを返す。
+    """
+
+    def __init__(self, sink=None):
+        self.grouped_by_key = {}
+        self.aggregated_by_key = {}
+        self.dirty_keys = set()
+        self.raw_count = 0
+        self.skipped_count = 0
+        self.sink = sink # 追加された生データを即座に書き出す RawRecordSink (任意)
+
+    def __len__(self):
+        return self.raw_count
+
+    def append(self, item, persist=True):
+        """生データを1件追加し、該当グループを再集約対象にする (persist=False: 保存済みデータの読み込み時)"""
+        if persist and self.sink is not None:
+            self.sink.write(item)
+        self.raw_count += 1
+        record = SyllabusRecord.from_details(item)
+        agg_key = make_aggregation_key(record)
+        if agg_key is None:
+            self.skipped_count += 1
+            return
+        self.grouped_by_key.setdefault(agg_key, []).append(record)
+        self.dirty_keys.add(agg_key)
+
+    def extend(self, items, persist=True):
+        for item in items:
+            self.append(item, persist)
+
+    def final_list(self):
+        """変更のあったグループだけを再集約し、出力JSON用のリストを返す"""
+        print("\n--- データ集約開始 ---")
+        if self.skipped_count > 0: print(f"キー情報不足または学期不明により {self.skipped_count} 件のデータが集約からスキップされました。")
+        print(f"{len(self.grouped_by_key)} 件に集約されました。(再集約: {len(self.dirty_keys)} 件)")
+        item_count = 0
+        for agg_key in self.dirty_keys:
+            item_count += 1
+            if item_count % 100 == 0:
+                 print(f"   集約処理中... {item_count}/{len(self.dirty_keys)}")
+            self.aggregated_by_key[agg_key] = build_aggregated_item(agg_key, self.grouped_by_key[agg_key])
+        self.dirty_keys.clear()
+        print("--- データ集約完了 ---")
+        return [self.aggregated_by_key[agg_key] for agg_key in self.grouped_by_key]
 
-# --- ★★★ aggregate_syllabus_data 関数 (変更なし) ★★★ ---
 def aggregate_syllabus_data(all_raw_data):
     """
     複数年度にわたる生データを集約し、指定されたJSON形式に整形する。
@@ -1316,119 +3775,77 @@ def aggregate_syllabus_data(all_raw_data):
     複数年度ある場合は、最新年度のデータを基本とし、year と available_years を更新する。
     """
     if not all_raw_data: return []
-    grouped_by_key = {}
-    skipped_count = 0
-    print("\n--- データ集約開始 ---")
-    for item in all_raw_data:
-        course_id = item.get('course_id')
-        professor_ja_key = item.get('professor_ja', '')
-        professors_tuple = tuple(sorted([p.strip() for p in re.split('[/,]', professor_ja_key) if p.strip()]))
-        name_ja_key = item.get('name_ja', '')
-        semester_agg_key = item.get('semester', 'unknown')
-        field_ja_key = item.get('field_ja', '')
-        credits_ja_key = item.get('credits_ja', '')
-
-        agg_key = (
-            professors_tuple, name_ja_key, semester_agg_key, field_ja_key, credits_ja_key
-        )
+    aggregator = IncrementalAggregator()
+    aggregator.extend(all_raw_data)
+    return aggregator.final_list()
+# --- ★★★ 生データのJSONLストリーミング保存と syllabus_data.json への圧縮 ★★★ ---
 
-        if not name_ja_key or not field_ja_key or not credits_ja_key or semester_agg_key == "unknown":
-            error_msg = f"集約キーに必要な情報が不足または学期不明 (Course ID: {course_id}, Year: {item.get('year_scraped')}, Semester: {semester_agg_key})"
-            print(f"[警告] {error_msg}")
-            
-            if not pause_on_error(f"Missing critical aggregation data: {error_msg}"):
-                print("ユーザーによる中断。スクリプトを終了します。")
-                sys.exit(1)
-            
-            skipped_count += 1
-            continue
+class RawRecordSink:
+    """
+    取得した生データを1件ごとにJSONLへ追記する。書き込みごとに flush し、
+    fsync は RAW_SINK_FSYNC_BATCH 件ごと (または RAW_SINK_FSYNC_INTERVAL 秒ごと) にまとめて行う。
+    """
+
+    def __init__(self, path, truncate=False):
+        self.path = path
+        self.lock = Lock()
+        self.file = open(path, mode='w' if truncate else 'a', encoding='utf-8')
+        self.unsynced_count = 0
+        self.last_sync_time = time.time()
+
+    def write(self, record):
+        if isinstance(record, SyllabusRecord):
+            record = record.to_details()
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            self.unsynced_count += 1
+            if self.unsynced_count >= RAW_SINK_FSYNC_BATCH or time.time() - self.last_sync_time >= RAW_SINK_FSYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced_count = 0
+        self.last_sync_time = time.time()
+
+    def sync(self):
+        """未確定の書き込みを fsync する"""
+        with self.lock:
+            if self.unsynced_count:
+                self._sync()
+
+    def close(self):
+        with self.lock:
+            if self.unsynced_count:
+                self._sync()
+            self.file.close()
+
+def read_raw_records(path):
+    """JSONLの生データを順に返す (異常終了で途中までしか書かれていない最終行は無視する)"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[警告] {path} の {line_number} 行目を読み込めませんでした (書き込み途中の行の可能性)。スキップします。")
+
+def compact_raw_records(raw_records_path, output_json_path):
+    """JSONLの生データを集約し、syllabus_data.json を一時ファイル + リネームで書き出す"""
+    aggregator = IncrementalAggregator()
+    aggregator.extend(read_raw_records(raw_records_path))
+    print(f"生データ {len(aggregator)} 件を読み込みました: {raw_records_path}")
+    final_data = aggregator.final_list()
+    if final_data:
+        write_json_data(final_data, output_json_path)
+    else:
+        print("集約後データなし。JSON未作成。")
+    return final_data
 
-        if agg_key not in grouped_by_key: grouped_by_key[agg_key] = []
-        grouped_by_key[agg_key].append(item)
-
-    if skipped_count > 0: print(f"キー情報不足または学期不明により {skipped_count} 件のデータが集約からスキップされました。")
-    print(f"{len(grouped_by_key)} 件に集約されました。")
-
-    final_list = []
-    item_count = 0
-    for agg_key, year_data_list in grouped_by_key.items():
-        item_count += 1
-        if item_count % 100 == 0:
-             print(f"   集約処理中... {item_count}/{len(grouped_by_key)}")
-
-        year_data_list.sort(key=lambda x: x['year_scraped'], reverse=True)
-        latest_data = year_data_list[0]
-        years_scraped_int = sorted(list(set(d['year_scraped'] for d in year_data_list)), reverse=True)
-        available_years_str = [str(y) for y in years_scraped_int]
-
-        trans_ja = latest_data.get('translations', {}).get('ja', {})
-        trans_en = latest_data.get('translations', {}).get('en', {})
-        semester_final = agg_key[2]
-
-        professors_list = []
-        prof_ja_raw = trans_ja.get('professor', '')
-        prof_en_raw = trans_en.get('professor', '')
-
-        # Use the new parsing function
-        prof_ja_names = parse_professor_names(prof_ja_raw)
-        prof_en_names = parse_professor_names(prof_en_raw)
-
-        num_professors = len(prof_ja_names)
-        if len(prof_en_names) < num_professors:
-            prof_en_names.extend([""] * (num_professors - len(prof_en_names)))
-        elif len(prof_en_names) > num_professors:
-            prof_en_names = prof_en_names[:num_professors]
-
-        # FIX: Set default empty values for department
-        dept_ja = ""
-        dept_en = ""
-
-        for i in range(num_professors):
-            prof_obj = {
-                "name": {
-                    "ja": prof_ja_names[i],
-                    "en": prof_en_names[i] if i < len(prof_en_names) and prof_en_names[i] else prof_ja_names[i]
-                },
-                "department": { "ja": dept_ja, "en": dept_en }
-            }
-            professors_list.append(prof_obj)
-
-        # Normalize field and credits
-        field_ja = normalize_field(trans_ja.get('field', ''))
-        field_en = normalize_field(trans_en.get('field', ''))
-        credits_ja = normalize_credits(trans_ja.get('credits', ''), 'ja')
-        credits_en = normalize_credits(trans_en.get('credits', ''), 'en')
-
-        aggregated_item = {
-            "course_id": latest_data['course_id'],
-            "year": "&".join(available_years_str),
-            "semester": semester_final,
-            "translations": {
-                "ja": {
-                    "name": trans_ja.get('name', ''), 
-                    "field": field_ja,
-                    "credits": credits_ja, 
-                    "semester": trans_ja.get('semester', ''),
-                    "Classroom": trans_ja.get('location', ''), 
-                    "day_period": trans_ja.get('day_period', ''),
-                    "selection_method": trans_ja.get('selection_method', '')
-                },
-                "en": {
-                    "name": trans_en.get('name', ''), 
-                    "field": field_en,
-                    "credits": credits_en, 
-                    "semester": trans_en.get('semester', ''),
-                    "Classroom": trans_en.get('location', ''), 
-                    "day_period": trans_en.get('day_period', ''),
-                    "selection_method": trans_en.get('selection_method', '')
-                }
-            },
-            "professors": professors_list,
-            "available_years": available_years_str
-        }
-        final_list.append(aggregated_item)
-    print("--- データ集約完了 ---")
-    return final_list
 # --- login 関数 (変更なし) ---
 def login(driver, email, password, screenshots_dir):
     """指定された情報でログイン処理を行う"""
@@ -1565,21 +3982,156 @@ def apply_cookies(driver, cookies):
         print(f"[エラー] Cookie適用中にエラーが発生しました: {e}")
         return False
 
-# --- check_session_timeout 関数 (変更なし) ---
+# --- ★★★ ログインCookieの保存と再利用 (起動時・復旧時の login() を省略) ★★★ ---
+
+def load_cookie_jar_key():
+    """
+    Cookieの暗号鍵 (Fernet鍵) を環境変数 COOKIE_JAR_KEY_ENV、無ければOSのキーリングから取得する
+    (キーリングに鍵が無ければ生成して保存する)。どちらも使えない場合は None (暗号化せずに保存)。
+    """
+    if Fernet is None:
+        return None
+    env_key = os.environ.get(COOKIE_JAR_KEY_ENV)
+    if env_key:
+        try:
+            Fernet(env_key)
+            return env_key.encode('ascii')
+        except ValueError:
+            print(f"[警告] 環境変数 {COOKIE_JAR_KEY_ENV} が Fernet の鍵ではないため使用しません。")
+    if keyring is None:
+        return None
+    try:
+        stored_key = keyring.get_password(COOKIE_JAR_KEYRING_SERVICE, USER_EMAIL)
+        if not stored_key:
+            stored_key = Fernet.generate_key().decode('ascii')
+            keyring.set_password(COOKIE_JAR_KEYRING_SERVICE, USER_EMAIL, stored_key)
+        Fernet(stored_key)
+        return stored_key.encode('ascii')
+    except Exception as e: # キーリングのバックエンドが無い環境など
+        print(f"[警告] キーリングからCookieの暗号鍵を取得できませんでした: {e}")
+        return None
+
+class CookieJar:
+    """
+    extract_auth_cookies() のCookieを有効期限付きで、所有者のみ読み書きできるファイル (0600) に保存する。
+    key (load_cookie_jar_key() の鍵) があれば Fernet で暗号化し、無ければ暗号化せずに保存する。
+    ジャー全体は保存から COOKIE_JAR_MAX_AGE 秒で失効し、読み込み時には expiry を過ぎたCookieを除外する。
+    """
+
+    def __init__(self, path, email, key=None):
+        self.path = path
+        self.email = email
+        self.fernet = Fernet(key) if key else None
+        self.lock = Lock() # ワーカープールの各スレッドから保存される場合がある
+
+    @property
+    def encrypted(self):
+        return self.fernet is not None
+
+    def save(self, cookies):
+        """Cookieを (鍵があれば暗号化して) 一時ファイル + リネームで保存する"""
+        if not cookies:
+            return False
+        now = time.time()
+        payload = {
+            'email': self.email,
+            'saved_at': now,
+            'expires_at': now + COOKIE_JAR_MAX_AGE,
+            'cookies': cookies, # 各Cookieの expiry もそのまま保存し、読み込み時に期限切れを除外する
+        }
+        if self.fernet is not None:
+            stored = {'format': 'fernet', 'token': self.fernet.encrypt(json.dumps(payload).encode('utf-8')).decode('ascii')}
+        else:
+            stored = {'format': 'plain', 'payload': payload}
+        temp_path = f"{self.path}.tmp"
+        with self.lock:
+            try:
+                # 作成時から 0600 にする (書き込み後の chmod では一時的に他ユーザーから読める)
+                with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+                    json.dump(stored, f)
+                os.replace(temp_path, self.path)
+                return True
+            except OSError as e:
+                print(f"[警告] Cookieの保存に失敗しました: {e}")
+                return False
+
+    def load(self):
+        """有効期限内のCookieを返す (ファイルなし・期限切れ・復号失敗・形式違い・別アカウントの場合は None)"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored['format'] == 'fernet' and self.fernet is not None:
+                payload = json.loads(self.fernet.decrypt(stored['token'].encode('ascii')))
+            elif stored['format'] == 'plain' and self.fernet is None:
+                payload = stored['payload']
+            else:
+                return None # 保存時と鍵の有無が異なる
+        except (OSError, ValueError, KeyError, TypeError, InvalidToken) as e:
+            print(f"[警告] 保存済みCookieを読み込めませんでした ({type(e).__name__})。ログインします。")
+            return None
+        now = time.time()
+        if payload.get('email') != self.email or payload.get('expires_at', 0) <= now:
+            return None
+        return [cookie for cookie in payload['cookies'] if not cookie.get('expiry') or cookie['expiry'] > now]
+
+    def clear(self):
+        try: os.remove(self.path)
+        except OSError: pass
+
+COOKIE_JAR = None # メイン処理で PERSIST_SESSION_COOKIES が有効な場合に CookieJar を設定
+
+def probe_session(driver):
+    """検索ページを1回開き、ログイン済みの状態で表示されるかを確認する (ログイン/タイムアウトページなら False)"""
+    try:
+        driver.get('https://gslbs.keio.jp/syllabus/search')
+        if "gslbs.keio.jp/syllabus/search" not in driver.current_url:
+            return False
+        page_type, _ = classify_page(driver)
+        if page_type in (PAGE_LOGIN_REQUIRED, PAGE_SESSION_TIMEOUT):
+            return False
+        return wait_for_page_ready(driver, 'search_form')
+    except (InvalidSessionIdException, NoSuchWindowException):
+        raise
+    except WebDriverException as e:
+        print(f"[警告] セッション確認中にエラー: {e}")
+        return False
+
+def save_session_cookies(driver):
+    """ログイン済みドライバーのCookieを暗号化ジャーに保存する (無効時は何もしない)"""
+    if COOKIE_JAR is None:
+        return
+    cookies = extract_auth_cookies(driver)
+    if cookies and COOKIE_JAR.save(cookies):
+        print(f"ログインCookieを保存しました ({len(cookies)}個)。")
+
+def establish_session(driver, screenshots_dir, try_saved=True):
+    """
+    保存済みCookieを apply_cookies() で適用して probe_session() で確認し、
+    有効ならログインを省略する。無効・未保存の場合のみ login() を行い、Cookieを保存し直す。
+    """
+    if try_saved and COOKIE_JAR is not None:
+        saved_cookies = COOKIE_JAR.load()
+        if saved_cookies:
+            restore_start_time = time.time()
+            if apply_cookies(driver, saved_cookies) and probe_session(driver):
+                print(f"保存済みCookieでセッションを復元しました ({time.time() - restore_start_time:.2f}s)。ログインを省略します。")
+                return True
+            print("保存済みCookieは無効でした。ログインします。")
+            COOKIE_JAR.clear()
+    if not login(driver, USER_EMAIL, USER_PASSWORD, screenshots_dir):
+        return False
+    save_session_cookies(driver)
+    return True
+
+
+# --- check_session_timeout 関数 (classify_page で判定) ---
 def check_session_timeout(driver, screenshots_dir):
     """セッションタイムアウトページが表示されているか確認する"""
     try:
-        current_url = driver.current_url
-        page_title = driver.title
-        page_source = driver.page_source.lower()
-        timeout_keywords = ["セッションタイムアウト", "session timeout", "ログインし直してください", "log back in"]
-        error_page_url_part = "/syllabus/appMsg"
-        is_session_timeout = False
-        if error_page_url_part in current_url: is_session_timeout = True
-        elif any(keyword in page_source for keyword in timeout_keywords): is_session_timeout = True
-        elif "error" in page_title.lower() and any(keyword in page_source for keyword in timeout_keywords): is_session_timeout = True
-
-        if is_session_timeout:
+        page_type, _ = classify_page(driver)
+        if page_type == PAGE_SESSION_TIMEOUT:
             print("[警告] セッションタイムアウトページが検出されました。")
             save_screenshot(driver, "session_timeout_detected", screenshots_dir)
             return True
@@ -1656,7 +4208,7 @@ def initialize_driver(driver_path, headless=False):
             new_driver = webdriver.Chrome(service=service, options=options)
             print(f"自動検出されたChromeDriverを使用: {service.path}")
         new_driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
-        new_driver.implicitly_wait(5)
+        new_driver.implicitly_wait(0) # 要素待機は明示的な待機 (wait_for_page_ready 等) で行う
         print("WebDriverの初期化完了。")
         return new_driver
     except Exception as e:
@@ -1665,12 +4217,154 @@ def initialize_driver(driver_path, headless=False):
         return None
 
 
+# --- ★★★ ホットスタンバイのドライバー (ログイン済みのChromeを裏で待機させ、障害時に即座に差し替える) ★★★ ---
+
+class StandbyDriver:
+    """
+    バックグラウンドスレッドでChromeを起動・認証 (establish_session) して待機させ、
+    STANDBY_REFRESH_INTERVAL 秒ごとに probe_session() でセッションを維持する。
+    take() は待機中のドライバーを渡し (STANDBY_TAKE_TIMEOUT 秒以内。セッション確認中なら確認の完了を
+    STANDBY_REFRESH_TAKE_TIMEOUT 秒まで待つ)、次のスタンバイを非同期に準備する。
+    """
+
+    def __init__(self, screenshots_dir):
+        self.screenshots_dir = screenshots_dir
+        self.lock = Lock()
+        self.refresh_done = Condition(self.lock)
+        self.driver = None
+        self.refreshing = False # _refresh() がロック外でセッションを確認中 (ドライバーは driver に置いたまま)
+        self.stop_event = Event()
+        self.wake_event = Event()
+        self.thread = Thread(target=self._run, name="standby-driver", daemon=True)
+        self.thread.start()
+
+    def _prepare(self):
+        new_driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
+        if not new_driver:
+            return None
+        try:
+            if establish_session(new_driver, self.screenshots_dir):
+                return new_driver
+            print("[警告] スタンバイドライバーのログインに失敗しました。")
+        except Exception as e:
+            print(f"[警告] スタンバイドライバーの準備中にエラー: {e}")
+        quit_driver_async(new_driver)
+        return None
+
+    def _refresh(self):
+        """
+        待機中のドライバーのセッションを確認し、切れていれば再認証する (ブラウザが落ちていれば破棄)。
+        確認・再ログインはロック外で行うが、ドライバーは driver に置いたままにし、その間の take() は完了を待つ。
+        """
+        with self.lock:
+            standby_driver = self.driver
+            if standby_driver is None:
+                return
+            self.refreshing = True
+        healthy = False
+        try:
+            healthy = probe_session(standby_driver) or establish_session(standby_driver, self.screenshots_dir)
+            if not healthy:
+                print("[警告] スタンバイドライバーのセッションを維持できませんでした。作り直します。")
+        except Exception as e:
+            print(f"[警告] スタンバイドライバーの更新中にエラー: {e}。作り直します。")
+        with self.lock:
+            self.refreshing = False
+            if not healthy and self.driver is standby_driver:
+                self.driver = None
+            self.refresh_done.notify_all()
+        if not healthy:
+            quit_driver_async(standby_driver)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if self.driver is None:
+                prepare_start_time = time.time()
+                new_driver = self._prepare()
+                with self.lock:
+                    if self.stop_event.is_set():
+                        quit_driver_async(new_driver)
+                        return
+                    self.driver = new_driver
+                if new_driver is None:
+                    self.stop_event.wait(STANDBY_RETRY_WAIT)
+                    continue
+                print(f"[{time.strftime('%H:%M:%S')}] スタンバイドライバーの準備完了 ({time.time() - prepare_start_time:.1f}s)")
+            elif self.wake_event.wait(STANDBY_REFRESH_INTERVAL):
+                self.wake_event.clear() # take() 直後: すぐに次のスタンバイを準備する
+            elif not self.stop_event.is_set():
+                self._refresh()
+
+    def take(self):
+        """
+        待機中のログイン済みドライバーを返す (準備中で無い場合や、セッション確認が STANDBY_REFRESH_TAKE_TIMEOUT 秒以内に
+        終わらない場合は None。確認中のドライバーは破棄せず待機させたままにする)
+        """
+        if not self.lock.acquire(timeout=STANDBY_TAKE_TIMEOUT):
+            return None
+        try:
+            if self.refreshing:
+                print(f"[{time.strftime('%H:%M:%S')}] スタンバイドライバーのセッション確認の完了を待っています...")
+                if not self.refresh_done.wait_for(lambda: not self.refreshing, timeout=STANDBY_REFRESH_TAKE_TIMEOUT):
+                    return None
+            standby_driver, self.driver = self.driver, None
+        finally:
+            self.lock.release()
+        self.wake_event.set()
+        if standby_driver is None:
+            return None
+        try:
+            standby_driver.current_url # ブラウザが生きているかの確認
+        except WebDriverException:
+            quit_driver_async(standby_driver)
+            return None
+        return standby_driver
+
+    def close(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join(timeout=PAGE_LOAD_TIMEOUT)
+        with self.lock:
+            standby_driver, self.driver = self.driver, None
+        if standby_driver:
+            try: standby_driver.quit()
+            except Exception as e: print(f"[警告] スタンバイドライバー終了エラー: {e}")
+
+STANDBY_DRIVER = None # メイン処理で HOT_STANDBY_DRIVER が有効な場合に StandbyDriver を設定
+
+def quit_driver_async(old_driver):
+    """ドライバーの終了を待たずに処理を続けられるよう、別スレッドで quit() する"""
+    if not old_driver:
+        return
+    def _quit():
+        try: old_driver.quit()
+        except Exception: pass
+    Thread(target=_quit, name="driver-quit", daemon=True).start()
+
+def take_standby_driver():
+    """ホットスタンバイのドライバーを取り出す (無効・準備未完了の場合は None → 呼び出し元でコールドスタート)"""
+    if STANDBY_DRIVER is None:
+        return None
+    swap_start_time = time.time()
+    standby_driver = STANDBY_DRIVER.take()
+    if standby_driver is not None:
+        print(f"[{time.strftime('%H:%M:%S')}] ⚡ スタンバイドライバーに切り替えました ({time.time() - swap_start_time:.2f}s)")
+    return standby_driver
+
 def recover_driver_session():
-    """Recover an invalid WebDriver session by reinitializing the WebDriver"""
+    """Recover an invalid WebDriver session by swapping in the standby driver (or reinitializing the WebDriver)"""
     print(f"[{time.strftime('%H:%M:%S')}] 🔄 Attempting to recover driver session...")
     try:
         global driver
         
+        # ホットスタンバイがあれば即座に差し替え、古いドライバーは裏で終了する
+        standby_driver = take_standby_driver()
+        if standby_driver:
+            quit_driver_async(driver if 'driver' in globals() else None)
+            driver = standby_driver
+            print(f"[{time.strftime('%H:%M:%S')}] ✅ Driver session successfully recovered (standby)")
+            return True
+
         # Try to close the existing driver if it exists
         try:
             if 'driver' in globals() and driver:
@@ -1684,8 +4378,8 @@ def recover_driver_session():
             print(f"[{time.strftime('%H:%M:%S')}] ❌ Failed to initialize new driver")
             return False
             
-        # Attempt login
-        if not login(driver, USER_EMAIL, USER_PASSWORD, screenshots_dir):
+        # Attempt login (保存済みCookieが有効ならログインを省略)
+        if not establish_session(driver, screenshots_dir):
             print(f"[{time.strftime('%H:%M:%S')}] ❌ Failed to login with new driver")
             return False
             
@@ -1701,7 +4395,12 @@ def recover_driver_session():
 def recover_webdriver(screenshots_dir):
     """WebDriverをリカバリーし、再ログインを試みる"""
     retries = 3
-    
+
+    standby_driver = take_standby_driver()
+    if standby_driver:
+        quit_driver_async(globals().get('driver'))
+        return standby_driver
+
     for attempt in range(retries):
         try:
             print(f"\n[情報] WebDriver再初期化試行 ({attempt + 1}/{retries})...")
@@ -1720,8 +4419,8 @@ def recover_webdriver(screenshots_dir):
                 time.sleep(3)
                 continue
                 
-            # ログイン試行
-            if not login(new_driver, USER_EMAIL, USER_PASSWORD, screenshots_dir):
+            # ログイン試行 (保存済みCookieが有効ならログインを省略)
+            if not establish_session(new_driver, screenshots_dir):
                 print("[エラー] ログイン失敗")
                 if new_driver:
                     new_driver.quit()
@@ -1739,17 +4438,24 @@ def recover_webdriver(screenshots_dir):
     print("[重大エラー] WebDriverリカバリー失敗")
     return None
 
-# --- ★★★ JSONファイル書き込み関数 (変更なし) ★★★ ---
+# --- ★★★ JSONファイル書き込み関数 (一時ファイル + リネームで原子的に置き換え) ★★★ ---
 def write_json_data(data, path):
-    """指定されたパスにJSONデータを書き込む"""
+    """指定されたパスにJSONデータを書き込む (書き込み途中で中断しても既存ファイルは壊れない)"""
     print(f"\n'{path}' へ書き込み中 ({len(data)} 件)...")
+    temp_path = f"{path}.tmp"
     try:
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, mode='w', encoding='utf-8') as f:
+        with open(temp_path, mode='w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
         print(f"JSON書き込み完了。")
     except Exception as e:
         print(f"[エラー] JSON書き込みエラー: {e}")
+        if os.path.exists(temp_path):
+            try: os.remove(temp_path)
+            except OSError: pass
 
 # Missing function that I realized is referenced but wasn't included in the original code
 def pause_on_error(error_message, exception=None, screenshot_path=None):
@@ -1769,56 +4475,381 @@ def pause_on_error(error_message, exception=None, screenshot_path=None):
     #     print("\nキーボード割り込みにより中断。")
     #     return False
 
+# --- ★★★ ID指定の直接取得モード (検索フォーム・ページ送りを使わない) ★★★ ---
+
+_COURSE_ID_PAIR_PATTERN = re.compile(r'^\s*(\d{4})\s*[:_,\s]\s*(\d+)\s*$')
+
+def build_direct_detail_url(year, course_id):
+    """
+    (年度, 登録番号) から旧システム (2024年度以前) の日本語の詳細ページのURLを組み立てる
+    (extract_course_id_from_url で同じIDに戻る形式)。新システムは収集済みURLが必要なため None。
+    """
+    if year > 2024:
+        return None
+    return LEGACY_DETAIL_URL_TEMPLATE.format(year=year, course_id=course_id)
+
+def infer_detail_url_template(url, year, course_id):
+    """収集済みの詳細URL (年度・登録番号が既知) の年度とIDの部分を置き換えてURLテンプレートを作る (作れなければ None)"""
+    template = url.replace('{', '{{').replace('}', '}}')
+    template, id_count = re.subn(rf'(?<!\d){re.escape(course_id)}(?!\d)', '{course_id}', template)
+    if id_count != 1:
+        return None
+    return re.sub(rf'(?<!\d){year}(?!\d)', '{year}', template)
+
+def resolve_direct_detail_urls(pairs, known_urls):
+    """
+    (年度, 登録番号) の組を詳細ページのURLにする。収集済みのURLがあればそれを使い、
+    無ければ収集済みURLから作ったテンプレート、それも無ければ旧システムのみ LEGACY_DETAIL_URL_TEMPLATE で組み立てる。
+    (年度ごとのURLのリスト, URLを組み立てられなかった (年度, 登録番号) のリスト) を返す。
+    """
+    url_by_pair = {}
+    template_by_system = {} # 旧システムか (年度 <= 2024) → 収集済みURLから作ったテンプレート
+    for url, year in known_urls:
+        course_id = extract_course_id_from_url(url, year)
+        if course_id is None:
+            continue
+        url_by_pair.setdefault((year, course_id), url)
+        if (year <= 2024) not in template_by_system:
+            template = infer_detail_url_template(url, year, course_id)
+            if template:
+                template_by_system[year <= 2024] = template
+    urls_by_year = {}
+    unresolved_pairs = []
+    for year, course_id in pairs:
+        template = template_by_system.get(year <= 2024)
+        if (year, course_id) in url_by_pair:
+            syllabus_url = url_by_pair[(year, course_id)]
+        elif template:
+            syllabus_url = template.format(year=year, course_id=course_id)
+        else:
+            syllabus_url = build_direct_detail_url(year, course_id)
+        if syllabus_url is None:
+            unresolved_pairs.append((year, course_id))
+            continue
+        urls_by_year.setdefault(year, []).append(syllabus_url)
+    return urls_by_year, unresolved_pairs
+
+def latest_item_year(item):
+    """syllabus_data.json の項目の最新年度 (year '2025&2024' の先頭) を返す (不明なら None)"""
+    latest_year = str(item.get('year', '')).split('&')[0]
+    return int(latest_year) if latest_year.isdigit() else None
+
+def output_item_key(item):
+    """syllabus_data.json の項目から、集約キーに相当する科目の同一性キー (担当者名, 科目名, 学期, 分野, 単位) を作る"""
+    trans_ja = item.get('translations', {}).get('ja', {})
+    # professors[].name.ja は文字列または {'ja', 'en'} の dict のため、JSON文字列にして比較する
+    professors = tuple(sorted(json.dumps(p.get('name', {}).get('ja', ''), ensure_ascii=False, sort_keys=True)
+                              for p in item.get('professors', [])))
+    return (professors, trans_ja.get('name', ''), item.get('semester', ''), trans_ja.get('field', ''), trans_ja.get('credits', ''))
+
+def merge_into_output_items(existing_items, fetched_details):
+    """
+    取得し直した生データを集約し、既存の syllabus_data.json の項目に反映したリストを返す (生データのJSONLが無い場合用)。
+    (最新年度, Course ID) または科目の同一性キーが一致する項目は更新し (available_years は合算)、一致しない科目は追加する。
+    """
+    aggregator = IncrementalAggregator()
+    aggregator.extend(fetched_details, persist=False)
+    merged_items = list(existing_items)
+    index_by_id = {(latest_item_year(item), str(item.get('course_id'))): i for i, item in enumerate(merged_items)}
+    index_by_key = {output_item_key(item): i for i, item in enumerate(merged_items)}
+    for new_item in aggregator.final_list():
+        item_index = index_by_id.get((latest_item_year(new_item), str(new_item['course_id'])))
+        if item_index is None:
+            item_index = index_by_key.get(output_item_key(new_item))
+        if item_index is None:
+            merged_items.append(new_item)
+            continue
+        old_item = merged_items[item_index]
+        years = sorted(set(old_item.get('available_years', [])) | set(new_item['available_years']), key=int, reverse=True)
+        if (latest_item_year(new_item) or 0) >= (latest_item_year(old_item) or 0):
+            updated_item = dict(new_item) # 最新年度のデータを取得し直した場合は内容を置き換える
+        else:
+            updated_item = dict(old_item) # 古い年度のみ取得し直した場合は最新年度の内容を残す
+        updated_item['year'] = "&".join(years)
+        updated_item['available_years'] = years
+        merged_items[item_index] = updated_item
+    return merged_items
+
+def load_course_id_pairs(specs):
+    """
+    --ids の指定から (年度, 登録番号) のリストを作る。指定は '年度:ID' / '年度_ID'、それらを1行ずつ書いたファイル、
+    または syllabus_data.json (各科目の最新年度と course_id を使う)。
+    """
+    pairs = []
+    for spec in specs:
+        if os.path.isfile(spec) and spec.endswith('.json'):
+            with open(spec, encoding='utf-8') as f:
+                for item in json.load(f):
+                    latest_year = latest_item_year(item)
+                    if item.get('course_id') and latest_year is not None:
+                        pairs.append((latest_year, str(item['course_id'])))
+            continue
+        if os.path.isfile(spec):
+            with open(spec, encoding='utf-8') as f:
+                lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+        else:
+            lines = [spec]
+        for line in lines:
+            pair_match = _COURSE_ID_PAIR_PATTERN.match(line)
+            if not pair_match:
+                print(f"[警告] 解釈できないID指定をスキップします: {line.strip()}")
+                continue
+            pairs.append((int(pair_match.group(1)), pair_match.group(2)))
+    return list(dict.fromkeys(pairs))
+
+def _fetch_pending_details(fetcher, pending_urls_by_year, fetched_details):
+    """fetcher で年度ごとの未取得URLを並行取得し、取得できたものを pending から除く。ログインを要求されたかを返す"""
+    session_expired = False
+    for year in list(pending_urls_by_year):
+        details_by_url, year_session_expired = fetcher.fetch_all(pending_urls_by_year[year], year)
+        session_expired = session_expired or year_session_expired
+        fetched_details.extend(details for details in details_by_url.values() if details)
+        pending_urls_by_year[year] = [url for url, details in details_by_url.items() if not details]
+        if not pending_urls_by_year[year]:
+            del pending_urls_by_year[year]
+    return session_expired
+
+def run_direct_fetch(pairs, output_dir, screenshots_dir, crawl_state=None):
+    """
+    (年度, 登録番号) の組から詳細ページのURLを直接組み立てて取得し、生データ (JSONL) と syllabus_data.json を更新する。
+    crawl_state を指定すると、URLは収集済みの詳細URL (またはその形式) から組み立てる。
+    旧システムはログインなしのHTTP、新システムは保存済みのログインCookieでブラウザなしに取得し、
+    それでも取得できなかったURLがある場合だけブラウザを起動してログインする。
+    """
+    global driver
+    driver = None
+    pending_urls_by_year, unresolved_pairs = resolve_direct_detail_urls(pairs, crawl_state.known_urls() if crawl_state is not None else [])
+    print(f"ID指定の直接取得: {len(pairs)} 件 (年度: {sorted(pending_urls_by_year)})")
+    if unresolved_pairs:
+        print(f"[警告] 新システムの詳細URLを収集済みのURLから組み立てられないため、次の {len(unresolved_pairs)} 件は取得しません "
+              "(通常のクロールで詳細URLを収集してから再実行してください):")
+        for year, course_id in unresolved_pairs:
+            print(f"   ⚠️ {year}:{course_id}")
+    fetched_details = []
+    legacy_fetcher = None
+    async_fetcher = None
+    try:
+        # 1) 旧システム: ログインなしのHTTP
+        if LEGACY_STATIC_HTTP and http_fetch_available():
+            legacy_fetcher = LegacySyllabusFetcher()
+            for year in list(pending_urls_by_year):
+                legacy_details = fetch_legacy_details(legacy_fetcher, pending_urls_by_year[year], year)
+                fetched_details.extend(legacy_details.values())
+                pending_urls_by_year[year] = [url for url in pending_urls_by_year[year] if url not in legacy_details]
+                if not pending_urls_by_year[year]:
+                    del pending_urls_by_year[year]
+        # 2) 保存済みのログインCookieがあれば、ブラウザを起動せずにHTTPで取得
+        saved_cookies = COOKIE_JAR.load() if pending_urls_by_year and COOKIE_JAR is not None else None
+        if saved_cookies and http_fetch_available():
+            print("保存済みのログインCookieで取得します (ブラウザ・ログインなし)...")
+            async_fetcher = AsyncDetailFetcher(saved_cookies)
+            if _fetch_pending_details(async_fetcher, pending_urls_by_year, fetched_details):
+                print("[情報] 保存済みのCookieは無効でした。ブラウザでログインして再取得します。")
+        # 3) 残りはブラウザでログインして取得
+        if pending_urls_by_year:
+            driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
+            if not driver or not establish_session(driver, screenshots_dir):
+                print("[エラー] ログインできなかったため、残りのIDは取得できませんでした。")
+            else:
+                auth_cookies = extract_auth_cookies(driver)
+                if auth_cookies and http_fetch_available():
+                    if async_fetcher is None:
+                        async_fetcher = AsyncDetailFetcher(auth_cookies, driver.execute_script("return navigator.userAgent;"))
+                    else:
+                        async_fetcher.update_cookies(auth_cookies)
+                    _fetch_pending_details(async_fetcher, pending_urls_by_year, fetched_details)
+                for year, urls in list(pending_urls_by_year.items()):
+                    remaining_urls = []
+                    for syllabus_url in urls:
+                        try:
+                            syllabus_details = fetch_syllabus_details_browser(driver, syllabus_url, year, screenshots_dir)
+                        except Exception as e:
+                            print(f"           [エラー] 詳細ページ処理中にエラー ({syllabus_url}): {e}")
+                            syllabus_details = None
+                        if syllabus_details:
+                            fetched_details.append(syllabus_details)
+                        else:
+                            remaining_urls.append(syllabus_url)
+                    if remaining_urls:
+                        pending_urls_by_year[year] = remaining_urls
+                    else:
+                        del pending_urls_by_year[year]
+    finally:
+        if legacy_fetcher is not None:
+            legacy_fetcher.close()
+        if async_fetcher is not None:
+            async_fetcher.close()
+        if driver is not None:
+            try: driver.quit()
+            except Exception as e: print(f"[警告] ブラウザ終了時エラー: {e}")
+
+    failed_urls = [url for urls in pending_urls_by_year.values() for url in urls]
+    print(f"\nID指定の直接取得完了: 成功 {len(fetched_details)} 件 / 失敗 {len(failed_urls)} 件 / URL不明 {len(unresolved_pairs)} 件")
+    for url in failed_urls:
+        print(f"   ❌ {url}")
+    for year, course_id in unresolved_pairs:
+        print(f"   ⚠️ URL不明: {year}:{course_id}")
+    if not fetched_details:
+        return fetched_details
+
+    raw_records_path = os.path.join(output_dir, RAW_RECORDS_FILE)
+    output_json_path = os.path.join(output_dir, OUTPUT_JSON_FILE)
+    existing_items = []
+    if os.path.exists(output_json_path):
+        with open(output_json_path, encoding='utf-8') as f:
+            existing_items = json.load(f)
+    raw_keys = {(record.get('year_scraped'), str(record.get('course_id'))) for record in read_raw_records(raw_records_path)}
+    if any((latest_item_year(item), str(item.get('course_id'))) not in raw_keys for item in existing_items):
+        # JSONLに無い科目が syllabus_data.json にある: JSONLから集約し直すと科目が消えるため、既存の出力に反映する
+        print(f"[情報] 生データ ({RAW_RECORDS_FILE}) に {OUTPUT_JSON_FILE} の全科目が含まれていないため、既存の {OUTPUT_JSON_FILE} に反映します。")
+        write_json_data(merge_into_output_items(existing_items, fetched_details), output_json_path)
+        return fetched_details
+
+    # 取得し直した (年度, ID) の古い生データを置き換えて、JSONLと syllabus_data.json を書き直す
+    refreshed_keys = {(details['year_scraped'], str(details['course_id'])) for details in fetched_details}
+    temp_path = raw_records_path + '.tmp'
+    sink = RawRecordSink(temp_path, truncate=True)
+    try:
+        for record in read_raw_records(raw_records_path):
+            if (record.get('year_scraped'), str(record.get('course_id'))) not in refreshed_keys:
+                sink.write(record)
+        for details in fetched_details:
+            sink.write(details)
+    finally:
+        sink.close()
+    os.replace(temp_path, raw_records_path)
+    compact_raw_records(raw_records_path, output_json_path)
+    return fetched_details
+
 # --- ★★★ メイン処理 (逐次処理に戻す) ★★★ ---
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="慶應義塾シラバス スクレイパー")
+    resume_group = arg_parser.add_mutually_exclusive_group()
+    resume_group.add_argument('--resume', action='store_true', help="保存済みのクロール状態から確認なしで再開する")
+    resume_group.add_argument('--fresh', action='store_true', help="保存済みのクロール状態を破棄して最初から開始する")
+    arg_parser.add_argument('--replay', action='store_true', help="ブラウザ・ネットワークを使わず、HTMLアーカイブから syllabus_data.json を再構築する")
+    arg_parser.add_argument('--workers', type=int, default=None, help="--replay の解析プロセス数 (既定: CPUコア数)")
+    arg_parser.add_argument('--full-refresh', action='store_true', help="差分スクレイピングと英語情報の再利用を無効にし、全科目を取得し直す")
+    arg_parser.add_argument('--compact', action='store_true', help="生データ (JSONL) を集約して syllabus_data.json を書き出すだけで終了する")
+    arg_parser.add_argument('--ids', nargs='+', metavar='SPEC', default=None,
+                            help="検索を使わず指定した科目だけを取得する ('年度:ID'、それを1行ずつ書いたファイル、または syllabus_data.json)")
+    cli_args = arg_parser.parse_args()
+
+    # 再解析・圧縮はログインしないため、認証情報が無くても実行できる
+    if not (cli_args.replay or cli_args.compact) and (not USER_EMAIL or not USER_PASSWORD):
+        print("Error: Couldn't load credentials from config.json")
+        sys.exit(1)
+
     output_dir, logs_dir, screenshots_dir = create_output_dirs(OUTPUT_DIR_NAME)
-    resume_checkpoint = load_checkpoint()
+    if cli_args.replay:
+        replay_archive(os.path.join(output_dir, ARCHIVE_DIR_NAME), os.path.join(output_dir, OUTPUT_JSON_FILE), TARGET_YEARS, cli_args.workers,
+                       os.path.join(output_dir, CRAWL_STATE_DB_FILE))
+        sys.exit(0)
+    if cli_args.compact:
+        compact_raw_records(os.path.join(output_dir, RAW_RECORDS_FILE), os.path.join(output_dir, OUTPUT_JSON_FILE))
+        sys.exit(0)
+    if ARCHIVE_HTML:
+        HTML_ARCHIVE = HtmlArchive(os.path.join(output_dir, ARCHIVE_DIR_NAME))
+    # 以前の形式 (config.json のパスワードから鍵を導出) のCookieファイルは使わないため削除する
+    try: os.remove(os.path.join(output_dir, LEGACY_COOKIE_JAR_FILE))
+    except OSError: pass
+    if PERSIST_SESSION_COOKIES:
+        COOKIE_JAR = CookieJar(os.path.join(output_dir, COOKIE_JAR_FILE), USER_EMAIL, load_cookie_jar_key())
+        if not COOKIE_JAR.encrypted:
+            print(f"[情報] Cookieの暗号鍵 (環境変数 {COOKIE_JAR_KEY_ENV} / OSのキーリング) が無いため、"
+                  f"ログインCookieは暗号化せずに所有者のみ読み書きできるファイル (0600) に保存します。")
+    crawl_state = CrawlStateStore(os.path.join(output_dir, CRAWL_STATE_DB_FILE))
+    FINGERPRINT_STORE = crawl_state
+    TRANSLATION_CACHE = crawl_state
+    if cli_args.full_refresh:
+        INCREMENTAL_MODE = False
+        TRANSLATION_REUSE = False
+    if cli_args.ids:
+        # クロール状態 (URL状態・カーソル) には触れず、指定された科目だけを取得して終了する
+        course_id_pairs = load_course_id_pairs(cli_args.ids)
+        if not course_id_pairs:
+            sys.exit("致命的エラー: 取得する (年度, ID) がありません。")
+        try:
+            run_direct_fetch(course_id_pairs, output_dir, screenshots_dir, crawl_state)
+        finally:
+            crawl_state.close()
+            if HTML_ARCHIVE is not None:
+                HTML_ARCHIVE.close()
+        sys.exit(0)
+    if not cli_args.fresh:
+        crawl_state.import_checkpoint_pickle(os.path.join(output_dir, LEGACY_CHECKPOINT_FILE))
     starting_year_index = 0
     starting_field_index = 0
     starting_page_num = 0
-    processed_urls = set()
-    if resume_checkpoint:
-        # ユーザー確認
-        resume_choice = input(f"\nチェックポイントが見つかりました (年度: {resume_checkpoint['year']}, 分野: {resume_checkpoint['field_name']}, ページ: {resume_checkpoint['page_num']})。"
-                            f"\n再開しますか？ (y/n): ").strip().lower()
-        
-        if resume_choice in ('y', 'yes', ''):
-            # TARGET_YEARSとTARGET_FIELDSからインデックスを検索
-            if resume_checkpoint['year'] in TARGET_YEARS:
-                starting_year_index = TARGET_YEARS.index(resume_checkpoint['year'])
-            else:
-                print(f"[警告] チェックポイントの年度 {resume_checkpoint['year']} は現在の対象年度にありません。最初から開始します。")
-                
-            if resume_checkpoint['field_name'] in TARGET_FIELDS:
-                starting_field_index = TARGET_FIELDS.index(resume_checkpoint['field_name'])
-            else:
-                print(f"[警告] チェックポイントの分野 {resume_checkpoint['field_name']} は現在の対象分野にありません。この年度の最初から開始します。")
-                starting_field_index = 0
-                
-            starting_page_num = resume_checkpoint['page_num']
-            processed_urls = set(resume_checkpoint['processed_urls'])
-            print(f"\n[情報] チェックポイントから再開: 年度={resume_checkpoint['year']} (インデックス: {starting_year_index}), "
-                f"分野={resume_checkpoint['field_name']} (インデックス: {starting_field_index}), ページ={starting_page_num}, 処理済URL数={len(processed_urls)}")
+    resuming = False
+    if crawl_state.is_completed():
+        crawl_state.reset()
+        print("\n[情報] 前回のクロールは完了済みのため、新しいクロールを開始します。")
+    elif not crawl_state.is_empty():
+        resume_cursor = crawl_state.load_cursor()
+        state_counts = crawl_state.counts()
+        cursor_text = (f"年度: {resume_cursor['year']}, 分野: {resume_cursor['field_name']}, ページ: {resume_cursor['page_num']}"
+                       if resume_cursor else "カーソルなし")
+        print(f"\n保存済みのクロール状態が見つかりました ({cursor_text}, 取得済: {state_counts[URL_DONE]}, "
+              f"未取得: {state_counts[URL_PENDING] + state_counts[URL_IN_FLIGHT]}, 失敗: {state_counts[URL_FAILED]})")
+        if cli_args.resume or cli_args.fresh:
+            resuming = cli_args.resume
+        elif sys.stdin.isatty():
+            # ユーザー確認 (--resume/--fresh 指定時は確認しない)
+            resuming = input("再開しますか？ (y/n): ").strip().lower() in ('y', 'yes', '')
+        else:
+            resuming = True # 非対話実行ではそのまま再開
+
+        if resuming:
+            if resume_cursor and PIPELINE_MODE != 'two_phase':
+                # TARGET_YEARSとTARGET_FIELDSからインデックスを検索
+                if resume_cursor['year'] in TARGET_YEARS:
+                    starting_year_index = TARGET_YEARS.index(resume_cursor['year'])
+                else:
+                    print(f"[警告] カーソルの年度 {resume_cursor['year']} は現在の対象年度にありません。最初から開始します。")
+                if resume_cursor['field_name'] in TARGET_FIELDS:
+                    starting_field_index = TARGET_FIELDS.index(resume_cursor['field_name'])
+                else:
+                    print(f"[警告] カーソルの分野 {resume_cursor['field_name']} は現在の対象分野にありません。この年度の最初から開始します。")
+                    starting_field_index = 0
+                starting_page_num = resume_cursor['page_num'] or 0
+            print(f"\n[情報] クロール状態から再開: 年度インデックス={starting_year_index}, 分野インデックス={starting_field_index}, ページ={starting_page_num}")
         else:
-            print("\n[情報] 最初から開始します。")
+            crawl_state.reset()
+            print("\n[情報] クロール状態をリセットして最初から開始します。")
 
     start_time_dt = datetime.datetime.now()
     start_time_dt = datetime.datetime.now()
     output_json_path = os.path.join(output_dir, OUTPUT_JSON_FILE)
     driver = None
-    scraped_data_all_years = []
+    http_client = None
+    async_fetcher = None
+    browser_pool = None
+    tab_prefetcher = None
+    legacy_fetcher = None
+    # 生データは取得するたびにJSONLへ追記し (再開時は追記、新規開始時は空にする)、集約インデックスも更新する
+    raw_record_sink = RawRecordSink(os.path.join(output_dir, RAW_RECORDS_FILE), truncate=not resuming)
+    scraped_data_all_years = IncrementalAggregator(raw_record_sink)
     global_start_time = time.time()
+    # ★★★ 2段階パイプライン: クロール状態ストアを詳細URLフロンティアとして使用 ★★★
+    frontier = crawl_state if PIPELINE_MODE == 'two_phase' else None
+    if resuming:
+        requeued_count = crawl_state.requeue_unfinished()
+        scraped_data_all_years.extend(crawl_state.done_details(), persist=False)
+        print(f"[情報] 取得済データ={len(scraped_data_all_years)}件を読み込み、再取得対象に戻したURL={requeued_count}件")
     print(f"スクレイピング開始: {start_time_dt.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"対象年度: {TARGET_YEARS}")
     print(f"対象分野: {TARGET_FIELDS}")
     print(f"出力先JSON: {output_json_path}")
     print(f"並列処理: 無効 (逐次処理)") # 並列処理は無効
+    print(f"処理パイプライン: {PIPELINE_MODE}")
+    print(f"詳細ページ取得モード: {DETAIL_FETCH_MODE}")
 
     driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
     if not driver:
         sys.exit("致命的エラー: WebDriverを初期化できませんでした。")
     try:
-        if not login(driver, USER_EMAIL, USER_PASSWORD, screenshots_dir):
+        if not establish_session(driver, screenshots_dir):
             sys.exit("致命的エラー: 初期ログインに失敗しました。")
         print("\n認証情報を抽出中...")
         auth_cookies = extract_auth_cookies(driver)
@@ -1826,6 +4857,44 @@ if __name__ == "__main__":
             print(f"認証Cookie取得成功: {len(auth_cookies)}個のCookieを共有します")
         else:
             print("[警告] 認証Cookie取得失敗。各スレッドが個別にログインします。")
+        # ★★★ HTTP詳細取得クライアント (ログインCookieを共有) ★★★
+        if DETAIL_FETCH_MODE in ('http', 'async'):
+            if not http_fetch_available():
+                print("[警告] httpx/lxml が利用できないため、詳細ページはブラウザで取得します。")
+            elif not auth_cookies:
+                print("[警告] 認証Cookieがないため、詳細ページはブラウザで取得します。")
+            elif DETAIL_FETCH_MODE == 'async':
+                async_fetcher = AsyncDetailFetcher(auth_cookies, driver.execute_script("return navigator.userAgent;"))
+                print(f"非同期HTTP詳細取得を初期化しました (ホスト別同時接続数: {HTTP_HOST_CONCURRENCY}, HTTP/2: {'有効' if HTTP2_AVAILABLE else '無効'})。")
+            else:
+                http_client = create_http_client(auth_cookies, driver.execute_script("return navigator.userAgent;"))
+                print("HTTP詳細取得クライアントを初期化しました。")
+        # ★★★ ホットスタンバイのドライバー (初回ログインで保存したCookieで裏で認証) ★★★
+        if HOT_STANDBY_DRIVER:
+            STANDBY_DRIVER = StandbyDriver(screenshots_dir)
+            print(f"スタンバイドライバーを裏で準備しています (更新間隔: {STANDBY_REFRESH_INTERVAL}秒)。")
+        # ★★★ ページ内一括取得 (メインのブラウザの認証をそのまま使う) ★★★
+        if DETAIL_FETCH_MODE == 'inpage':
+            # 2段階パイプラインでは移動して構わないが、交互処理では検索結果ページに留まる
+            async_fetcher = InPageDetailFetcher(allow_navigation=PIPELINE_MODE == 'two_phase')
+            print(f"ページ内一括取得を初期化しました ({INPAGE_FETCH_BATCH_SIZE} 件/スクリプト)。")
+        # ★★★ ブラウザワーカープール (ログインCookieを共有) ★★★
+        if DETAIL_FETCH_MODE == 'pool':
+            if auth_cookies:
+                browser_pool = BrowserWorkerPool(BROWSER_POOL_SIZE, auth_cookies, screenshots_dir)
+            else:
+                print("[警告] 認証Cookieがないため、ワーカープールを使わずに逐次処理します。")
+        # ★★★ 旧システム (2024年度以前) の詳細ページはログインなしのHTTPで取得 ★★★
+        if LEGACY_STATIC_HTTP and any(year <= 2024 for year in TARGET_YEARS):
+            if http_fetch_available():
+                legacy_fetcher = LegacySyllabusFetcher(driver.execute_script("return navigator.userAgent;"))
+                print(f"旧システム ({LEGACY_SYLLABUS_HOST}) の詳細ページはログインなしのHTTPで取得します。")
+            else:
+                print("[警告] httpx/lxml が利用できないため、旧システムの詳細ページもブラウザ/ログイン済みの手段で取得します。")
+        # ★★★ 詳細タブの先読み (メインのブラウザだけで取得する場合のみ) ★★★
+        if http_client is None and async_fetcher is None and browser_pool is None and PREFETCH_DEPTH > 0:
+            tab_prefetcher = DetailTabPrefetcher(PREFETCH_DEPTH)
+            print(f"詳細タブの先読みを有効にしました (先読み件数: {PREFETCH_DEPTH})。")
     except Exception as initial_login_e:
         print(f"致命的エラー: 初期ログイン中に予期せぬ例外が発生: {initial_login_e}")
         traceback.print_exc()
@@ -1839,6 +4908,8 @@ if __name__ == "__main__":
 # --- メインループ ---
     try:
         year_index = starting_year_index
+        search_jump_failed = set() # 検索結果ページへの直接移動に失敗した (年度, 分野)
+        restored_searches = {} # ドライバー差し替え後に検索結果ページを復元済みの (年度, 分野) → (検索状態, ページ番号)
         while year_index < len(TARGET_YEARS):
             year = TARGET_YEARS[year_index]
             print(f"\n<<<<< {year}年度 の処理開始 >>>>>")
@@ -1853,274 +4924,329 @@ if __name__ == "__main__":
             
             while field_index < len(TARGET_FIELDS):
                 field_name = TARGET_FIELDS[field_index]
+                if frontier is not None and frontier.is_enumerated(year, field_name):
+                    print(f"\n===== 分野: {field_name} ({year}年度) はURL列挙済みのためスキップします =====")
+                    field_index += 1; continue
                 print(f"\n===== 分野: {field_name} ({year}年度) の処理開始 =====")
                 field_processed_successfully = True
+                field_enumerated = False # 2段階パイプライン: 全ページのURL列挙が完了したか
+                field_search_state = None # 障害時に同じ検索結果ページへ戻るための検索状態 (capture_search_state)
                 field_total_attempts = 0
                 field_error_count = 0
                 consecutive_errors = 0
                 ttck_error_count = 0  # TTCK科目専用のエラーカウンター
                 
-                # この分野の処理済みURL（チェックポイントからロード、または新規作成）
+                # この分野の処理済みURL（クロール状態からロード、または新規作成）
+                opened_links_this_year_field = crawl_state.done_urls(year, field_name) if resuming else set()
                 if year_index == starting_year_index and field_index == starting_field_index:
-                    opened_links_this_year_field = processed_urls
-                    # この分野の開始ページ番号（チェックポイントからロード、または最初から）
+                    # この分野の開始ページ番号（カーソルからロード、または最初から）
                     last_processed_page_num = starting_page_num
+                    # カーソルを使用したのでリセット（次の分野と年度では最初から開始するため）
+                    starting_page_num = 0
                 else:
-                    opened_links_this_year_field = set()
                     last_processed_page_num = 0
-                    
-                # チェックポイントを使用したのでリセット（次の分野と年度では最初から開始するため）
-                if year_index == starting_year_index and field_index == starting_field_index:
-                    starting_page_num = 0
 
                 try:
                     if check_session_timeout(driver, screenshots_dir):
                         print("セッションタイムアウト検出。再ログイン試行...")
-                        if not login(driver, USER_EMAIL, USER_PASSWORD, screenshots_dir):
+                        if not establish_session(driver, screenshots_dir, try_saved=False):
                             print("[エラー] 再ログイン失敗。この分野をスキップします。")
                             field_index += 1; continue
 
-                    try:
-                        current_url_check = driver.current_url
-                        if "gslbs.keio.jp/syllabus/search" not in current_url_check:
-                            print("検索ページ以外にいるため、検索ページに移動します。")
-                            driver.get('https://gslbs.keio.jp/syllabus/search')
-                            WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.url_contains("gslbs.keio.jp/syllabus/search"))
-                            time.sleep(MEDIUM_WAIT)
-                    except WebDriverException as e_url_check:
-                        screenshot_path = save_screenshot(driver, f"url_check_error_{year}_{field_name}", screenshots_dir)
-                        print(f"[警告] 現在のURL確認中にエラー: {e_url_check}。")
+                    # --- フェイルオーバーで検索結果ページを復元済みなら、検索条件の設定・検索をやり直さない ---
+                    restored_search = restored_searches.pop((year, field_name), None)
+                    if restored_search is None:
+                        try:
+                            current_url_check = driver.current_url
+                            if "gslbs.keio.jp/syllabus/search" not in current_url_check:
+                                print("検索ページ以外にいるため、検索ページに移動します。")
+                                driver.get('https://gslbs.keio.jp/syllabus/search')
+                                WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.url_contains("gslbs.keio.jp/syllabus/search"))
+                                wait_for_page_ready(driver, 'search_form')
+                        except WebDriverException as e_url_check:
+                            screenshot_path = save_screenshot(driver, f"url_check_error_{year}_{field_name}", screenshots_dir)
+                            print(f"[警告] 現在のURL確認中にエラー: {e_url_check}。")
                         
-                        if not pause_on_error("WebDriver exception during URL check", e_url_check, screenshot_path):
-                            print("ユーザーによる中断。スクリプトを終了します。")
-                            sys.exit(1)
+                            if not pause_on_error("WebDriver exception during URL check", e_url_check, screenshot_path):
+                                print("ユーザーによる中断。スクリプトを終了します。")
+                                sys.exit(1)
                         
-                        raise InvalidSessionIdException("URL check failed, likely closed window.") from e_url_check
-
-                    # --- 検索条件設定 (JS高速化 + Seleniumフォールバック) ---
-                    js_search_success = False
-                    try: # JavaScriptでの設定試行
-                        fast_search_js = """
-                            async function setSearchCriteria(year, fieldName) {
-                                try {
-                                    var yearSelect = document.querySelector('select[name="KEYWORD_TTBLYR"]');
-                                    if (yearSelect) { yearSelect.value = year; yearSelect.dispatchEvent(new Event('change', {bubbles:true})); }
-                                    else { console.error('Year select not found'); return false; }
-
-                                    var toggleButton = document.querySelector('button[data-target*="screensearch-cond-option-toggle-target"]');
-                                    if (toggleButton) {
-                                        var toggleTarget = document.querySelector(toggleButton.getAttribute('data-target'));
-                                        if (toggleTarget && !toggleTarget.classList.contains('show')) {
-                                            toggleButton.click(); await new Promise(r => setTimeout(r, 700));
+                            raise InvalidSessionIdException("URL check failed, likely closed window.") from e_url_check
+
+                        # --- 検索条件設定 (JS高速化 + Seleniumフォールバック) ---
+                        js_search_success = False
+                        try: # JavaScriptでの設定試行
+                            fast_search_js = """
+                                async function setSearchCriteria(year, fieldName) {
+                                    try {
+                                        var yearSelect = document.querySelector('select[name="KEYWORD_TTBLYR"]');
+                                        if (yearSelect) { yearSelect.value = year; yearSelect.dispatchEvent(new Event('change', {bubbles:true})); }
+                                        else { console.error('Year select not found'); return false; }
+
+                                        var toggleButton = document.querySelector('button[data-target*="screensearch-cond-option-toggle-target"]');
+                                        if (toggleButton) {
+                                            var toggleTarget = document.querySelector(toggleButton.getAttribute('data-target'));
+                                            if (toggleTarget && !toggleTarget.classList.contains('show')) {
+                                                toggleButton.click(); await new Promise(r => setTimeout(r, 700));
+                                            }
                                         }
-                                    }
 
-                                    var fieldSelect = document.querySelector('select[name="KEYWORD_FLD1CD"]');
-                                    if (fieldSelect) {
-                                        let fieldFound = false;
-                                        for (let i = 0; i < fieldSelect.options.length; i++) {
-                                            if (fieldSelect.options[i].text.trim() === fieldName) {
-                                                fieldSelect.selectedIndex = i; fieldSelect.dispatchEvent(new Event('change', {bubbles:true}));
-                                                fieldFound = true; break;
+                                        var fieldSelect = document.querySelector('select[name="KEYWORD_FLD1CD"]');
+                                        if (fieldSelect) {
+                                            let fieldFound = false;
+                                            for (let i = 0; i < fieldSelect.options.length; i++) {
+                                                if (fieldSelect.options[i].text.trim() === fieldName) {
+                                                    fieldSelect.selectedIndex = i; fieldSelect.dispatchEvent(new Event('change', {bubbles:true}));
+                                                    fieldFound = true; break;
+                                                }
                                             }
-                                        }
-                                        if (!fieldFound) console.warn('Field option not found: ' + fieldName);
-                                    } else { console.error('Field select not found'); return false; }
+                                            if (!fieldFound) console.warn('Field option not found: ' + fieldName);
+                                        } else { console.error('Field select not found'); return false; }
 
-                                    var checkbox = document.querySelector('input[name="KEYWORD_LVL"][value="3"]');
-                                    if (checkbox && checkbox.checked) { checkbox.checked = false; checkbox.dispatchEvent(new Event('change', {bubbles:true})); }
+                                        var checkbox = document.querySelector('input[name="KEYWORD_LVL"][value="3"]');
+                                        if (checkbox && checkbox.checked) { checkbox.checked = false; checkbox.dispatchEvent(new Event('change', {bubbles:true})); }
 
-                                    return true;
-                                } catch (error) { console.error('Error in setSearchCriteria:', error); return false; }
-                            }
-                            return await setSearchCriteria(arguments[0], arguments[1]);
-                        """
-                        result = driver.execute_script(fast_search_js, str(year), field_name)
-                        if result:
-                            print(f"   JavaScriptで検索条件を一括設定しました（年度: {year}, 分野: {field_name}）")
-                            time.sleep(MEDIUM_WAIT); js_search_success = True
-                        else: print(f"   JavaScript検索設定で問題発生。通常方法で試行します。")
-                    except Exception as js_err: print(f"   JavaScript検索設定失敗: {js_err}。通常方法で試行します。")
-
-                    if not js_search_success: # Seleniumでの設定 (フォールバック)
-                        # 年度選択
-                        year_select_xpath = "//select[@name='KEYWORD_TTBLYR']"
-                        year_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, year_select_xpath)))
-                        if not select_option_by_text(driver, year_select_element, str(year)):
-                            print(f"     [警告] 年度 '{year}' の選択に失敗。この分野をスキップします。")
-                            save_screenshot(driver, f"year_selection_failed_{year}_{field_name}", screenshots_dir); field_index += 1; continue
-                        print(f"   年度 '{year}' を選択しました。"); time.sleep(SHORT_WAIT)
-                        # 詳細オプション展開
-                        try:
-                            adv_button_xpath = "//button[contains(@data-target, 'screensearch-cond-option-toggle-target')]"
-                            advanced_options_button = WebDriverWait(driver, SHORT_WAIT).until(EC.element_to_be_clickable((By.XPATH, adv_button_xpath)))
-                            target_selector = advanced_options_button.get_attribute('data-target')
-                            target_element = driver.find_element(By.CSS_SELECTOR, target_selector)
-                            if advanced_options_button and not target_element.is_displayed():
-                                print("   展開ボタンをクリックして詳細オプションを表示します。")
-                                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", advanced_options_button); time.sleep(0.5)
-                                driver.execute_script("arguments[0].click();", advanced_options_button); time.sleep(1.5)
-                            # else: print("   詳細オプションは既に展開済み、またはボタンが見つかりません。") # ログ省略可
-                        except Exception as e: print(f"   詳細オプション展開ボタンの操作中にエラー: {e}")
-                        # 分野選択
-                        field_select_xpath = "//select[@name='KEYWORD_FLD1CD']"
-                        max_retries = 3; field_selected = False
-                        for retry in range(max_retries):
+                                        return true;
+                                    } catch (error) { console.error('Error in setSearchCriteria:', error); return false; }
+                                }
+                                return await setSearchCriteria(arguments[0], arguments[1]);
+                            """
+                            result = driver.execute_script(fast_search_js, str(year), field_name)
+                            if result:
+                                print(f"   JavaScriptで検索条件を一括設定しました（年度: {year}, 分野: {field_name}）")
+                                wait_for_page_ready(driver, 'search_form'); js_search_success = True
+                            else: print(f"   JavaScript検索設定で問題発生。通常方法で試行します。")
+                        except Exception as js_err: print(f"   JavaScript検索設定失敗: {js_err}。通常方法で試行します。")
+
+                        if not js_search_success: # Seleniumでの設定 (フォールバック)
+                            # 年度選択
+                            year_select_xpath = "//select[@name='KEYWORD_TTBLYR']"
+                            year_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, year_select_xpath)))
+                            if not select_option_by_text(driver, year_select_element, str(year)):
+                                print(f"     [警告] 年度 '{year}' の選択に失敗。この分野をスキップします。")
+                                save_screenshot(driver, f"year_selection_failed_{year}_{field_name}", screenshots_dir); field_index += 1; continue
+                            print(f"   年度 '{year}' を選択しました。"); wait_for_page_ready(driver, 'search_form')
+                            # 詳細オプション展開
                             try:
-                                field_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.element_to_be_clickable((By.XPATH, field_select_xpath)))
-                                driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", field_select_element); time.sleep(1.0)
-                                if select_option_by_text(driver, field_select_element, field_name):
-                                    print(f"   分野 '{field_name}' を選択しました。"); time.sleep(MEDIUM_WAIT); field_selected = True; break
-                                else: print(f"   分野 '{field_name}' の選択に失敗（試行 {retry+1}/{max_retries}）")
-                            except Exception as e:
-                                print(f"   リトライ {retry+1}/{max_retries}: 分野 '{field_name}' 選択中にエラー: {e}")
-                                if retry < max_retries - 1:
-                                     print("      ページをリフレッシュして再試行します...")
-                                     driver.refresh()
-                                     WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.presence_of_element_located((By.TAG_NAME, "body"))); time.sleep(MEDIUM_WAIT)
-                                     year_select_element_retry = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, year_select_xpath)))
-                                     select_option_by_text(driver, year_select_element_retry, str(year)); time.sleep(SHORT_WAIT)
-                                else: print("      リフレッシュ後の再試行も失敗しました。")
-                                time.sleep(MEDIUM_WAIT)
-                        if not field_selected:
-                             print(f"     [警告] 分野 '{field_name}' の選択が {max_retries} 回失敗しました。スキップします。")
-                             save_screenshot(driver, f"field_selection_failed_{field_name}_{year}", screenshots_dir); field_index += 1; continue
-                        # 学年チェックボックス解除
-                        try:
-                            cb_xpath = "//input[@name='KEYWORD_LVL' and @value='3']"
-                            cb = WebDriverWait(driver, SHORT_WAIT).until(EC.presence_of_element_located((By.XPATH, cb_xpath)))
-                            if cb.is_selected():
-                                print("   学年「3年」のチェックを外します。")
-                                driver.execute_script("arguments[0].click();", cb); time.sleep(0.5)
-                        except TimeoutException: pass
-                        except Exception as e_cb: print(f"           学年チェックボックス処理エラー: {e_cb}")
-
-                    # --- 検索実行 ---
-                    search_xpath = "//button[@data-action_id='SYLLABUS_SEARCH_KEYWORD_EXECUTE'] | //button[contains(text(), '検索')]"
-                    search_button = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.element_to_be_clickable((By.XPATH, search_xpath)))
-                    print("   検索ボタンをクリックします...")
-                    if not click_element(driver, search_button):
-                        print("     [エラー] 検索ボタンクリック失敗。この分野をスキップします。")
-                        save_screenshot(driver, f"search_button_click_failed_{year}_{field_name}", screenshots_dir); field_index += 1; continue
-
-                    # --- 結果表示待機 ---
-                    # 拡張された結果インジケーターXPath
-                    result_indicator_xpath = (
-                        "//a[contains(@class, 'syllabus-detail')] | "
-                        "//a[contains(@class, 'btn-info')] | "
-                        "//div[contains(text(), '該当するデータはありません')] | "
-                        "//ul[contains(@class, 'pagination')] | "
-                        "//table[contains(@class, 'search-result')] | "
-                        "//div[contains(text(), '件') and contains(text(), '中')] | "
-                        "//div[@class='search-result-list']"
-                    )
-                    print("   検索結果表示待機中...")
-                    # 検索結果の待機処理を改善（最大3回リトライ）
-                    max_search_retries = 3
-                    for search_retry in range(max_search_retries):
-                        try:
-                            print(f"   検索結果表示待機中... (試行 {search_retry + 1}/{max_search_retries})")
-                            # 一旦短いタイムアウトで試してみる
+                                adv_button_xpath = "//button[contains(@data-target, 'screensearch-cond-option-toggle-target')]"
+                                advanced_options_button = WebDriverWait(driver, SHORT_WAIT).until(EC.element_to_be_clickable((By.XPATH, adv_button_xpath)))
+                                target_selector = advanced_options_button.get_attribute('data-target')
+                                target_element = driver.find_element(By.CSS_SELECTOR, target_selector)
+                                if advanced_options_button and not target_element.is_displayed():
+                                    print("   展開ボタンをクリックして詳細オプションを表示します。")
+                                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", advanced_options_button)
+                                    driver.execute_script("arguments[0].click();", advanced_options_button)
+                                    WebDriverWait(driver, READY_WAIT_CEILING, poll_frequency=READY_POLL_INTERVAL).until(EC.visibility_of(target_element))
+                                # else: print("   詳細オプションは既に展開済み、またはボタンが見つかりません。") # ログ省略可
+                            except Exception as e: print(f"   詳細オプション展開ボタンの操作中にエラー: {e}")
+                            # 分野選択
+                            field_select_xpath = "//select[@name='KEYWORD_FLD1CD']"
+                            max_retries = 3; field_selected = False
+                            for retry in range(max_retries):
+                                try:
+                                    field_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.element_to_be_clickable((By.XPATH, field_select_xpath)))
+                                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", field_select_element)
+                                    if select_option_by_text(driver, field_select_element, field_name):
+                                        print(f"   分野 '{field_name}' を選択しました。"); wait_for_page_ready(driver, 'search_form'); field_selected = True; break
+                                    else: print(f"   分野 '{field_name}' の選択に失敗（試行 {retry+1}/{max_retries}）")
+                                except Exception as e:
+                                    print(f"   リトライ {retry+1}/{max_retries}: 分野 '{field_name}' 選択中にエラー: {e}")
+                                    if retry < max_retries - 1:
+                                         print("      ページをリフレッシュして再試行します...")
+                                         driver.refresh()
+                                         wait_for_page_ready(driver, 'search_form')
+                                         year_select_element_retry = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, year_select_xpath)))
+                                         select_option_by_text(driver, year_select_element_retry, str(year)); wait_for_page_ready(driver, 'search_form')
+                                    else: print("      リフレッシュ後の再試行も失敗しました。")
+                                    time.sleep(MEDIUM_WAIT)
+                            if not field_selected:
+                                 print(f"     [警告] 分野 '{field_name}' の選択が {max_retries} 回失敗しました。スキップします。")
+                                 save_screenshot(driver, f"field_selection_failed_{field_name}_{year}", screenshots_dir); field_index += 1; continue
+                            # 学年チェックボックス解除
                             try:
-                                WebDriverWait(driver, min(30, current_element_timeout/2)).until(
-                                    EC.presence_of_element_located((By.XPATH, result_indicator_xpath))
-                                )
-                                print("   検索結果表示完了。")
-                                break
-                            except TimeoutException:
-                                # ページが完全に読み込まれていない可能性があるため、リロード
-                                if search_retry < max_search_retries - 1:
-                                    print(f"   検索結果表示タイムアウト、ページをリロードして再試行します... ({search_retry + 1}/{max_search_retries})")
-                                    driver.refresh()
-                                    time.sleep(MEDIUM_WAIT * 2)
+                                cb_xpath = "//input[@name='KEYWORD_LVL' and @value='3']"
+                                cb = WebDriverWait(driver, SHORT_WAIT).until(EC.presence_of_element_located((By.XPATH, cb_xpath)))
+                                if cb.is_selected():
+                                    print("   学年「3年」のチェックを外します。")
+                                    driver.execute_script("arguments[0].click();", cb)
+                            except TimeoutException: pass
+                            except Exception as e_cb: print(f"           学年チェックボックス処理エラー: {e_cb}")
+
+                        # --- 検索実行 ---
+                        search_xpath = "//button[@data-action_id='SYLLABUS_SEARCH_KEYWORD_EXECUTE'] | //button[contains(text(), '検索')]"
+                        search_button = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(EC.element_to_be_clickable((By.XPATH, search_xpath)))
+                        print("   検索ボタンをクリックします...")
+                        mark_page_stale(driver, 'search_results')
+                        if not click_element(driver, search_button):
+                            print("     [エラー] 検索ボタンクリック失敗。この分野をスキップします。")
+                            save_screenshot(driver, f"search_button_click_failed_{year}_{field_name}", screenshots_dir); field_index += 1; continue
+
+                        # --- 結果表示待機 ---
+                        # 拡張された結果インジケーターXPath
+                        result_indicator_xpath = RESULT_INDICATOR_XPATH
+                        print("   検索結果表示待機中...")
+                        # 検索結果の待機処理を改善（最大3回リトライ）
+                        max_search_retries = 3
+                        for search_retry in range(max_search_retries):
+                            try:
+                                print(f"   検索結果表示待機中... (試行 {search_retry + 1}/{max_search_retries})")
+                                # 一旦短いタイムアウトで試してみる
+                                try:
+                                    if not wait_for_page_ready(driver, 'search_results', min(30, current_element_timeout/2)):
+                                        raise TimeoutException("検索結果表示待機タイムアウト")
+                                    print("   検索結果表示完了。")
+                                    break
+                                except TimeoutException:
+                                    # ページが完全に読み込まれていない可能性があるため、リロード
+                                    if search_retry < max_search_retries - 1:
+                                        print(f"   検索結果表示タイムアウト、ページをリロードして再試行します... ({search_retry + 1}/{max_search_retries})")
+                                        driver.refresh()
+                                        wait_for_page_ready(driver, 'search_form')
                                     
-                                    # 検索条件を再設定して検索ボタンを再度クリック
-                                    if not js_search_success:
-                                        # 年度選択
-                                        year_select_xpath = "//select[@name='KEYWORD_TTBLYR']"
-                                        year_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
-                                            EC.presence_of_element_located((By.XPATH, year_select_xpath))
-                                        )
-                                        select_option_by_text(driver, year_select_element, str(year))
-                                        time.sleep(MEDIUM_WAIT)
+                                        # 検索条件を再設定して検索ボタンを再度クリック
+                                        if not js_search_success:
+                                            # 年度選択
+                                            year_select_xpath = "//select[@name='KEYWORD_TTBLYR']"
+                                            year_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
+                                                EC.presence_of_element_located((By.XPATH, year_select_xpath))
+                                            )
+                                            select_option_by_text(driver, year_select_element, str(year))
+                                            wait_for_page_ready(driver, 'search_form')
                                         
-                                        # 分野選択
-                                        field_select_xpath = "//select[@name='KEYWORD_FLD1CD']"
-                                        field_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
-                                            EC.presence_of_element_located((By.XPATH, field_select_xpath))
-                                        )
-                                        select_option_by_text(driver, field_select_element, field_name)
-                                        time.sleep(MEDIUM_WAIT)
-                                    
-                                    # 検索ボタンを再クリック
-                                    search_xpath = "//button[@data-action_id='SYLLABUS_SEARCH_KEYWORD_EXECUTE'] | //button[contains(text(), '検索')]"
-                                    search_button = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
-                                        EC.element_to_be_clickable((By.XPATH, search_xpath))
-                                    )
-                                    click_element(driver, search_button)
+                                            # 分野選択
+                                            field_select_xpath = "//select[@name='KEYWORD_FLD1CD']"
+                                            field_select_element = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
+                                                EC.presence_of_element_located((By.XPATH, field_select_xpath))
+                                            )
+                                            select_option_by_text(driver, field_select_element, field_name)
+                                            wait_for_page_ready(driver, 'search_form')
                                     
-                                    # 長めのタイムアウトで最終試行
-                                    if search_retry == max_search_retries - 2:
-                                        WebDriverWait(driver, current_element_timeout).until(
-                                            EC.presence_of_element_located((By.XPATH, result_indicator_xpath))
+                                        # 検索ボタンを再クリック
+                                        search_xpath = "//button[@data-action_id='SYLLABUS_SEARCH_KEYWORD_EXECUTE'] | //button[contains(text(), '検索')]"
+                                        search_button = WebDriverWait(driver, ELEMENT_WAIT_TIMEOUT).until(
+                                            EC.element_to_be_clickable((By.XPATH, search_xpath))
                                         )
-                                        print("   検索結果表示完了。")
-                                        break
-                                else:
-                                    # 最終試行でもタイムアウトした場合
-                                    raise TimeoutException(f"検索結果の表示に {max_search_retries} 回失敗しました")
-                        except TimeoutException as e_timeout:
-                            if search_retry == max_search_retries - 1:
-                                print(f"     [エラー] 検索結果が表示されません。この分野をスキップします。")
-                                save_screenshot(driver, f"search_timeout_{year}_{field_name}", screenshots_dir)
+                                        mark_page_stale(driver, 'search_results')
+                                        click_element(driver, search_button)
+                                    
+                                        # 長めのタイムアウトで最終試行
+                                        if search_retry == max_search_retries - 2:
+                                            if not wait_for_page_ready(driver, 'search_results', current_element_timeout):
+                                                raise TimeoutException("検索結果表示待機タイムアウト")
+                                            print("   検索結果表示完了。")
+                                            break
+                                    else:
+                                        # 最終試行でもタイムアウトした場合
+                                        raise TimeoutException(f"検索結果の表示に {max_search_retries} 回失敗しました")
+                            except TimeoutException as e_timeout:
+                                if search_retry == max_search_retries - 1:
+                                    print(f"     [エラー] 検索結果が表示されません。この分野をスキップします。")
+                                    save_screenshot(driver, f"search_timeout_{year}_{field_name}", screenshots_dir)
+                                    field_index += 1
+                                    field_processed_successfully = False
+                                    year_processed_successfully = False
+                                    break
+                            except Exception as e_search:
+                                print(f"     [エラー] 検索処理中に予期せぬエラー: {e_search}")
+                                save_screenshot(driver, f"search_error_{year}_{field_name}", screenshots_dir)
                                 field_index += 1
                                 field_processed_successfully = False
                                 year_processed_successfully = False
+                                traceback.print_exc()
                                 break
-                        except Exception as e_search:
-                            print(f"     [エラー] 検索処理中に予期せぬエラー: {e_search}")
-                            save_screenshot(driver, f"search_error_{year}_{field_name}", screenshots_dir)
-                            field_index += 1
-                            field_processed_successfully = False
-                            year_processed_successfully = False
-                            traceback.print_exc()
-                            break
 
-                    # オリジナルコードの続き (if field_processed_successfully から)
-                    time.sleep(MEDIUM_WAIT); print("   検索結果表示完了。")
+                        # オリジナルコードの続き (if field_processed_successfully から)
+                        print("   検索結果表示完了。")
 
-                    # --- 該当なしチェック ---
-                    try:
-                        no_result_element = driver.find_element(By.XPATH, "//div[contains(text(), '該当するデータはありません')]")
-                        if no_result_element.is_displayed():
+                        # --- 該当なしチェック ---
+                        if classify_page(driver)[0] == PAGE_NO_RESULTS:
                             print(f"   [情報] {year}年度、分野 '{field_name}' に該当データなし。")
+                            field_enumerated = True
                             field_index += 1; continue
-                    except NoSuchElementException: pass
 
-                    # --- ソート順変更 (科目名順) ---
-                    try:
-                        sort_xpath = "//select[@name='SEARCH_RESULT_NARABIJUN']"
-                        sort_element = WebDriverWait(driver, MEDIUM_WAIT).until(EC.presence_of_element_located((By.XPATH, sort_xpath)))
-                        current_sort_value = Select(sort_element).first_selected_option.get_attribute('value')
-                        if current_sort_value != '2':
-                            print("   ソート順を「科目名順」に変更試行...")
-                            if not select_option_by_text(driver, sort_element, "科目名順"):
-                                try: Select(sort_element).select_by_value("2"); print("           ソート順を Value='2' で選択しました。")
-                                except Exception as e_sort_val:
-                                    print(f"           [警告] Value='2'でのソート失敗: {e_sort_val}。JSで試行...")
-                                    try: driver.execute_script("arguments[0].value = '2'; arguments[0].dispatchEvent(new Event('change', { bubbles: true }));", sort_element); print("           JSでソート順 Value='2' を設定しました。")
-                                    except Exception as e_js: print(f"           [警告] JSでのソートも失敗: {e_js}")
-                            else: print("           ソート順を「科目名順」で選択しました。")
-                            time.sleep(MEDIUM_WAIT)
-                            WebDriverWait(driver, current_element_timeout).until(EC.presence_of_element_located((By.XPATH, result_indicator_xpath)))
-                            time.sleep(MEDIUM_WAIT)
-                        # else: print("   ソート順は既に「科目名順」です。") # ログ省略可
-                    except TimeoutException: pass
-                    except Exception as e_sort: print(f"   [警告] ソート設定エラー: {e_sort}")
+                        # --- ソート順変更 (科目名順) ---
+                        try:
+                            sort_xpath = "//select[@name='SEARCH_RESULT_NARABIJUN']"
+                            sort_element = WebDriverWait(driver, MEDIUM_WAIT).until(EC.presence_of_element_located((By.XPATH, sort_xpath)))
+                            current_sort_value = Select(sort_element).first_selected_option.get_attribute('value')
+                            if current_sort_value != '2':
+                                print("   ソート順を「科目名順」に変更試行...")
+                                mark_page_stale(driver, 'search_results')
+                                if not select_option_by_text(driver, sort_element, "科目名順"):
+                                    try: Select(sort_element).select_by_value("2"); print("           ソート順を Value='2' で選択しました。")
+                                    except Exception as e_sort_val:
+                                        print(f"           [警告] Value='2'でのソート失敗: {e_sort_val}。JSで試行...")
+                                        try: driver.execute_script("arguments[0].value = '2'; arguments[0].dispatchEvent(new Event('change', { bubbles: true }));", sort_element); print("           JSでソート順 Value='2' を設定しました。")
+                                        except Exception as e_js: print(f"           [警告] JSでのソートも失敗: {e_js}")
+                                else: print("           ソート順を「科目名順」で選択しました。")
+                                wait_for_page_ready(driver, 'search_results', current_element_timeout)
+                            # else: print("   ソート順は既に「科目名順」です。") # ログ省略可
+                        except TimeoutException: pass
+                        except Exception as e_sort: print(f"   [警告] ソート設定エラー: {e_sort}")
+
+                    # 障害時に同じ検索結果ページへ戻れるよう、検索状態を控えておく
+                    if restored_search is not None:
+                        field_search_state, restored_page_num = restored_search
+                    else:
+                        try:
+                            field_search_state = capture_search_state(driver, year, field_name)
+                        except (InvalidSessionIdException, NoSuchWindowException):
+                            raise
+                        except WebDriverException as e_capture:
+                            print(f"   [警告] 検索状態の取得に失敗: {e_capture}")
+                            field_search_state = None
 
                     # --- ページネーションループ (逐次処理) ---
                     last_processed_page_num = 0
                     processed_page_numbers = set()  # Add this to track which pages we've already processed
+                    if restored_search is not None:
+                        processed_page_numbers.update(range(1, restored_page_num))
+                        last_processed_page_num = restored_page_num - 1
+
+                    # --- 中断したページへの直接移動 (1ページ目からのページ送りを省略) ---
+                    resume_page_num = resume_page_for_field(crawl_state, year, field_name) if restored_search is None else 0
+                    if resume_page_num > 1 and (year, field_name) not in search_jump_failed:
+                        try:
+                            search_state = field_search_state or capture_search_state(driver, year, field_name)
+                            print(f"   検索状態: {search_state['search_params']} → ページ {resume_page_num} へ直接移動します...")
+                            jumped = jump_to_search_page(driver, search_state, resume_page_num, current_element_timeout)
+                        except (InvalidSessionIdException, NoSuchWindowException):
+                            raise
+                        except WebDriverException as e_jump:
+                            print(f"   [警告] ページへの直接移動中にエラー: {e_jump}")
+                            jumped = False
+                        if jumped:
+                            processed_page_numbers.update(range(1, resume_page_num))
+                            last_processed_page_num = resume_page_num - 1
+                            print(f"   ページ {resume_page_num} へ移動しました (ページ 1-{resume_page_num - 1} は処理済み)。")
+                        elif jumped is None:
+                            print("   [情報] ページ番号リンクから直接移動の方法を特定できません。1ページ目から順に処理します。")
+                        else:
+                            # 移動に失敗して検索結果の状態が不明なため、この分野は検索からやり直す (直接移動は以後行わない)
+                            print("   [警告] ページへの直接移動に失敗しました。検索からやり直し、1ページ目から順に処理します。")
+                            search_jump_failed.add((year, field_name))
+                            continue
+
+                    # --- 2段階パイプライン: 全ページのURLを並行列挙 (失敗時は従来のページ送り) ---
+                    if frontier is not None and RESULT_PAGE_PARALLELISM > 1:
+                        urls_by_page = None
+                        enumeration_start_time = time.time()
+                        try:
+                            search_state = capture_search_state(driver, year, field_name)
+                            urls_by_page = enumerate_result_pages_parallel(driver, search_state, get_active_page_number(driver) or 1, year, processed_page_numbers)
+                        except (InvalidSessionIdException, NoSuchWindowException):
+                            raise
+                        except WebDriverException as e_parallel:
+                            print(f"         [警告] 検索結果ページの並行列挙中にエラー: {e_parallel}")
+                        if urls_by_page is not None:
+                            for page_num in sorted(urls_by_page):
+                                new_url_count = frontier.add_urls(year, field_name, page_num, urls_by_page[page_num])
+                                crawl_state.save_cursor(year, field_name, page_num)
+                                print(f"         ページ {page_num}: {len(urls_by_page[page_num])} 件のURLをフロンティアに登録しました (新規: {new_url_count}件)")
+                            print(f"   {len(urls_by_page)} ページのURL列挙が完了しました ({time.time() - enumeration_start_time:.2f}s)")
+                            field_enumerated = True
+                            field_index += 1; continue
+                        print("   並行列挙ができないため、ページ送りで列挙します。")
 
                     while True:
                         print(f"\n     --- ページネーションブロック処理開始 (最終処理ページ: {last_processed_page_num}) ---")
@@ -2169,7 +5295,7 @@ if __name__ == "__main__":
                                     # まず一般的なリンクがあるかを確認
                                     WebDriverWait(driver, MEDIUM_WAIT).until(EC.presence_of_element_located((By.TAG_NAME, "a")))
                                     print("         ページの完全なロードを待機中...")
-                                    time.sleep(2)  # シラバスリンク抽出前に2秒の追加待機
+                                    wait_for_page_ready(driver, 'search_results')  # シラバスリンク抽出前に結果表示完了を確認
                                     # すべてのリンクを取得して調査
                                     all_links = driver.find_elements(By.TAG_NAME, "a")
                                     print(f"         ページ上のリンク数: {len(all_links)}")
@@ -2204,50 +5330,7 @@ if __name__ == "__main__":
                                     # onclick属性からURLを取得（JSを使用する場合のため）
                                     try:
                                         # Use ONLY JavaScript as the URL detection method
-                                        js_script = """
-                                        // Target all syllabus detail links
-                                        const syllabusUrls = [];
-
-                                        // First approach: Get all links with syllabus-detail class (for 2025+ system)
-                                        const detailLinks = document.querySelectorAll('a.syllabus-detail');
-                                        detailLinks.forEach(link => {
-                                            if (link.href) {
-                                                syllabusUrls.push(link.href);
-                                            }
-                                        });
-
-                                        // Second approach: Get all blue buttons with class btn-info (for older system)
-                                        const blueButtons = document.querySelectorAll('a.btn-info, button.btn-info');
-                                        blueButtons.forEach(button => {
-                                            if (button.href) {
-                                                syllabusUrls.push(button.href);
-                                            }
-                                        });
-
-                                        // Third approach: Look for syllabus links in table cells
-                                        document.querySelectorAll('td a').forEach(link => {
-                                            if (link.href && (link.href.includes('syllabus') || 
-                                                            link.href.includes('entno=') || 
-                                                            link.href.includes('courses'))) {
-                                                syllabusUrls.push(link.href);
-                                            }
-                                        });
-
-                                        // Fourth approach: Check for onclick handlers on buttons
-                                        document.querySelectorAll('a[onclick], button[onclick]').forEach(el => {
-                                            if (el.onclick) {
-                                                const onclickStr = el.onclick.toString();
-                                                if (onclickStr.includes('syllabus') || onclickStr.includes('detail')) {
-                                                    const matches = onclickStr.match(/window\.open\(['"]([^'"]+)['"]/);
-                                                    if (matches && matches[1]) {
-                                                        syllabusUrls.push(matches[1]);
-                                                    }
-                                                }
-                                            }
-                                        });
-
-                                        return [...new Set(syllabusUrls)];
-                                        """
+                                        js_script = _COLLECT_SYLLABUS_URLS_JS + "return collectSyllabusUrls(document);"
                                         urls_on_page = driver.execute_script(js_script)
                                         print(f"         JavaScriptで検出したURL数: {len(urls_on_page)}")
                                         for i, url in enumerate(urls_on_page[:5]):
@@ -2338,13 +5421,35 @@ if __name__ == "__main__":
                                         except Exception as debug_e:
                                             print(f"         [警告] デバッグ情報取得エラー: {debug_e}")
                                     
-                                    if len(urls_on_page) > 0:
+                                    if frontier is not None:
+                                        # ★★★ 2段階パイプライン: 詳細はここでは取得せず、フロンティアに登録のみ ★★★
+                                        new_url_count = frontier.add_urls(year, field_name, current_active_page_num, urls_on_page)
+                                        print(f"         {len(urls_on_page)} 件のURLをフロンティアに登録しました (新規: {new_url_count}件)")
+                                        crawl_state.save_cursor(year, field_name, current_active_page_num)
+                                    elif len(urls_on_page) > 0:
                                         print(f"         {len(urls_on_page)} 件のURLを処理します...")
                                         processed_count_on_page = 0
                                         field_total_attempts = 0
                                         field_error_count = 0
                                         consecutive_errors = 0
                                         
+                                        # ★★★ 旧システムのURLはログインなしのHTTPで先に取得 ★★★
+                                        batch_details = fetch_legacy_details(legacy_fetcher, [u for u in dict.fromkeys(urls_on_page) if u not in opened_links_this_year_field], year)
+                                        # ★★★ 非同期/ワーカープールモード: 未処理URLを先にまとめて並行取得 ★★★
+                                        detail_fetcher = async_fetcher if async_fetcher is not None else browser_pool
+                                        if detail_fetcher is not None:
+                                            pending_urls = [u for u in dict.fromkeys(urls_on_page) if u not in opened_links_this_year_field and u not in batch_details]
+                                            print(f"         {len(pending_urls)} 件の詳細ページを並行取得します...")
+                                            batch_start_time = time.time()
+                                            pending_details, session_expired = detail_fetcher.fetch_all(pending_urls, year)
+                                            if session_expired:
+                                                print("         セッション切れを検出。ブラウザのCookieで更新して失敗分を再取得します...")
+                                                refresh_detail_fetchers(driver, http_client, async_fetcher, browser_pool)
+                                                retry_details, _ = detail_fetcher.fetch_all([u for u, d in pending_details.items() if not d], year)
+                                                pending_details.update({u: d for u, d in retry_details.items() if d})
+                                            batch_details.update(pending_details)
+                                            print(f"         並行取得完了: {sum(1 for d in pending_details.values() if d)}/{len(pending_urls)} 件成功 ({time.time() - batch_start_time:.2f}s)")
+
                                         for index, syllabus_url in enumerate(urls_on_page):
                                             # Check if this URL has already been processed
                                             if syllabus_url in opened_links_this_year_field:
@@ -2353,7 +5458,26 @@ if __name__ == "__main__":
 
                                             print(f"\n           詳細処理 {index + 1}/{len(urls_on_page)}: {syllabus_url}")
                                             syllabus_details = None
-                                            
+
+                                            # ★★★ HTTP/並行取得 - 失敗時のみメインのブラウザで再試行 ★★★
+                                            if syllabus_url in batch_details or http_client is not None or async_fetcher is not None or browser_pool is not None:
+                                                syllabus_details = batch_details.get(syllabus_url)
+                                                if syllabus_details is None and http_client is not None:
+                                                    try:
+                                                        syllabus_details = fetch_syllabus_details_http(http_client, syllabus_url, year)
+                                                    except HttpSessionExpiredError as e_http_session:
+                                                        print(f"           [HTTP] セッション切れを検出: {e_http_session}。ブラウザのCookieで更新します。")
+                                                        refresh_detail_fetchers(driver, http_client, async_fetcher, browser_pool)
+                                                if syllabus_details:
+                                                    scraped_data_all_years.append(syllabus_details)
+                                                    opened_links_this_year_field.add(syllabus_url)
+                                                    crawl_state.mark_done(syllabus_url, syllabus_details, year, field_name, current_active_page_num, count_attempt=True)
+                                                    processed_count_on_page += 1
+                                                    consecutive_errors = 0
+                                                    print(f"           ✅ 成功({DETAIL_FETCH_MODE}): ID:{syllabus_details.get('course_id')} | {syllabus_details.get('name_ja')} | Prof:{syllabus_details.get('professor_ja')} | Field:{syllabus_details.get('field_ja')}")
+                                                    continue
+                                                print(f"           並行/HTTP取得に失敗したため、メインのブラウザで再試行します...")
+
                                             try:
                                                 # Store the main window handle first for reliable tab management
                                                 main_window = driver.current_window_handle
@@ -2361,22 +5485,29 @@ if __name__ == "__main__":
                                                 if check_session_timeout(driver, screenshots_dir):
                                                     raise InvalidSessionIdException("Session timeout before detail fetch")
                                                 
-                                                # Open a new tab instead of navigating in the current tab
-                                                print(f"           新しいタブを開いて詳細ページを表示します...")
-                                                driver.switch_to.new_window('tab')
-                                                detail_tab = driver.current_window_handle
-                                                
-                                                # Navigate to the syllabus URL in the new tab
-                                                driver.get(syllabus_url)
+                                                detail_tab, english_tab = (None, None) if tab_prefetcher is None else tab_prefetcher.take(driver, syllabus_url)
+                                                if tab_prefetcher is not None:
+                                                    # このページを読み込み・解析している間に、後続のURLを別タブで読み込み始めておく
+                                                    tab_prefetcher.prefetch(driver, [u for u in urls_on_page[index + 1:] if u not in opened_links_this_year_field and u not in batch_details], year)
+                                                if detail_tab is not None:
+                                                    print(f"           先読み済みのタブに切り替えます...")
+                                                    driver.switch_to.window(detail_tab)
+                                                else:
+                                                    # Open a new tab instead of navigating in the current tab
+                                                    print(f"           新しいタブを開いて詳細ページを表示します...")
+                                                    driver.switch_to.new_window('tab')
+                                                    detail_tab = driver.current_window_handle
+
+                                                    # Navigate to the syllabus URL in the new tab
+                                                    english_tab = navigate_detail_page(driver, syllabus_url, year)
                                                 
                                                 # Process the page
-                                                WebDriverWait(driver, min(30, ELEMENT_WAIT_TIMEOUT)).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                                                wait_for_page_ready(driver, 'detail', min(30, ELEMENT_WAIT_TIMEOUT))
 
                                                 print(f"           詳細ページ読み込み完了。処理開始...")
-                                                time.sleep(MEDIUM_WAIT)
                                                 
                                                 # Get syllabus details - this function already handles both Japanese and English data
-                                                syllabus_details = get_syllabus_details(driver, year, screenshots_dir)
+                                                syllabus_details = get_syllabus_details(driver, year, screenshots_dir, english_handle=english_tab)
                                                 
                                                 # Debug information - check if English data is present and force to extract both
                                                 has_english = False
@@ -2397,7 +5528,7 @@ if __name__ == "__main__":
                                                         
                                                         # Navigate to English page
                                                         driver.get(english_url)
-                                                        time.sleep(2)  # Wait for page to load
+                                                        wait_for_page_ready(driver, 'english')  # Wait for page to load
                                                         
                                                         # Basic extraction of name
                                                         try:
@@ -2406,7 +5537,7 @@ if __name__ == "__main__":
                                                             
                                                             # Go back to original page
                                                             driver.get(current_url)
-                                                            time.sleep(1)
+                                                            wait_for_page_ready(driver, 'detail')
                                                         except:
                                                             print(f"           英語データ抽出失敗")
                                                     
@@ -2416,7 +5547,6 @@ if __name__ == "__main__":
                                                 print(f"           詳細ページ処理完了。タブを閉じて検索結果に戻ります...")
                                                 driver.close()
                                                 driver.switch_to.window(main_window)
-                                                time.sleep(SHORT_WAIT)
 
                                                 # Only mark as processed if we actually got details
                                                 if syllabus_details:
@@ -2430,12 +5560,14 @@ if __name__ == "__main__":
                                                     # Add to results and mark as processed
                                                     scraped_data_all_years.append(syllabus_details)
                                                     opened_links_this_year_field.add(syllabus_url)
+                                                    crawl_state.mark_done(syllabus_url, syllabus_details, year, field_name, current_active_page_num, count_attempt=True)
                                                     processed_count_on_page += 1
                                                     consecutive_errors = 0
                                                     
                                                     print(f"           ✅ 成功: ID:{course_id} | {course_name} | Prof:{professor} | Field:{field}")
                                                 else:
                                                     print(f"           詳細情報の取得に失敗しました。")
+                                                    crawl_state.mark_failed(syllabus_url, "detail fetch failed", year, field_name, current_active_page_num, count_attempt=True)
                                                     field_error_count += 1
                                                     consecutive_errors += 1
                                             except InvalidSessionIdException as e_session:
@@ -2444,8 +5576,11 @@ if __name__ == "__main__":
                                                 if recover_driver_session():
                                                     print(f"           セッションを回復しました。次のURLに進みます...")
                                                     driver = globals()['driver']  # Get the new driver
+                                                    # 処理中の検索結果ページを開き直し、このページのページ送りを続けられるようにする
+                                                    restore_search_page(driver, field_search_state, current_active_page_num, current_element_timeout)
                                                     # Update main window in case of session recovery
                                                     main_window = driver.current_window_handle
+                                                    refresh_detail_fetchers(driver, http_client, async_fetcher, browser_pool)
                                                 else:
                                                     print(f"           セッション回復に失敗しました。処理を中断します。")
                                                     field_error_count += 1
@@ -2500,7 +5635,7 @@ if __name__ == "__main__":
                                                             """
                                                             ja_data = driver.execute_script(js_script)
                                                             driver.execute_script(js_script, str(year), field_name)
-                                                            time.sleep(MEDIUM_WAIT)
+                                                            wait_for_page_ready(driver, 'search_form')
                                                     except Exception as recovery_error:
                                                         print(f"           [警告] リカバリー中にエラー: {recovery_error}")
                                                         field_error_count += 1
@@ -2518,16 +5653,22 @@ if __name__ == "__main__":
                                                     print("           ✅ WebDriver再初期化に成功しました。続行します。")
                                                     # Reload search page and redo search after full recovery
                                                     driver = globals()['driver']
+                                                    restore_search_page(driver, field_search_state, current_active_page_num, current_element_timeout)
                                                     main_window = driver.current_window_handle
+                                                    refresh_detail_fetchers(driver, http_client, async_fetcher, browser_pool)
                                                 else:
                                                     print("           ❌ WebDriver再初期化に失敗しました。処理を中断します。")
                                                     break
                                             
                                             # Brief pause between URLs to avoid hammering the server
                                             time.sleep(SHORT_WAIT)
+                                        if tab_prefetcher is not None:
+                                            tab_prefetcher.discard_all(driver)
 
-                                    if processed_count_on_page > 0:
-                                        save_checkpoint(year, field_name, current_active_page_num, opened_links_this_year_field)
+                                    if frontier is not None:
+                                        print(f"         ページ {current_active_page_num} のURL列挙が完了しました")
+                                    elif processed_count_on_page > 0:
+                                        crawl_state.save_cursor(year, field_name, current_active_page_num)
                                         print(f"         ページ {current_active_page_num} の処理が完了しました: {processed_count_on_page}件処理済")
                                     else:
                                         print(f"         処理対象のURLが見つかりませんでした")
@@ -2586,10 +5727,11 @@ if __name__ == "__main__":
                                 print(f"         ページ {page_num} への遷移を試みます...")
                                 try:
                                     link_to_click = WebDriverWait(driver, SHORT_WAIT).until(EC.element_to_be_clickable((By.XPATH, f"//ul[contains(@class, 'pagination')]//li/a[normalize-space(text())='{page_num}']")))
+                                    mark_page_stale(driver, 'search_results')
                                     if click_element(driver, link_to_click):
                                         print(f"         ページ {page_num} へ遷移。結果待機中...")
-                                        WebDriverWait(driver, current_element_timeout).until(EC.presence_of_element_located((By.XPATH, result_indicator_xpath)))
-                                        time.sleep(MEDIUM_WAIT)
+                                        if not wait_for_page_ready(driver, 'search_results', current_element_timeout):
+                                            raise TimeoutException(f"ページ {page_num} の結果表示待機タイムアウト")
                                         clicked_page_link = True
                                         break
                                     else: print(f"         [警告] ページ {page_num} のクリックに失敗。次のページ番号を試します。"); continue
@@ -2609,10 +5751,11 @@ if __name__ == "__main__":
                                 next_xpath = ".//li[not(contains(@class, 'disabled'))]/a[contains(text(), '次') or contains(., 'Next')]"
                                 next_button = pagination_container_next.find_element(By.XPATH, next_xpath)
                                 print(f"\n         「次へ」ボタンを検出しました。クリックを試みます...")
+                                mark_page_stale(driver, 'search_results')
                                 if click_element(driver, next_button):
                                     print("         「次へ」をクリックしました。結果待機中...")
-                                    WebDriverWait(driver, current_element_timeout).until(EC.presence_of_element_located((By.XPATH, result_indicator_xpath)))
-                                    time.sleep(MEDIUM_WAIT)
+                                    if not wait_for_page_ready(driver, 'search_results', current_element_timeout):
+                                        raise TimeoutException("「次へ」の結果表示待機タイムアウト")
                                     pagination_processed_in_block = True
                                     continue
                                 else: print("         [警告] 「次へ」ボタンのクリックに失敗。ページネーションを終了します。"); break
@@ -2626,33 +5769,43 @@ if __name__ == "__main__":
                             print("         このブロックでページ処理が行われず、未処理ページもありません。ページネーションを終了します。")
                             break
 
+                    field_enumerated = field_processed_successfully
+
                 except (InvalidSessionIdException, NoSuchWindowException) as e_session_field:
                     print(f"\n[!!!] 分野 '{field_name}' ({year}年度) 処理中セッション/ウィンドウエラー: {e_session_field}。WebDriver再起動試行。")
-                    if driver:
-                        try: driver.quit()
-                        except Exception as quit_err: print(f" WebDriver終了エラー: {quit_err}")
-                    driver = None
-                    driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
-                    # Rest of existing code...
-                    if not driver: print("[!!!] WebDriver再初期化失敗。スクリプトを終了します。"); raise Exception("WebDriver再初期化失敗。")
-                    try:
-                        if not login(driver, USER_EMAIL, USER_PASSWORD, screenshots_dir): print("[!!!] 再ログイン失敗。スクリプトを終了します。"); raise Exception("再ログイン失敗。")
-                    except Exception as relogin_e: print(f"[!!!] 再ログイン中にエラー: {relogin_e}"); raise
+                    standby_driver = take_standby_driver()
+                    if standby_driver:
+                        quit_driver_async(driver)
+                        driver = standby_driver
+                    else:
+                        if driver:
+                            try: driver.quit()
+                            except Exception as quit_err: print(f" WebDriver終了エラー: {quit_err}")
+                        driver = None
+                        driver = initialize_driver(CHROME_DRIVER_PATH, HEADLESS_MODE)
+                        # Rest of existing code...
+                        if not driver: print("[!!!] WebDriver再初期化失敗。スクリプトを終了します。"); raise Exception("WebDriver再初期化失敗。")
+                        try:
+                            if not establish_session(driver, screenshots_dir): print("[!!!] 再ログイン失敗。スクリプトを終了します。"); raise Exception("再ログイン失敗。")
+                        except Exception as relogin_e: print(f"[!!!] 再ログイン中にエラー: {relogin_e}"); raise
                     print(f" WebDriver再起動・再ログイン完了。分野 '{field_name}' ({year}年度) 再試行。")
+                    # 未処理のページを直接開き直せれば、再試行では検索条件の設定・検索を省略する
+                    restore_page_num = max(resume_page_for_field(crawl_state, year, field_name), 1)
+                    if restore_search_page(driver, field_search_state, restore_page_num, current_element_timeout):
+                        restored_searches[(year, field_name)] = (field_search_state, restore_page_num)
+                    refresh_detail_fetchers(driver, http_client, async_fetcher, browser_pool)
                     field_index -= 1; field_processed_successfully = False; year_processed_successfully = False
                 except Exception as e_field_main:
                     print(f"     [エラー] 分野 '{field_name}' ({year}年度) 処理中エラー: {e_field_main}"); traceback.print_exc()
                     save_screenshot(driver, f"field_main_error_{year}_{field_name}", screenshots_dir); print(" この分野をスキップします。")
                     field_processed_successfully = False; year_processed_successfully = False
                 finally:
+                    if frontier is not None and field_enumerated:
+                        frontier.mark_enumerated(year, field_name)
                     if field_processed_successfully: print(f"===== 分野: {field_name} ({year}年度) 正常終了 =====")
                     else: print(f"===== 分野: {field_name} ({year}年度) 処理中断または失敗 =====")
-                    # 分野完了ごと、またはエラー発生時にJSON書き込み
-                    if scraped_data_all_years:
-                        print(f"\n--- JSONファイル更新 ({'エラー発生時点' if not field_processed_successfully else '分野完了時点'}) ---")
-                        final_data = aggregate_syllabus_data(scraped_data_all_years)
-                        write_json_data(final_data, output_json_path)
-                    # else: print("収集データがないためJSONは更新されません。") # ログ省略可
+                    # 分野完了ごと、またはエラー発生時に生データをディスクに確定 (JSONは実行終了時に書き出す)
+                    raw_record_sink.sync()
 
                 field_index += 1
             # --- 分野ループ終了 ---
@@ -2662,6 +5815,21 @@ if __name__ == "__main__":
             year_index += 1
         # --- 年度ループ終了 ---
 
+        # --- ★★★ 2段階パイプライン: 取得フェーズ (フロンティアの未取得URLを処理) ★★★ ---
+        if frontier is not None:
+            frontier_counts = frontier.counts()
+            print(f"\n<<<<< 取得フェーズ開始: 未取得 {frontier_counts[URL_PENDING]} 件 / 取得済 {frontier_counts[URL_DONE]} 件 >>>>>")
+            for year in TARGET_YEARS:
+                year_details = run_fetch_phase(frontier, year, screenshots_dir, http_client, async_fetcher, browser_pool,
+                                               on_details=scraped_data_all_years.append, tab_prefetcher=tab_prefetcher,
+                                               legacy_fetcher=legacy_fetcher)
+                raw_record_sink.sync()
+                print(f"   {year}年度: {len(year_details)} 件取得")
+            frontier_counts = frontier.counts()
+            print(f"<<<<< 取得フェーズ終了: 取得済 {frontier_counts[URL_DONE]} 件 / 失敗 {frontier_counts[URL_FAILED]} 件 >>>>>")
+
+        crawl_state.mark_completed()
+
     # --- グローバル try/except/finally ---
     except KeyboardInterrupt: print("\nキーボード割り込みにより処理中断。")
     except SystemExit as e: print(f"\nスクリプト停止 (終了コード: {e.code})。")
@@ -2672,6 +5840,23 @@ if __name__ == "__main__":
             try: save_screenshot(driver, "fatal_error_global", screenshots_dir)
             except Exception as ss_err: print(f"[警告] エラー発生後のスクリーンショット保存に失敗しました: {ss_err}")
     finally:
+        if http_client is not None:
+            http_client.close()
+        if async_fetcher is not None:
+            async_fetcher.close()
+        if legacy_fetcher is not None:
+            legacy_fetcher.close()
+        if browser_pool is not None:
+            browser_pool.close()
+        if STANDBY_DRIVER is not None:
+            STANDBY_DRIVER.close()
+        crawl_state.close()
+        raw_record_sink.close()
+        if HTML_ARCHIVE is not None:
+            archive_stats = HTML_ARCHIVE.stats()
+            print(f"\nHTMLアーカイブ: {archive_stats['pages']}ページ / {archive_stats['objects']}オブジェクト "
+                  f"({archive_stats['size'] / 1024:.0f}KB → {archive_stats['stored_size'] / 1024:.0f}KB)")
+            HTML_ARCHIVE.close()
         if driver:
             try: driver.quit(); print("\nブラウザ終了。")
             except Exception as qe: print(f"\nブラウザ終了時エラー: {qe}")
@@ -2680,7 +5865,7 @@ if __name__ == "__main__":
         if scraped_data_all_years:
             print(f"合計 {len(scraped_data_all_years)} 件の生データ取得。")
             print("\n最終データ集約中...")
-            final_json_data = aggregate_syllabus_data(scraped_data_all_years)
+            final_json_data = scraped_data_all_years.final_list()
             if final_json_data: write_json_data(final_json_data, output_json_path)
             else: print("集約後データなし。JSON未作成。")
         else: print("\n有効データ収集されず。JSON未作成。")
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import csv39
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_JA_TEMPLATE = os.path.join(REPO_ROOT, "2024 and older syllabus html template(Japanese).html")
+LEGACY_EN_TEMPLATE = os.path.join(REPO_ROOT, "2024 and older syllabus html template english version.html")
+LEGACY_TEMPLATE_YEAR = 2024
+LEGACY_TEMPLATE_COURSE_ID = "27626"
+
+
+def read_template(path, year=LEGACY_TEMPLATE_YEAR):
+    """同梱の旧システムのテンプレートを読み、年度を year に置き換えて返す"""
+    with open(path, encoding="utf-8") as f:
+        return f.read().replace(str(LEGACY_TEMPLATE_YEAR), str(year))
+
+
+def legacy_url(year, lang="ja"):
+    return f"https://syllabus.sfc.keio.ac.jp/courses/{year}_{LEGACY_TEMPLATE_COURSE_ID}?locale={lang}"
+
+
+@pytest.fixture
+def ja_template():
+    return read_template(LEGACY_JA_TEMPLATE)
+
+
+@pytest.fixture
+def en_template():
+    return read_template(LEGACY_EN_TEMPLATE)
+
+
+@pytest.fixture(autouse=True)
+def isolated_globals(monkeypatch):
+    """テストごとにアーカイブ・指紋・翻訳キャッシュのグローバル設定を初期状態に戻す"""
+    monkeypatch.setattr(csv39, "HTML_ARCHIVE", None)
+    monkeypatch.setattr(csv39, "FINGERPRINT_STORE", None)
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", None)
+    monkeypatch.setattr(csv39, "INCREMENTAL_MODE", True)
+    monkeypatch.setattr(csv39, "TRANSLATION_REUSE", True)
+
+
+@pytest.fixture
+def crawl_state(tmp_path):
+    store = csv39.CrawlStateStore(str(tmp_path / "crawl_state.sqlite3"))
+    yield store
+    store.close()
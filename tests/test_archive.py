@@ -0,0 +1,68 @@
+import pytest
+
+import csv39
+from conftest import LEGACY_JA_TEMPLATE, legacy_url, read_template
+
+
+def sample_pages(count):
+    """辞書学習用に、登録番号と年度を変えた詳細ページを作る"""
+    template = read_template(LEGACY_JA_TEMPLATE)
+    return [(legacy_url(2024).replace("27626", str(30000 + i)), template.replace("27626", str(30000 + i)).replace("2024", str(2000 + i)))
+            for i in range(count)]
+
+
+def test_put_get_round_trip_and_deduplication(tmp_path):
+    archive = csv39.HtmlArchive(str(tmp_path / "archive"))
+    page_html = read_template(LEGACY_JA_TEMPLATE)
+    sha256 = archive.put(legacy_url(2024), page_html, "ja", 2024, fetched_at=1.0)
+    assert archive.put(legacy_url(2024), page_html, "ja", 2024, fetched_at=2.0) == sha256
+    assert archive.get(sha256) == page_html
+    stats = archive.stats()
+    assert (stats["pages"], stats["objects"]) == (2, 1)
+    assert stats["stored_size"] < stats["size"]
+    archive.close()
+
+
+def test_url_canonicalization():
+    assert (csv39.canonicalize_url("HTTPS://Syllabus.SFC.keio.ac.jp/courses/2024_1?locale=ja&b=2#top")
+            == "https://syllabus.sfc.keio.ac.jp/courses/2024_1?b=2&locale=ja")
+
+
+@pytest.mark.skipif(csv39.zstandard is None, reason="zstandard is not installed")
+def test_dictionary_is_trained_and_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv39, "ARCHIVE_DICT_TRAINING_SAMPLES", 20)
+    monkeypatch.setattr(csv39, "ARCHIVE_DICT_SIZE", 16 * 1024)
+    archive_root = str(tmp_path / "archive")
+    archive = csv39.HtmlArchive(archive_root)
+    pages = sample_pages(30)
+    hashes = [archive.put(url, page_html, "ja", 2024) for url, page_html in pages]
+    assert archive.current_dict_id != 0
+    codecs = dict(archive.conn.execute("SELECT sha256, dict_id FROM objects").fetchall())
+    assert codecs[hashes[0]] == 0 # 辞書学習前のページは辞書なしで圧縮
+    assert codecs[hashes[-1]] == archive.current_dict_id
+    archive.close()
+
+    # 別プロセスの再解析と同じく、読み取り専用で開いても保存した辞書で復元できる
+    reader = csv39.HtmlArchive(archive_root, read_only=True)
+    assert [reader.get(sha256) for sha256 in hashes] == [page_html for _, page_html in pages]
+    reader.close()
+
+
+@pytest.mark.skipif(csv39.zstandard is None, reason="zstandard is not installed")
+def test_untrained_samples_are_reused_after_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv39, "ARCHIVE_DICT_TRAINING_SAMPLES", 20)
+    monkeypatch.setattr(csv39, "ARCHIVE_DICT_SIZE", 16 * 1024)
+    archive_root = str(tmp_path / "archive")
+    pages = sample_pages(20)
+    archive = csv39.HtmlArchive(archive_root)
+    for url, page_html in pages[:10]:
+        archive.put(url, page_html, "ja", 2024)
+    archive.close()
+
+    archive = csv39.HtmlArchive(archive_root)
+    assert len(archive.training_samples) == 10
+    for url, page_html in pages[10:]:
+        archive.put(url, page_html, "ja", 2024)
+    assert archive.current_dict_id != 0
+    archive.close()
+
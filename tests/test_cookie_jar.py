@@ -0,0 +1,80 @@
+import json
+import os
+import stat
+import time
+
+import pytest
+
+import csv39
+
+COOKIES = [
+    {"name": "session", "value": "abc", "domain": "gslbs.keio.jp"},
+    {"name": "expired", "value": "old", "domain": "gslbs.keio.jp", "expiry": int(time.time()) - 60},
+]
+
+
+@pytest.fixture
+def no_keyring(monkeypatch):
+    monkeypatch.setattr(csv39, "keyring", None)
+    monkeypatch.delenv(csv39.COOKIE_JAR_KEY_ENV, raising=False)
+
+
+def test_key_comes_from_environment(monkeypatch, no_keyring):
+    key = csv39.Fernet.generate_key()
+    monkeypatch.setenv(csv39.COOKIE_JAR_KEY_ENV, key.decode("ascii"))
+    assert csv39.load_cookie_jar_key() == key
+    monkeypatch.setenv(csv39.COOKIE_JAR_KEY_ENV, "not-a-key")
+    assert csv39.load_cookie_jar_key() is None
+
+
+def test_key_is_generated_and_stored_in_keyring(monkeypatch, no_keyring):
+    stored = {}
+
+    class FakeKeyring:
+        @staticmethod
+        def get_password(service, username):
+            return stored.get((service, username))
+
+        @staticmethod
+        def set_password(service, username, password):
+            stored[(service, username)] = password
+
+    monkeypatch.setattr(csv39, "keyring", FakeKeyring)
+    key = csv39.load_cookie_jar_key()
+    assert key is not None
+    assert csv39.load_cookie_jar_key() == key
+
+
+def test_encrypted_jar_round_trip(tmp_path):
+    path = str(tmp_path / "session_cookies.json")
+    key = csv39.Fernet.generate_key()
+    jar = csv39.CookieJar(path, "user@keio.jp", key)
+    assert jar.encrypted
+    assert jar.save(COOKIES)
+    with open(path, encoding="utf-8") as f:
+        assert "abc" not in f.read()
+    assert jar.load() == COOKIES[:1] # 期限切れのCookieは除外
+    assert csv39.CookieJar(path, "other@keio.jp", key).load() is None
+    assert csv39.CookieJar(path, "user@keio.jp", csv39.Fernet.generate_key()).load() is None
+    assert csv39.CookieJar(path, "user@keio.jp").load() is None
+
+
+def test_plain_jar_is_owner_only(tmp_path):
+    path = str(tmp_path / "session_cookies.json")
+    jar = csv39.CookieJar(path, "user@keio.jp")
+    assert not jar.encrypted
+    assert jar.save(COOKIES)
+    if os.name == "posix":
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["format"] == "plain"
+    assert jar.load() == COOKIES[:1]
+    jar.clear()
+    assert jar.load() is None
+
+
+def test_expired_jar_is_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv39, "COOKIE_JAR_MAX_AGE", -1)
+    jar = csv39.CookieJar(str(tmp_path / "session_cookies.json"), "user@keio.jp")
+    assert jar.save(COOKIES)
+    assert jar.load() is None
@@ -0,0 +1,87 @@
+import pickle
+
+import csv39
+
+
+def urls(count, year=2024):
+    return [f"https://syllabus.sfc.keio.ac.jp/courses/{year}_{i}?locale=ja" for i in range(count)]
+
+
+def test_frontier_claim_marks_urls_in_flight(crawl_state):
+    assert crawl_state.add_urls(2024, "先端科目", 1, urls(3) + urls(1)) == 3
+    assert crawl_state.add_urls(2024, "先端科目", 2, urls(4)) == 1 # 登録済みURLは無視
+    crawl_state.add_urls(2023, "先端科目", 1, urls(2, 2023))
+
+    first_batch = crawl_state.claim(2024, 3)
+    assert first_batch == urls(3)
+    assert crawl_state.claim(2024, 3) == urls(4)[3:] # in-flight のURLは再度取り出されない
+    assert crawl_state.claim(2024, 3) == []
+    assert crawl_state.counts() == {csv39.URL_PENDING: 2, csv39.URL_IN_FLIGHT: 4, csv39.URL_DONE: 0, csv39.URL_FAILED: 0}
+
+    details = {"course_id": "0", "year_scraped": 2024}
+    crawl_state.mark_done(first_batch[0], details)
+    crawl_state.mark_failed(first_batch[1], "detail fetch failed")
+    assert crawl_state.done_urls(2024, "先端科目") == {first_batch[0]}
+    assert crawl_state.done_details() == [details]
+
+
+def test_requeue_unfinished_returns_in_flight_and_failed_urls(crawl_state):
+    crawl_state.add_urls(2024, "先端科目", 1, urls(3))
+    claimed = crawl_state.claim(2024, 3)
+    crawl_state.mark_done(claimed[0], {"course_id": "0"})
+    crawl_state.mark_failed(claimed[1], "timeout")
+
+    # 中断後の再開: in-flight / failed のURLだけが pending に戻り、再び取り出せる
+    assert crawl_state.requeue_unfinished() == 2
+    assert crawl_state.claim(2024, 10) == claimed[1:]
+    attempts = dict(crawl_state.conn.execute("SELECT url, attempts FROM urls").fetchall())
+    assert attempts[claimed[1]] == 2
+
+
+def test_resume_after_reopen(tmp_path):
+    path = str(tmp_path / "crawl_state.sqlite3")
+    store = csv39.CrawlStateStore(path)
+    assert store.is_empty()
+    store.add_urls(2024, "先端科目", 1, urls(2))
+    store.mark_enumerated(2024, "先端科目")
+    store.claim(2024, 1)
+    store.save_cursor(2024, "先端科目", 3)
+    store.close()
+
+    store = csv39.CrawlStateStore(path)
+    assert not store.is_empty()
+    assert not store.is_completed()
+    assert store.is_enumerated(2024, "先端科目")
+    assert not store.is_enumerated(2024, "基盤科目")
+    assert store.requeue_unfinished() == 1
+    assert store.claim(2024, 10) == urls(2)
+    store.mark_completed()
+    assert store.is_completed()
+
+    store.reset()
+    assert store.is_empty()
+    assert not store.is_completed()
+    store.close()
+
+
+def test_cursor_and_resume_page(crawl_state):
+    assert crawl_state.load_cursor() is None
+    assert csv39.resume_page_for_field(crawl_state, 2024, "先端科目") == 0
+    crawl_state.save_cursor(2024, "先端科目", 2)
+    crawl_state.save_cursor(2024, "先端科目", 4)
+    cursor = crawl_state.load_cursor()
+    assert (cursor["year"], cursor["field_name"], cursor["page_num"]) == (2024, "先端科目", 4)
+    assert csv39.resume_page_for_field(crawl_state, 2024, "先端科目") == 5
+    assert csv39.resume_page_for_field(crawl_state, 2024, "基盤科目") == 0
+    assert csv39.resume_page_for_field(crawl_state, 2023, "先端科目") == 0
+
+
+def test_import_checkpoint_pickle_once(tmp_path, crawl_state):
+    checkpoint_file = tmp_path / "checkpoint.pkl"
+    with open(checkpoint_file, "wb") as f:
+        pickle.dump({"year": 2024, "field_name": "先端科目", "page_num": 3, "processed_urls": set(urls(2)),
+                     "timestamp": "2024-04-01"}, f)
+    assert crawl_state.import_checkpoint_pickle(str(checkpoint_file))
+    assert not crawl_state.import_checkpoint_pickle(str(checkpoint_file))
+    assert crawl_state.done_urls(2024, "先端科目") == set(urls(2))
+    assert crawl_state.load_cursor()["page_num"] == 3
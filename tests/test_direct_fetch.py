@@ -0,0 +1,74 @@
+import json
+
+import csv39
+from conftest import LEGACY_TEMPLATE_COURSE_ID, LEGACY_TEMPLATE_YEAR, legacy_url
+
+
+def test_infer_detail_url_template_from_collected_url():
+    url = "https://gslbs.keio.jp/syllabus/detail?ttblyr=2025&entno=12345&lang=jp"
+    template = csv39.infer_detail_url_template(url, 2025, "12345")
+    assert template == "https://gslbs.keio.jp/syllabus/detail?ttblyr={year}&entno={course_id}&lang=jp"
+    assert template.format(year=2026, course_id="678") == "https://gslbs.keio.jp/syllabus/detail?ttblyr=2026&entno=678&lang=jp"
+
+
+def test_infer_detail_url_template_round_trips_through_course_id_extraction():
+    url = "https://syllabus.sfc.keio.ac.jp/courses/2024_27626?locale=ja"
+    template = csv39.infer_detail_url_template(url, 2024, "27626")
+    assert template == "https://syllabus.sfc.keio.ac.jp/courses/{year}_{course_id}?locale=ja"
+    assert csv39.extract_course_id_from_url(template.format(year=2023, course_id="111"), 2023) == "111"
+
+
+def test_infer_detail_url_template_rejects_ambiguous_urls():
+    # 登録番号が2回現れる (どちらを置き換えるか決められない) / 含まれない
+    assert csv39.infer_detail_url_template("https://example.com/2025/123/123", 2025, "123") is None
+    assert csv39.infer_detail_url_template("https://example.com/2025/456", 2025, "123") is None
+    # 登録番号の一部としてだけ現れる場合も置き換えない
+    assert csv39.infer_detail_url_template("https://example.com/detail?id=91234", 2025, "123") is None
+    # URL中の波括弧はテンプレートの書式として解釈されない
+    template = csv39.infer_detail_url_template("https://example.com/{x}/2025_77", 2025, "77")
+    assert template.format(year=2024, course_id="88") == "https://example.com/{x}/2024_88"
+
+
+def test_load_course_id_pairs_from_specs_and_files(tmp_path, capsys):
+    id_file = tmp_path / "ids.txt"
+    id_file.write_text("# 再取得する科目\n2024:100\n\n2023_200\nnot-an-id\n2024, 100\n", encoding="utf-8")
+    pairs = csv39.load_course_id_pairs(["2025:300", str(id_file), "2025_300"])
+    assert pairs == [(2025, "300"), (2024, "100"), (2023, "200")]
+    assert "not-an-id" in capsys.readouterr().out
+
+
+def test_load_course_id_pairs_from_output_json(tmp_path):
+    output_json = tmp_path / "syllabus_data.json"
+    output_json.write_text(json.dumps([
+        {"course_id": "100", "year": "2024&2023", "available_years": ["2024", "2023"]},
+        {"course_id": "200", "year": "2025", "available_years": ["2025"]},
+        {"course_id": "", "year": "2025"},
+        {"course_id": "300", "year": ""},
+    ], ensure_ascii=False), encoding="utf-8")
+    assert csv39.load_course_id_pairs([str(output_json)]) == [(2024, "100"), (2025, "200")]
+
+
+def test_legacy_detail_url_template_matches_bundled_template_url():
+    assert csv39.build_direct_detail_url(LEGACY_TEMPLATE_YEAR, LEGACY_TEMPLATE_COURSE_ID) == legacy_url(LEGACY_TEMPLATE_YEAR)
+    assert csv39.build_direct_detail_url(2025, "12345") is None
+
+
+def test_resolve_direct_detail_urls_uses_collected_links():
+    known_urls = [
+        ("https://gslbs.keio.jp/syllabus/detail?ttblyr=2025&entno=12345&lang=jp", 2025),
+        (legacy_url(2024), 2024),
+    ]
+    urls_by_year, unresolved_pairs = csv39.resolve_direct_detail_urls(
+        [(2025, "12345"), (2026, "678"), (2023, "111")], known_urls)
+    assert urls_by_year == {
+        2025: ["https://gslbs.keio.jp/syllabus/detail?ttblyr=2025&entno=12345&lang=jp"],
+        2026: ["https://gslbs.keio.jp/syllabus/detail?ttblyr=2026&entno=678&lang=jp"],
+        2023: [legacy_url(2023).replace(LEGACY_TEMPLATE_COURSE_ID, "111")],
+    }
+    assert unresolved_pairs == []
+
+
+def test_resolve_direct_detail_urls_reports_new_system_ids_without_collected_links():
+    urls_by_year, unresolved_pairs = csv39.resolve_direct_detail_urls([(2025, "12345"), (2024, "27626")], [])
+    assert urls_by_year == {2024: [legacy_url(2024)]}
+    assert unresolved_pairs == [(2025, "12345")]
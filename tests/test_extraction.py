@@ -0,0 +1,55 @@
+import pytest
+from lxml import etree
+
+import csv39
+from conftest import LEGACY_EN_TEMPLATE, LEGACY_JA_TEMPLATE, read_template
+
+
+def extract_fields_by_xpath(page_html, info_map):
+    """ラベル→値マップ導入前と同じく、INFO_MAP の XPath を項目ごとに評価する"""
+    document = csv39.parse_html_document(page_html)
+    results = {}
+    for key, (_, xpath, *_) in info_map.items():
+        nodes = etree.XPath(xpath)(document)
+        results[key] = csv39._lxml_node_text(nodes[0]) if nodes else ""
+    return results
+
+
+@pytest.mark.parametrize("template_path, info_map", [
+    (LEGACY_JA_TEMPLATE, csv39.INFO_MAP_JA_2023_2024),
+    (LEGACY_EN_TEMPLATE, csv39.INFO_MAP_EN_2023_2024),
+])
+def test_label_map_matches_info_map_xpaths_on_legacy_templates(template_path, info_map):
+    page_html = read_template(template_path)
+    expected = extract_fields_by_xpath(page_html, info_map)
+    assert csv39.extract_fields_from_html(page_html, info_map) == expected
+    # 主要な項目はテンプレートに値がある (空同士の一致で通らないことの確認)
+    assert all(expected[key] for key in ("name", "semester", "professor", "credits", "field"))
+
+
+def test_label_map_matches_info_map_xpaths_on_table_layout():
+    page_html = """
+        <html><body>
+        <h2 class="class-name">データ構造とアルゴリズム</h2>
+        <table>
+          <tr><th>年度・学期</th><td>2025 春学期</td></tr>
+          <tr><th>登録番号</th><td>12345</td></tr>
+          <tr><th>担当者名</th><td>慶應 太郎</td></tr>
+          <tr><th>単位</th><td>2単位</td></tr>
+          <tr><th>分野</th><td>先端科目</td></tr>
+          <tr><th>開講場所</th><td>SFC</td></tr>
+          <tr><th>曜日時限</th><td>月2</td></tr>
+          <tr><th>授業実施形態</th><td>対面</td></tr>
+          <tr><th>選抜方法</th><td><span></span><span>課題</span></td></tr>
+        </table>
+        </body></html>
+    """
+    info_map = csv39.INFO_MAP_JA_2025
+    assert csv39.extract_fields_from_html(page_html, info_map) == extract_fields_by_xpath(page_html, info_map)
+
+
+def test_parse_label_xpath():
+    assert csv39.parse_label_xpath("//h2[@class='class-name']") is None
+    assert csv39.parse_label_xpath("//tr[th[normalize-space()='年度・学期']]/td") == [('exact', '年度・学期')]
+    assert csv39.parse_label_xpath("//tr[th[contains(text(),'教室') or contains(text(),'開講場所')]]/td") == [
+        ('contains', '教室'), ('contains', '開講場所')]
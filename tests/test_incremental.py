@@ -0,0 +1,41 @@
+from lxml import html as lxml_html
+
+import csv39
+from conftest import LEGACY_JA_TEMPLATE, read_template
+
+RAW_BODY = """<!DOCTYPE html>
+<html><head><meta charset=utf-8><script>var token = 'a1';</script></head>
+<body><table class=info><tr><th>単位</th><td>2単位&nbsp;</td></tr></table>
+<input type="hidden" name="csrf" value="a1"><br></body></html>"""
+
+# 同じページをブラウザの page_source で取得した場合 (属性の引用符・<tbody> の補完・トークンが異なる)
+PAGE_SOURCE = """<html><head><meta charset="utf-8"><script>var token = 'b2';</script></head>
+<body><table class="info"><tbody><tr><th>単位</th><td>2単位\xa0</td></tr></tbody></table>
+<input type="hidden" name="csrf" value="b2"><br>
+
+</body></html>"""
+
+
+def test_content_hash_is_the_same_for_page_source_and_raw_body():
+    assert csv39.normalized_content_hash(RAW_BODY) == csv39.normalized_content_hash(PAGE_SOURCE)
+
+
+def test_content_hash_of_reserialized_template():
+    raw_html = read_template(LEGACY_JA_TEMPLATE)
+    reserialized = lxml_html.tostring(csv39.parse_html_document(raw_html), encoding="unicode")
+    assert csv39.normalized_content_hash(raw_html) == csv39.normalized_content_hash(reserialized)
+
+
+def test_content_hash_changes_with_content():
+    assert csv39.normalized_content_hash(RAW_BODY) != csv39.normalized_content_hash(RAW_BODY.replace("2単位", "1単位"))
+
+
+def test_unchanged_details_are_found_by_content_hash(monkeypatch, crawl_state):
+    monkeypatch.setattr(csv39, "FINGERPRINT_STORE", crawl_state)
+    url = "https://syllabus.sfc.keio.ac.jp/courses/2024_1?locale=ja"
+    details = {"course_id": "1", "year_scraped": 2024}
+    csv39.remember_fingerprint(url, details, RAW_BODY, {})
+    assert csv39.find_unchanged_details(url, page_html=PAGE_SOURCE) == details
+    assert csv39.find_unchanged_details(url, page_html=PAGE_SOURCE.replace("2単位", "1単位")) is None
+    monkeypatch.setattr(csv39, "INCREMENTAL_MODE", False)
+    assert csv39.find_unchanged_details(url, page_html=PAGE_SOURCE) is None
@@ -0,0 +1,77 @@
+import copy
+
+import csv39
+from conftest import LEGACY_EN_TEMPLATE, LEGACY_JA_TEMPLATE, legacy_url, read_template
+
+
+def make_details(course_id, year, name, professor, semester="春学期", field="先端科目", credits="2単位"):
+    ja = {"name": name, "semester": f"{year} {semester}", "professor": professor, "day_period": "月2",
+          "class_format": "対面", "location": "SFC", "credits": credits, "field": field, "selection_method": ""}
+    en = {"name": f"{name} (EN)", "semester": f"{year} Spring", "professor": f"{professor} (EN)", "day_period": "Mon 2",
+          "class_format": "Face-to-face", "location": "SFC", "credits": "2 credits", "field": "Advanced", "selection_method": ""}
+    return csv39.build_final_details(course_id, year, ja, en, csv39.INFO_MAP_JA_2023_2024)
+
+
+def test_syllabus_record_round_trip_from_template():
+    details = csv39.build_syllabus_details_from_html(
+        read_template(LEGACY_JA_TEMPLATE), read_template(LEGACY_EN_TEMPLATE), legacy_url(2024), 2024)
+    record = csv39.SyllabusRecord.from_details(copy.deepcopy(details))
+    assert record.extra is None
+    assert record.to_details() == details
+    assert list(record.to_details()) == list(details) # キー順も build_final_details と同じ
+
+
+def test_syllabus_record_round_trip_keeps_differing_and_missing_keys():
+    details = make_details("100", 2024, "情報基礎", "慶應 太郎")
+    details["name_ja"] = "別名" # translations.ja と異なるトップレベル値
+    details["note"] = {"source": "manual"} # 未知のキー
+    del details["credits_ja"] # 元データに無いキー
+    record = csv39.SyllabusRecord.from_details(copy.deepcopy(details))
+    assert record.name_ja == "別名"
+    assert record.credits_ja == ""
+    assert record.to_details() == details
+
+
+def test_syllabus_record_shares_key_tuples():
+    first = csv39.SyllabusRecord.from_details(make_details("100", 2024, "情報基礎", "慶應 太郎"))
+    second = csv39.SyllabusRecord.from_details(make_details("200", 2023, "統計学", "慶應 花子"))
+    assert first.ja_keys is second.ja_keys
+    assert first.en_keys is second.en_keys
+
+
+def sample_raw_data():
+    return [
+        make_details("100", 2024, "情報基礎", "慶應 太郎"),
+        make_details("200", 2024, "統計学", "慶應 花子", semester="秋学期"),
+        make_details("101", 2023, "情報基礎", "慶應 太郎"), # 2024年度の「情報基礎」と同じ科目
+        make_details("300", 2024, "", "慶應 次郎"), # 科目名が無いため集約されない
+        make_details("201", 2022, "統計学", "慶應 花子", semester="秋学期"),
+        make_details("400", 2023, "線形代数", "慶應 太郎", credits="1単位"),
+    ]
+
+
+def test_incremental_aggregator_matches_aggregate_syllabus_data():
+    raw_data = sample_raw_data()
+    expected = csv39.aggregate_syllabus_data(copy.deepcopy(raw_data))
+    assert len(expected) == 3
+    aggregated_item = next(item for item in expected if item["translations"]["ja"]["name"] == "情報基礎")
+    assert aggregated_item["available_years"] == ["2024", "2023"]
+
+    # 途中で final_list() を呼んでから追加しても、最後の結果は一括集約と同じ
+    aggregator = csv39.IncrementalAggregator()
+    aggregator.extend(copy.deepcopy(raw_data[:2]))
+    assert aggregator.final_list() == csv39.aggregate_syllabus_data(copy.deepcopy(raw_data[:2]))
+    aggregator.extend(copy.deepcopy(raw_data[2:]))
+    assert aggregator.final_list() == expected
+    assert len(aggregator) == len(raw_data)
+    assert aggregator.skipped_count == 1
+
+
+def test_incremental_aggregator_writes_appended_records_to_sink(tmp_path):
+    raw_data = sample_raw_data()
+    sink = csv39.RawRecordSink(str(tmp_path / "raw_records.jsonl"), truncate=True)
+    aggregator = csv39.IncrementalAggregator(sink)
+    aggregator.extend(copy.deepcopy(raw_data[:3]))
+    aggregator.extend(copy.deepcopy(raw_data[3:]), persist=False)
+    sink.close()
+    assert list(csv39.read_raw_records(sink.path)) == raw_data[:3]
@@ -0,0 +1,55 @@
+import json
+
+import httpx
+
+import csv39
+from conftest import LEGACY_EN_TEMPLATE, LEGACY_JA_TEMPLATE, legacy_url, read_template
+
+
+def mock_client(pages, requested):
+    """URL → HTML の辞書を返す httpx.Client (取得したURLを requested に記録する)"""
+    def handler(request):
+        url = str(request.url)
+        requested.append(url)
+        return httpx.Response(200, text=pages[url], headers={"content-type": "text/html; charset=utf-8"})
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def test_replay_matches_live_run_for_reused_translation(tmp_path, monkeypatch, crawl_state):
+    archive_root = str(tmp_path / "html_archive")
+    monkeypatch.setattr(csv39, "HTML_ARCHIVE", csv39.HtmlArchive(archive_root))
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", crawl_state)
+    pages = {}
+    for year in (2024, 2023):
+        pages[legacy_url(year, "ja")] = read_template(LEGACY_JA_TEMPLATE, year)
+        pages[legacy_url(year, "en")] = read_template(LEGACY_EN_TEMPLATE, year)
+    requested = []
+
+    # 取得 (live): 2023年度は日本語の内容が2024年度と同一なので英語ページを取得せずに再利用する
+    with mock_client(pages, requested) as client:
+        live_details = [csv39.fetch_syllabus_details_http(client, legacy_url(year), year) for year in (2024, 2023)]
+    assert legacy_url(2023, "en") not in requested
+    assert live_details[1]["translations"]["en"]["semester"] == live_details[0]["translations"]["en"]["semester"].replace("2024", "2023")
+    live_output = csv39.aggregate_syllabus_data(live_details)
+    csv39.HTML_ARCHIVE.close()
+
+    # 再解析 (replay): アーカイブに英語ページが無い科目も翻訳キャッシュから同じ英語情報になる
+    output_path = str(tmp_path / "syllabus_data.json")
+    replay_output = csv39.replay_archive(archive_root, output_path, workers=1, crawl_state_path=crawl_state.path)
+    assert replay_output == live_output
+    with open(output_path, encoding="utf-8") as f:
+        assert json.load(f) == live_output
+
+
+def test_latest_detail_pages_drops_english_page_from_an_earlier_fetch(tmp_path):
+    archive = csv39.HtmlArchive(str(tmp_path / "html_archive"))
+    try:
+        ja_url, en_url = legacy_url(2024, "ja"), legacy_url(2024, "en")
+        archive.put(ja_url, "<html>ja v1</html>", "ja", 2024, fetched_at=1.0)
+        en_sha256 = archive.put(en_url, "<html>en v1</html>", "en", 2024, source_url=ja_url, fetched_at=1.5)
+        assert archive.latest_detail_pages()[0][3] == en_sha256
+        # 2回目の取得では英語情報を再利用したため英語ページは無い
+        ja_sha256 = archive.put(ja_url, "<html>ja v2</html>", "ja", 2024, fetched_at=2.0)
+        assert archive.latest_detail_pages() == [(csv39.canonicalize_url(ja_url), 2024, ja_sha256, None)]
+    finally:
+        archive.close()
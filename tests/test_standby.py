@@ -0,0 +1,48 @@
+import time
+from threading import Event, Thread, Timer
+
+import csv39
+
+
+class FakeDriver:
+    current_url = "https://gslbs.keio.jp/syllabus/search"
+
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_take_during_refresh_waits_for_the_probed_driver(monkeypatch):
+    probe_started, probe_release = Event(), Event()
+
+    def probe_session(driver):
+        probe_started.set()
+        probe_release.wait(5)
+        return True
+
+    monkeypatch.setattr(csv39, "initialize_driver", lambda *args: FakeDriver())
+    monkeypatch.setattr(csv39, "establish_session", lambda driver, screenshots_dir: True)
+    monkeypatch.setattr(csv39, "probe_session", probe_session)
+    monkeypatch.setattr(csv39, "STANDBY_REFRESH_INTERVAL", 60)
+    standby = csv39.StandbyDriver("screenshots")
+    try:
+        for _ in range(100):
+            if standby.driver is not None:
+                break
+            time.sleep(0.01)
+        standby_driver = standby.driver
+        assert standby_driver is not None
+
+        # セッション確認中の take() は確認の完了を待ち、確認したドライバーを受け取る
+        refresh_thread = Thread(target=standby._refresh)
+        refresh_thread.start()
+        assert probe_started.wait(5)
+        Timer(0.2, probe_release.set).start()
+        assert standby.take() is standby_driver
+        refresh_thread.join(5)
+        assert not standby_driver.quit_called
+    finally:
+        probe_release.set()
+        standby.close()
@@ -0,0 +1,64 @@
+import pytest
+
+import csv39
+from conftest import LEGACY_EN_TEMPLATE, LEGACY_JA_TEMPLATE, legacy_url, read_template
+
+
+def ja_raw_for(year):
+    return csv39.extract_fields_from_html(read_template(LEGACY_JA_TEMPLATE, year), csv39.INFO_MAP_JA_2023_2024)
+
+
+def test_cache_key_ignores_year_and_registration_number():
+    ja_2024, ja_2023 = ja_raw_for(2024), ja_raw_for(2023)
+    assert ja_2024["semester"] != ja_2023["semester"]
+    ja_2023["course_id_fallback"] = "99999"
+    key_2024 = csv39.translation_cache_key(ja_2024, 2024)
+    assert key_2024 == csv39.translation_cache_key(ja_2023, 2023)
+    assert key_2024[:2] == (ja_2024["name"], ja_2024["professor"])
+
+
+def test_cache_key_keeps_year_in_free_text_fields():
+    ja_2024 = ja_raw_for(2024)
+    ja_2024["class_format"] = "2024年度は対面"
+    ja_2023 = dict(ja_2024, semester=ja_2024["semester"].replace("2024", "2023"), class_format="2023年度は対面")
+    # 年度を置き換えるのは学期の項目だけ (自由記述の中の年度は内容の違いとして扱う)
+    assert csv39.translation_cache_key(ja_2024, 2024) != csv39.translation_cache_key(ja_2023, 2023)
+
+
+def test_cache_key_changes_with_content():
+    ja_raw = ja_raw_for(2024)
+    changed = dict(ja_raw, day_period="金5")
+    assert csv39.translation_cache_key(ja_raw, 2024)[2] != csv39.translation_cache_key(changed, 2024)[2]
+
+
+def test_find_reused_translation_restores_year(monkeypatch, crawl_state):
+    details = csv39.build_syllabus_details_from_html(
+        read_template(LEGACY_JA_TEMPLATE), read_template(LEGACY_EN_TEMPLATE), legacy_url(2024), 2024)
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", crawl_state)
+    assert csv39.find_reused_translation(ja_raw_for(2023), 2023) is None
+    csv39.remember_translation(ja_raw_for(2024), details, 2024)
+
+    en_data = details["translations"]["en"]
+    reused = csv39.find_reused_translation(ja_raw_for(2023), 2023)
+    assert reused == dict(en_data, semester=en_data["semester"].replace("2024", "2023"))
+    assert crawl_state.has_translation(*csv39.translation_cache_key(ja_raw_for(2023), 2023)[:2])
+
+
+@pytest.mark.parametrize("reuse_enabled, cache_enabled", [(False, True), (True, False)])
+def test_find_reused_translation_when_disabled(monkeypatch, crawl_state, reuse_enabled, cache_enabled):
+    details = csv39.build_syllabus_details_from_html(
+        read_template(LEGACY_JA_TEMPLATE), read_template(LEGACY_EN_TEMPLATE), legacy_url(2024), 2024)
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", crawl_state)
+    csv39.remember_translation(ja_raw_for(2024), details, 2024)
+    assert crawl_state.has_any_translation()
+    monkeypatch.setattr(csv39, "TRANSLATION_REUSE", reuse_enabled)
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", crawl_state if cache_enabled else None)
+    assert csv39.find_reused_translation(ja_raw_for(2023), 2023) is None
+
+
+def test_failed_english_page_is_not_remembered(monkeypatch, crawl_state):
+    monkeypatch.setattr(csv39, "TRANSLATION_CACHE", crawl_state)
+    details = csv39.build_syllabus_details_from_html(read_template(LEGACY_JA_TEMPLATE), None, legacy_url(2024), 2024)
+    assert details["translations"]["en"]["name"].startswith("Name Unknown")
+    csv39.remember_translation(ja_raw_for(2024), details, 2024)
+    assert not crawl_state.has_any_translation()